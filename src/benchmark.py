@@ -0,0 +1,214 @@
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+from time import perf_counter
+from typing import Any, Callable, Tuple
+import numpy as np
+
+from command import Command, CommandType
+from commandGenerator import generate_commands
+from commands_processor import CommandsProcessor
+from input_parser import InputParser
+from intersection_checker import AnyIntersections
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+DATA_CASES = ['line', 'polyline', 'random-n25', 'random-n50', 'random-n100', 'random-n300', 'spiral-n1000']
+GENERATED_KINDS = ['random', 'stairs']
+GENERATED_SIZES = [1_000, 10_000, 100_000, 1_000_000] # Commands per generated path
+PHASES = ['parse', 'process', 'check']
+PERCENTILES = [50, 90, 99]
+FORMAT_VERSION = 1 # Bumped whenever the layout of the JSON results changes
+DEFAULT_TOLERANCE = 1.25 # Slowdown ratio reported as a regression
+SCALING_TOLERANCE = 0.15 # Growth exponent increase reported as a scaling regression
+MIN_COMPARED_MS = 1.0 # Faster phases are too noisy to be compared with a baseline
+COMPARED = 'min' # Statistic compared with the baseline, the least sensitive to background load
+
+def generate_path(kind: str, size: int, seed: int) -> list[Command]:
+    """
+    Generates a reproducible path for the benchmark.
+
+    Args:
+        kind (str): 'random' for commandGenerator paths, which cross early, or 'stairs' for a
+            staircase that never crosses itself, so the check has to look at every segment.
+        size (int): Number of commands.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        list[Command]: The commands of the path.
+    """
+    random.seed(seed)
+    if kind == 'random':
+        return generate_commands(size, max(1, size // 1000))
+
+    commands = []
+    for i in range(size // 2):
+        commands.append(Command(CommandType.MOVE_FORWARD, random.randint(5, 25)))
+        commands.append(Command(CommandType.LEFT_TURN if i % 2 == 0 else CommandType.RIGHT_TURN, 90))
+    return commands
+
+def time_phase(function: Callable[[], Any], warmup: int, repeat: int) -> Tuple[Any, list[float]]:
+    """
+    Times a phase like timeit does, with the garbage collector off during the timed runs.
+
+    Returns:
+        Tuple[Any, list[float]]: The result of the last run and the time of every timed run in ms.
+    """
+    for _ in range(warmup):
+        function()
+
+    samples = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = perf_counter()
+            result = function()
+            samples.append((perf_counter() - start) * 1000)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return result, samples
+
+def summarize(samples: list[float]) -> dict:
+    summary = {'min': min(samples), 'mean': sum(samples) / len(samples)}
+    for percentile, value in zip(PERCENTILES, np.percentile(samples, PERCENTILES)):
+        summary[f'p{percentile}'] = float(value)
+    summary['samples'] = samples
+    return summary
+
+def run_case(name: str, filename: str, warmup: int, repeat: int, engine: str) -> dict:
+    """
+    Times parsing, processing and checking of one command file, each phase on the output of the previous one.
+    """
+    processor = CommandsProcessor()
+    commands, parse = time_phase(lambda: InputParser.parse_file(filename), warmup, repeat)
+    segments, process = time_phase(lambda: processor.processCommands(commands), warmup, repeat)
+    ret, check = time_phase(lambda: AnyIntersections.check(segments, engine), warmup, repeat)
+
+    return {
+        'name': name,
+        'commands': len(commands),
+        'segments': len(segments),
+        'result': ret[0],
+        'engine': ret[2],
+        'phases': {'parse': summarize(parse), 'process': summarize(process), 'check': summarize(check)},
+    }
+
+def scaling(cases: list[dict]) -> dict:
+    """
+    Fits time ~ segments^k to the fastest times of every generated kind and phase.
+
+    Returns:
+        dict: Kind -> phase -> growth exponent k, about 1 for linear and a bit more for n log n phases.
+    """
+    exponents = {}
+    for kind in GENERATED_KINDS:
+        series = [case for case in cases if case.get('kind') == kind and case['segments'] > 0]
+        if len(series) < 2:
+            continue
+        exponents[kind] = {}
+        for phase in PHASES:
+            points = [(math.log(case['segments']), math.log(case['phases'][phase][COMPARED])) for case in series if case['phases'][phase][COMPARED] > 0]
+            if len(points) >= 2:
+                x, y = zip(*points)
+                exponents[kind][phase] = float(np.polyfit(x, y, 1)[0])
+    return exponents
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Compares the fastest phase times and growth exponents with a saved baseline.
+
+    Returns:
+        list[str]: Description of every regression found, empty if there are none.
+    """
+    regressions = []
+    if baseline.get('version') != FORMAT_VERSION:
+        return [f"Baseline format version {baseline.get('version')} does not match {FORMAT_VERSION}"]
+
+    old_cases = {case['name']: case for case in baseline['cases']}
+    for case in results['cases']:
+        old = old_cases.get(case['name'])
+        if old is None:
+            continue
+        for phase in PHASES:
+            new_time, old_time = case['phases'][phase][COMPARED], old['phases'][phase][COMPARED]
+            if min(new_time, old_time) >= MIN_COMPARED_MS and new_time > old_time * tolerance:
+                regressions.append(f"{case['name']} {phase}: {old_time:.3f}ms -> {new_time:.3f}ms ({new_time / old_time:.2f}x)")
+
+    for kind, phases in results['scaling'].items():
+        for phase, exponent in phases.items():
+            old_exponent = baseline['scaling'].get(kind, {}).get(phase)
+            if old_exponent is not None and exponent > old_exponent + SCALING_TOLERANCE:
+                regressions.append(f"{kind} {phase} scaling: n^{old_exponent:.2f} -> n^{exponent:.2f}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parsing, processing and intersection checking.")
+    parser.add_argument("--data-dir", type=str, default=DATA_DIR, help="Directory of the data files (default is the repository 'data').")
+    parser.add_argument("--cases", type=str, nargs="*", default=DATA_CASES, help="Data files to run, without the .txt extension.")
+    parser.add_argument("--kinds", type=str, nargs="*", choices=GENERATED_KINDS, default=GENERATED_KINDS, help="Kinds of generated paths to run.")
+    parser.add_argument("--sizes", type=int, nargs="*", default=GENERATED_SIZES, help="Numbers of commands of the generated paths.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated paths (default is 0).")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed runs of every phase (default is 1).")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs of every phase (default is 5).")
+    parser.add_argument("--engine", type=str, choices=['auto', *AnyIntersections.ENGINES], default='auto', help="Intersection engine (default is 'auto').")
+    parser.add_argument("--output", type=str, help="File to save the results to as JSON (default is standard output).")
+    parser.add_argument("--baseline", type=str, help="Results of an earlier run to compare against.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help=f"Slowdown ratio reported as a regression (default is {DEFAULT_TOLERANCE}).")
+    args = parser.parse_args()
+
+    cases = []
+    for name in args.cases:
+        print(f"Running {name}", file=sys.stderr)
+        cases.append(run_case(name, os.path.join(args.data_dir, f"{name}.txt"), args.warmup, args.repeat, args.engine))
+
+    with tempfile.TemporaryDirectory() as directory:
+        for kind in args.kinds:
+            for size in args.sizes:
+                name = f"{kind}-n{size}"
+                print(f"Running {name}", file=sys.stderr)
+                filename = os.path.join(directory, f"{name}.txt")
+                InputParser.write_commands_to_file(generate_path(kind, size, args.seed), filename)
+                case = run_case(name, filename, args.warmup, args.repeat, args.engine)
+                case['kind'] = kind
+                cases.append(case)
+                os.remove(filename)
+
+    results = {
+        'version': FORMAT_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'engine': args.engine,
+        'seed': args.seed,
+        'warmup': args.warmup,
+        'repeat': args.repeat,
+        'cases': cases,
+        'scaling': scaling(cases),
+    }
+
+    for case in cases:
+        times = "\t".join(f"{phase}: {case['phases'][phase]['p50']:.3f}ms" for phase in PHASES)
+        print(f"{case['name']:<16} segments: {case['segments']:<8} result: {case['result']}\t{times}", file=sys.stderr)
+
+    if args.output is None:
+        print(json.dumps(results, indent=2))
+    else:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
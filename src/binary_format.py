@@ -0,0 +1,165 @@
+import argparse
+import mmap
+import struct
+import numpy as np
+from typing import Iterable, Iterator, Optional, Tuple
+from command import *
+
+MAGIC = b'TRTL'
+VERSION = 1 # Bumped whenever the layout or the opcodes (see OPCODES) change
+HEADER = struct.Struct('<4sHHQ') # Magic, version, flags (unused, 0), number of commands
+RECORD = np.dtype([('opcode', 'u1'), ('value', '<i4')]) # Packed, 5 bytes per command
+BATCH_SIZE = 1 << 16 # Commands per array batch when reading or writing
+INT32_MIN, INT32_MAX = -(1 << 31), (1 << 31) - 1
+COMMAND_TYPES = list(OPCODES)
+
+def is_binary(filename) -> bool:
+    """
+    Checks whether a command file is in the binary format, by its magic bytes.
+    """
+    try:
+        with open(filename, 'rb') as file:
+            return file.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+def write_arrays(batches: Iterable[Tuple[np.ndarray, np.ndarray]], filename):
+    """
+    Writes batches of opcodes (see OPCODES) and values to a binary command file.
+
+    The batches are written as they come, so a stream such as InputParser.iter_command_arrays
+    is converted in constant memory, and the number of commands is filled in at the end.
+
+    Raises:
+        ValueError: If a value does not fit in an int32.
+    """
+    count = 0
+    with open(filename, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+        for opcodes, values in batches:
+            values = np.asarray(values, dtype=np.int64)
+            if len(values) and (values.min() < INT32_MIN or values.max() > INT32_MAX):
+                raise ValueError(f"Command value out of the int32 range of the binary format in batch at command {count}")
+            records = np.empty(len(values), dtype=RECORD)
+            records['opcode'] = opcodes
+            records['value'] = values
+            file.write(records.tobytes())
+            count += len(records)
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, VERSION, 0, count))
+
+def write_commands(commands: Iterable[Command], filename, batch_size: int = BATCH_SIZE):
+    """
+    Writes Command objects to a binary command file, see write_arrays.
+    """
+    def batches() -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        opcodes, values = [], []
+        for command in commands:
+            opcodes.append(OPCODES[command.command_type])
+            values.append(command.value or 0)
+            if len(opcodes) == batch_size:
+                yield np.array(opcodes, dtype=np.uint8), np.array(values, dtype=np.int64)
+                opcodes, values = [], []
+        if opcodes:
+            yield np.array(opcodes, dtype=np.uint8), np.array(values, dtype=np.int64)
+
+    write_arrays(batches(), filename)
+
+def read_records(filename) -> np.ndarray:
+    """
+    Maps a binary command file into memory without copying it.
+
+    The returned array keeps the mapping alive, the file itself is closed right away.
+
+    Returns:
+        np.ndarray: One RECORD per command, with 'opcode' and 'value' fields.
+
+    Raises:
+        ValueError: If the file is not a binary command file of a supported version or is truncated.
+    """
+    with open(filename, 'rb') as file:
+        if file.seek(0, 2) < HEADER.size:
+            raise ValueError(f"File '{filename}' is too short for a binary command file.")
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, _, count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"File '{filename}' is not a binary command file.")
+    if version != VERSION:
+        raise ValueError(f"Binary command file '{filename}' has version {version}, only version {VERSION} is supported.")
+    if len(data) != HEADER.size + count * RECORD.itemsize:
+        raise ValueError(f"Binary command file '{filename}' should hold {count} commands but has {len(data)} bytes.")
+    return np.frombuffer(data, dtype=RECORD, count=count, offset=HEADER.size)
+
+def check_opcodes(opcodes: np.ndarray, filename):
+    """
+    Raises:
+        ValueError: If an opcode is not one of OPCODES.
+    """
+    unknown = np.flatnonzero(opcodes >= len(COMMAND_TYPES))
+    if len(unknown):
+        raise ValueError(f"Unknown opcode {opcodes[unknown[0]]} in binary command file '{filename}'.")
+
+def read_arrays(filename) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Opcodes and values of all commands, as views of the mapped file,
+        ready for CommandsProcessor.processArrays.
+
+    Raises:
+        ValueError: See read_records, or if an opcode is unknown.
+    """
+    records = read_records(filename)
+    check_opcodes(records['opcode'], filename)
+    return records['opcode'], records['value']
+
+def iter_arrays(filename, batch_size: int = BATCH_SIZE) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Same as InputParser.iter_command_arrays for binary files: batches of opcodes and values,
+    ready for CommandsProcessor.processArrayChunks, as views of the mapped file.
+
+    Raises:
+        ValueError: See read_records, or if an opcode is unknown, on reaching its batch.
+    """
+    records = read_records(filename)
+    for start in range(0, len(records), batch_size):
+        batch = records[start:start + batch_size]
+        check_opcodes(batch['opcode'], filename)
+        yield batch['opcode'], batch['value']
+
+def iter_parsed(filename) -> Iterator[Tuple[CommandType, Optional[int]]]:
+    """
+    Yields:
+        Tuple[CommandType, Optional[int]]: Command type and value of each command, None for pen commands
+        like in the text format.
+    """
+    for opcodes, values in iter_arrays(filename):
+        for opcode, value in zip(opcodes.tolist(), values.tolist()):
+            command_type = COMMAND_TYPES[opcode]
+            yield command_type, None if command_type in (CommandType.PEN_DOWN, CommandType.PEN_UP) else value
+
+def text_to_binary(source, target):
+    from input_parser import InputParser
+    write_arrays(InputParser.iter_command_arrays(source), target)
+
+def binary_to_text(source, target):
+    with open(target, 'w') as file:
+        for command_type, value in iter_parsed(source):
+            if value is None:
+                file.write(f"{command_type.value}\n")
+            else:
+                file.write(f"{command_type.value} {value}\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert command files between the text and the binary format.")
+    parser.add_argument("source", type=str, help="File to convert, the direction follows its format.")
+    parser.add_argument("target", type=str, help="File to write the converted commands to.")
+    args = parser.parse_args()
+
+    if is_binary(args.source):
+        binary_to_text(args.source, args.target)
+    else:
+        text_to_binary(args.source, args.target)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Iterator
+
+class CheckStats:
+    """
+    Counters and phase times of one intersection check, collected only when a CheckStats is
+    passed to AnyIntersections.check or find (or to an engine directly).
+
+    Engines fill in what applies to them: the sweep every counter, the grid only the
+    intersect() calls, the orthogonal sweep only the events, and the slab engine the sums
+    over its slabs.
+    """
+    comparisons: int # Edge comparisons of the sweep status
+    rotations: int # AVL rotations of the sweep status
+    maxHeight: int # Largest height the sweep status reached
+    intersectCalls: int # Calls to intersect() on a pair of segments
+    events: int # Endpoint events processed by the sweep
+    phases: dict[str, float] # Time of every phase in ms, e.g. parse, process, sort and sweep
+
+    def __init__(self):
+        self.comparisons = 0
+        self.rotations = 0
+        self.maxHeight = 0
+        self.intersectCalls = 0
+        self.events = 0
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Times the block it wraps and adds the time to the phase `name`.
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + (perf_counter() - start) * 1000
+
+    def merge(self, other: 'CheckStats'):
+        """
+        Adds up the counters and phase times of another check, e.g. of another slab.
+        """
+        self.comparisons += other.comparisons
+        self.rotations += other.rotations
+        self.maxHeight = max(self.maxHeight, other.maxHeight)
+        self.intersectCalls += other.intersectCalls
+        self.events += other.events
+        for name, time in other.phases.items():
+            self.phases[name] = self.phases.get(name, 0.0) + time
+
+    def as_dict(self) -> dict:
+        return {
+            'comparisons': self.comparisons,
+            'rotations': self.rotations,
+            'max_height': self.maxHeight,
+            'intersect_calls': self.intersectCalls,
+            'events': self.events,
+            'phases_ms': dict(self.phases),
+        }
+
+    def __repr__(self) -> str:
+        phases = "  ".join(f"{name}: {time:.4f}ms" for name, time in self.phases.items())
+        return (f"comparisons: {self.comparisons}  rotations: {self.rotations}  max height: {self.maxHeight}  "
+                f"intersect calls: {self.intersectCalls}  events: {self.events}\n{phases}")
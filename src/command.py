@@ -1,4 +1,5 @@
 from enum import Enum
+from typing import Iterator
 
 
         
@@ -10,6 +11,9 @@ class CommandType(Enum):
     PEN_DOWN = 'pd'
     PEN_UP = 'pu'
 
+# Compact numeric code of every command type, used by the array-based pipeline
+OPCODES = {command_type: opcode for opcode, command_type in enumerate(CommandType)}
+
 class Command:
     command_type: CommandType
     value: int
@@ -19,4 +23,39 @@ class Command:
         self.value = value
         
     def __repr__(self) -> str:
-        return f"{self.command_type.name}, value: {self.value}"
\ No newline at end of file
+        return f"{self.command_type.name}, value: {self.value}"
+class Repeat:
+    """
+    Logo-style `repeat N [ ... ]` block. Its body holds Commands and nested Repeats and is kept
+    as written, see iter_expanded for the commands it stands for.
+    """
+    count: int
+    body: list
+
+    def __init__(self, count: int, body: list):
+        self.count = count
+        self.body = body
+
+    def __repr__(self) -> str:
+        return f"REPEAT {self.count} {self.body}"
+
+def iter_expanded(program) -> Iterator[Command]:
+    """
+    Lazily expands the Repeat blocks of a program, without ever building the expansion.
+
+    Yields:
+        Command: The commands of the program with every block written out.
+    """
+    for item in program:
+        if type(item) is Repeat:
+            for _ in range(item.count):
+                yield from iter_expanded(item.body)
+        else:
+            yield item
+
+def expanded_length(program) -> int:
+    """
+    Returns:
+        int: Number of commands of the expansion of a program, see iter_expanded.
+    """
+    return sum(item.count * expanded_length(item.body) if type(item) is Repeat else 1 for item in program)
@@ -1,25 +1,29 @@
 import argparse
 import random
+import numpy as np
+from typing import Iterator, Optional, Tuple
 
-from command import Command, CommandType
+from command import Command, CommandType, OPCODES
 from input_parser import InputParser
-from intersection_checker import AnyIntersections
-from commands_processor import CommandsProcessor
+import binary_format
+
+MODES = ['random', 'simple', 'intersecting'] # Modes of the streaming generator, see iter_generated
+CHUNK_SIZE = 1 << 20 # Commands generated and written at once by the streaming generator
+SPIRAL_MAX_STEP = 3 # Largest growth of a side of the spiral over the previous one
+# Draws a hook whose last side crosses its first one, whatever the heading it starts at
+CROSSING = [Command(CommandType.MOVE_FORWARD, 20), Command(CommandType.RIGHT_TURN, 90),
+            Command(CommandType.MOVE_FORWARD, 10), Command(CommandType.RIGHT_TURN, 90),
+            Command(CommandType.MOVE_FORWARD, 10), Command(CommandType.RIGHT_TURN, 90),
+            Command(CommandType.MOVE_FORWARD, 20)]
+CROSSING_OPCODES = np.array([OPCODES[command.command_type] for command in CROSSING], dtype=np.uint8)
+CROSSING_VALUES = np.array([command.value for command in CROSSING], dtype=np.int64)
 
 def generate(length: int, pen_pairs: int, pen_up_segments: int = 5, force_intersections : bool = False) -> list[CommandType]:
-    commandProcessor = CommandsProcessor()
-    commands = generate_commands(length, pen_pairs, pen_up_segments)
-    segments = commandProcessor.processCommands(commands)
-    if(force_intersections):
-        while True:
-            commands = generate_commands((length + 1) // 2, pen_pairs, pen_up_segments)
-            segments = commandProcessor.processCommands(commands)
-            if AnyIntersections.check(segments):
-                break
-        tmp = commands.copy()
-        random.shuffle(tmp)
-        commands.extend(tmp)
-    return commands
+    if not force_intersections:
+        return generate_commands(length, pen_pairs, pen_up_segments)
+    # The crossing is built in at the end instead of retrying until a random path intersects
+    commands = generate_commands(length - len(CROSSING) - 1, pen_pairs, pen_up_segments)
+    return commands + [Command(CommandType.PEN_DOWN)] + CROSSING
 
 def generate_commands(length: int, pen_pairs: int, pen_up_segments: int = 5) -> list[CommandType]:
     commands = []
@@ -39,23 +43,106 @@ def generate_segments(length) -> list[CommandType]:
         segments.append(Command(turn, random.randint(30, 60)))
     return segments
 
+def iter_generated(length: int, mode: str = 'random', seed: Optional[int] = None, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Generates a path of any length with NumPy, chunk by chunk, in constant memory.
+
+    Modes:
+        random: Moves of 5 to 25 alternating with left or right turns of 30 to 60 degrees, like
+            generate_commands without the pen commands. Such paths almost always intersect early.
+        simple: An outward square spiral like data/spiral-n1000.txt, turning right by 90 degrees
+            after every side, with sides growing by 1 to SPIRAL_MAX_STEP. Every side reaches past
+            the parallel side before it, so the path never intersects itself.
+        intersecting: The simple spiral with CROSSING drawn at a random place in it, so the path
+            intersects itself there, possibly late in the path.
+
+    Args:
+        length (int): Number of commands.
+        mode (str): One of MODES.
+        seed (Optional[int]): Seed of the random generator, the same seed gives the same path.
+        chunk_size (int): Number of commands per chunk. The path does not depend on it.
+
+    Yields:
+        Tuple[np.ndarray, np.ndarray]: Chunks of opcodes (see OPCODES) and values, ready for
+        CommandsProcessor.processArrayChunks and binary_format.write_arrays.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown generator mode '{mode}', expected one of {MODES}.")
+    # One stream per kind of draw, so that splitting the draws into chunks does not change them
+    rng, turns, angles = (np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(3))
+    crossing = mode == 'intersecting' and length >= len(CROSSING)
+    bodyLength = length - len(CROSSING) if crossing else length
+    crossingAt = 2 * int(rng.integers(0, bodyLength // 2 + 1)) if crossing else -1
+    chunk_size += chunk_size % 2 # Chunks start with a move
+    side = 0
+
+    for start in range(0, bodyLength, chunk_size):
+        count = min(chunk_size, bodyLength - start)
+        pairs = (count + 1) // 2
+        opcodes = np.empty(2 * pairs, dtype=np.uint8)
+        values = np.empty(2 * pairs, dtype=np.int64)
+        opcodes[0::2] = OPCODES[CommandType.MOVE_FORWARD]
+        if mode == 'random':
+            values[0::2] = rng.integers(5, 26, pairs)
+            opcodes[1::2] = np.where(turns.integers(0, 2, pairs) == 0, OPCODES[CommandType.LEFT_TURN], OPCODES[CommandType.RIGHT_TURN])
+            values[1::2] = angles.integers(30, 61, pairs)
+        else:
+            sides = side + np.cumsum(rng.integers(1, SPIRAL_MAX_STEP + 1, pairs))
+            side = int(sides[-1])
+            values[0::2] = sides
+            opcodes[1::2] = OPCODES[CommandType.RIGHT_TURN]
+            values[1::2] = 90
+        opcodes, values = opcodes[:count], values[:count]
+
+        if start <= crossingAt < start + count:
+            split = crossingAt - start
+            if split:
+                yield opcodes[:split], values[:split]
+            yield CROSSING_OPCODES, CROSSING_VALUES
+            yield opcodes[split:], values[split:]
+        else:
+            yield opcodes, values
+    if crossingAt == bodyLength:
+        yield CROSSING_OPCODES, CROSSING_VALUES
+
+def write_generated(filename, length: int, mode: str = 'random', seed: Optional[int] = None, binary: bool = False):
+    """
+    Streams a path from iter_generated straight to a text or binary command file.
+    """
+    chunks = iter_generated(length, mode, seed)
+    if binary:
+        binary_format.write_arrays(chunks, filename)
+    else:
+        InputParser.write_command_arrays_to_file(chunks, filename)
+
 def check_length(value):
     ivalue = int(value)
-    if ivalue < 50 or ivalue > 1000:
-        raise argparse.ArgumentTypeError("%s is not a valid length (must be between 30 and 1000)" % value)
+    if ivalue < 50:
+        raise argparse.ArgumentTypeError("%s is not a valid length (must be at least 50)" % value)
     return ivalue
 
 def main():
     parser = argparse.ArgumentParser(description="Generate drawing commands.")
     parser.add_argument("--filename", type=str, default="generated.txt", help="Output file to save the commands (default is 'generated.txt').")
-    parser.add_argument("length", type=check_length, help="Total number of commands generated (between 50 and 1000).")
-    parser.add_argument("pen_pairs", type=int, help="Number of pen up/down pairs.")
+    parser.add_argument("length", type=check_length, help="Total number of commands generated (at least 50).")
+    parser.add_argument("pen_pairs", type=int, nargs="?", default=1, help="Number of pen up/down pairs (default is 1, not used with --mode).")
     parser.add_argument("--pen_up_segments", type=int, default=5, help="Number of pen up segments per pair (default is 5).")
     parser.add_argument("--force_intersections", action="store_true", help="Generate intersections in the path (default is False).")
+    parser.add_argument("--binary", action="store_true", help="Save the commands in the binary format (see binary_format) instead of as text.")
+    parser.add_argument("--mode", type=str, choices=MODES, default=None, help="Stream a path of this kind to the file with the vectorized generator, for lengths up to billions.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the random generator, for reproducible paths.")
     args = parser.parse_args()
 
+    if args.mode is not None:
+        write_generated(args.filename, args.length, args.mode, args.seed, args.binary)
+        return
+
+    random.seed(args.seed)
     commands = generate(args.length, args.pen_pairs, args.pen_up_segments, args.force_intersections)
-    InputParser.write_commands_to_file(commands, args.filename)
+    if args.binary:
+        binary_format.write_commands(commands, args.filename)
+    else:
+        InputParser.write_commands_to_file(commands, args.filename)
     
 if __name__ == "__main__":  
     main()
\ No newline at end of file
@@ -1,20 +1,85 @@
 import math
+import numpy as np
+from typing import Iterable, Iterator
 from segment import *
 from command import *
 
+DECIMALS = 4 # Coordinates are rounded to this many decimal places after every move
+SCALE = 10 ** DECIMALS
+# sin/cos of every whole-degree heading, computed exactly like the per-command path does
+SIN_TABLE = np.array([math.sin(math.radians(angle)) for angle in range(360)])
+COS_TABLE = np.array([math.cos(math.radians(angle)) for angle in range(360)])
+TIE_MARGIN = 1e-3 # Steps this close to a rounding tie (in units of the last decimal) are redone exactly
+TRIG_SCALE = 10 ** 9 # Scale of the integer sin/cos tables of the fixed-point mode
+TRIG_DIVISOR = TRIG_SCALE // SCALE # distance * table entry / TRIG_DIVISOR is a step in 10^-DECIMALS units
+QUARTER_SIN = np.array([0, 1, 0, -1], dtype=np.int64) # sin/cos of the headings 0, 90, 180 and 270
+QUARTER_COS = np.array([1, 0, -1, 0], dtype=np.int64)
+
+def _fixed_sin_table() -> list[int]:
+    # Built from the first quadrant so that opposite headings give exactly opposite steps
+    quarter = [round(math.sin(math.radians(angle)) * TRIG_SCALE) for angle in range(91)]
+    table = [0] * 360
+    for angle, value in enumerate(quarter):
+        table[angle] = table[(180 - angle) % 360] = value
+        table[(180 + angle) % 360] = table[(360 - angle) % 360] = -value
+    return table
+
+FIXED_SIN_TABLE = _fixed_sin_table()
+FIXED_COS_TABLE = [FIXED_SIN_TABLE[(90 - angle) % 360] for angle in range(360)]
+FIXED_SIN_ARRAY = np.array(FIXED_SIN_TABLE, dtype=np.int64)
+FIXED_COS_ARRAY = np.array(FIXED_COS_TABLE, dtype=np.int64)
+
+def fixed_step(distance: int, ratio: int) -> int:
+    """
+    Returns distance * ratio / TRIG_SCALE in 10^-DECIMALS units, rounded half away from zero.
+    """
+    product = distance * ratio
+    step = (abs(product) + TRIG_DIVISOR // 2) // TRIG_DIVISOR
+    return step if product >= 0 else -step
+
+class TurtleState:
+    x: int # Position in 10^-DECIMALS units
+    y: int
+    heading: int
+    penDown: bool
+
+    def __init__(self):
+        self.x = 0
+        self.y = 0
+        self.heading = 0
+        self.penDown = True
+
 class CommandsProcessor:
-    
+    """
+    Turns commands into the segments drawn by the turtle.
+
+    By default coordinates are floats rounded to DECIMALS places after every move. In the
+    fixed-point mode they are ints in 10^-DECIMALS units instead, every move is a lookup in
+    an integer sin/cos table, and no floating point is involved at all. The results are
+    then the same on every machine and `intersect()` and the sweeps decide exactly.
+    """
+    fixedPoint: bool
+
+    def __init__(self, fixedPoint: bool = False):
+        self.fixedPoint = fixedPoint
+
     def processCommands(self, commands: list[Command]) -> list[Segment]:
-        edges : list[Segment] = []
+        return list(self.iterSegments(commands))
+
+    def iterSegments(self, commands: Iterable[Command]) -> Iterator[Segment]:
+        """
+        Lazily turns a stream of commands into segments, e.g. from InputParser.iter_commands.
+        Repeat blocks, e.g. from InputParser.parse_program, are expanded as they are reached.
+        """
         currentPosition = Node(0,0)
         relativeAngle = 0 
         penDown = True
-        for command in commands:
+        for command in iter_expanded(commands):
             start = currentPosition
             if(command.command_type in [CommandType.MOVE_FORWARD, CommandType.MOVE_BACKWARDS]):
                 currentPosition = self._processMove(command, start, relativeAngle)
                 if(penDown): 
-                    edges.append(Segment(start, currentPosition))
+                    yield Segment(start, currentPosition)
             elif(command.command_type is CommandType.RIGHT_TURN):
                 relativeAngle = (relativeAngle + command.value) % 360
             elif(command.command_type is CommandType.LEFT_TURN):
@@ -23,9 +88,12 @@ class CommandsProcessor:
                 penDown = True
             elif(command.command_type is CommandType.PEN_UP):
                 penDown = False
-        return edges
 
     def _processMove(self, command: Command, currentPosition : Node, relativeAngle: int) -> Node:
+        if self.fixedPoint:
+            distance = command.value if command.command_type is CommandType.MOVE_FORWARD else -command.value
+            return Node(currentPosition.x + fixed_step(distance, FIXED_SIN_TABLE[relativeAngle]),
+                        currentPosition.y + fixed_step(distance, FIXED_COS_TABLE[relativeAngle]))
         radians = math.radians(relativeAngle)
         return self._processMoveForward(command, currentPosition, radians) \
             if command.command_type is CommandType.MOVE_FORWARD \
@@ -39,4 +107,129 @@ class CommandsProcessor:
     def _processMoveBackwards(self, command : Command, currentPosition : Node, radians: float) -> Node:
         x = round(currentPosition.x - command.value * math.sin(radians), 4)
         y = round(currentPosition.y - command.value * math.cos(radians), 4)
-        return Node(x,y)
\ No newline at end of file
+        return Node(x,y)
+
+    def processCommandsBatch(self, commands: list[Command], asSegments: bool = False):
+        """
+        Array-based equivalent of processCommands for long command lists.
+
+        Args:
+            commands (list[Command]): The commands to process.
+            asSegments (bool): Convert the result back to Segment objects.
+
+        Returns:
+            The drawn segments as (x0, y0, x1, y1) coordinate arrays, or as list[Segment] if asSegments is set.
+        """
+        commands = list(iter_expanded(commands))
+        opcodes = np.fromiter((OPCODES[command.command_type] for command in commands), dtype=np.uint8, count=len(commands))
+        values = np.fromiter((command.value or 0 for command in commands), dtype=np.int64, count=len(commands))
+        coordinates = self.processArrays(opcodes, values)
+        return self.toSegments(coordinates) if asSegments else coordinates
+
+    def processArrays(self, opcodes: np.ndarray, values: np.ndarray, state: TurtleState = None) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Builds the drawn segments from command opcodes (see OPCODES) and values.
+
+        Heading and pen state are cumulative sums over the turns and pen commands, every move
+        is scaled to integer steps of 10^-DECIMALS and positions are a cumulative sum of those
+        steps, which gives the same coordinates as rounding after every move. In the fixed-point
+        mode the steps come from the integer tables and the arrays hold those integer positions.
+        With quarter turns only (see isOrthogonal) no table is needed, a step is the distance
+        in units along an axis.
+
+        Args:
+            opcodes (np.ndarray): Opcode of every command.
+            values (np.ndarray): Value of every command, ignored for pen commands.
+            state (TurtleState): Turtle state to start from and update, for processing a stream in batches.
+
+        Returns:
+            tuple: x0, y0, x1, y1 arrays with one entry per pen-down move.
+        """
+        opcodes = np.asarray(opcodes)
+        values = np.asarray(values, dtype=np.int64)
+        if state is None:
+            state = TurtleState()
+
+        turns = np.where(opcodes == OPCODES[CommandType.RIGHT_TURN], values, 0) \
+            - np.where(opcodes == OPCODES[CommandType.LEFT_TURN], values, 0)
+        headings = np.mod(state.heading + np.cumsum(turns) - turns, 360)
+
+        isPenCommand = (opcodes == OPCODES[CommandType.PEN_DOWN]) | (opcodes == OPCODES[CommandType.PEN_UP])
+        lastPenCommand = np.maximum.accumulate(np.where(isPenCommand, np.arange(len(opcodes)), -1))
+        penDown = np.where(lastPenCommand < 0, state.penDown, opcodes[lastPenCommand] == OPCODES[CommandType.PEN_DOWN])
+
+        isMove = (opcodes == OPCODES[CommandType.MOVE_FORWARD]) | (opcodes == OPCODES[CommandType.MOVE_BACKWARDS])
+        moves = np.flatnonzero(isMove)
+        distances = np.where(opcodes[moves] == OPCODES[CommandType.MOVE_FORWARD], values[moves], -values[moves])
+        if self.isOrthogonal(headings[moves]):
+            # Every step is a whole number of units along an axis, the same in both modes
+            quarters = headings[moves] // 90
+            xs = np.concatenate(([state.x], state.x + np.cumsum(distances * SCALE * QUARTER_SIN[quarters])))
+            ys = np.concatenate(([state.y], state.y + np.cumsum(distances * SCALE * QUARTER_COS[quarters])))
+        elif self.fixedPoint:
+            xs = self._fixedPositions(distances * FIXED_SIN_ARRAY[headings[moves]], state.x)
+            ys = self._fixedPositions(distances * FIXED_COS_ARRAY[headings[moves]], state.y)
+        else:
+            xs = self._positions(distances * SIN_TABLE[headings[moves]], state.x)
+            ys = self._positions(distances * COS_TABLE[headings[moves]], state.y)
+
+        if len(opcodes):
+            state.x, state.y = int(xs[-1]), int(ys[-1])
+            state.heading = int((state.heading + turns.sum()) % 360)
+            state.penDown = bool(penDown[-1])
+
+        drawn = penDown[moves]
+        if self.fixedPoint:
+            return xs[:-1][drawn], ys[:-1][drawn], xs[1:][drawn], ys[1:][drawn]
+        x0, y0 = xs[:-1][drawn] / SCALE, ys[:-1][drawn] / SCALE
+        x1, y1 = xs[1:][drawn] / SCALE, ys[1:][drawn] / SCALE
+        return x0, y0, x1, y1
+
+    @staticmethod
+    def isOrthogonal(headings: np.ndarray) -> bool:
+        """
+        Whether all headings are multiples of 90 degrees, so that the turtle only moves along the
+        axes, e.g. the headings of a program whose turns are all quarter turns. The segments
+        are then horizontal or vertical, see orthogonal_first_intersection.
+        """
+        return not np.any(np.asarray(headings) % 90)
+
+    def processArrayChunks(self, chunks: Iterable[tuple[np.ndarray, np.ndarray]]) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Streams batches of (opcodes, values), e.g. from InputParser.iter_command_arrays,
+        carrying the turtle state from one batch to the next.
+        """
+        state = TurtleState()
+        for opcodes, values in chunks:
+            yield self.processArrays(opcodes, values, state)
+
+    def _positions(self, deltas: np.ndarray, start: int = 0) -> np.ndarray:
+        steps = np.rint(deltas * SCALE).astype(np.int64)
+        positions = np.concatenate(([start], start + np.cumsum(steps)))
+
+        # Rounding a sum only equals summing rounded steps away from ties, so the few steps
+        # close to one are replayed in order with the per-command rounding.
+        corrections = np.zeros(len(steps), dtype=np.int64)
+        shift = 0
+        for index in np.flatnonzero(np.abs(np.abs(deltas * SCALE) % 1 - 0.5) < TIE_MARGIN):
+            # In Python ints and floats: numpy's round of a float64 is not correctly rounded
+            current = int(positions[index] + shift)
+            step = round(round(current / SCALE + float(deltas[index]), DECIMALS) * SCALE) - current
+            corrections[index] = step - steps[index]
+            shift += corrections[index]
+        positions[1:] += np.cumsum(corrections)
+        return positions
+
+    def _fixedPositions(self, products: np.ndarray, start: int = 0) -> np.ndarray:
+        steps = np.sign(products) * ((np.abs(products) + TRIG_DIVISOR // 2) // TRIG_DIVISOR)
+        return np.concatenate(([start], start + np.cumsum(steps)))
+
+    @staticmethod
+    def toSegments(coordinates: tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]) -> list[Segment]:
+        edges : list[Segment] = []
+        previous = None
+        for x0, y0, x1, y1 in zip(*(array.tolist() for array in coordinates)):
+            start = previous if previous is not None and previous.x == x0 and previous.y == y0 else Node(x0, y0)
+            previous = Node(x1, y1)
+            edges.append(Segment(start, previous))
+        return edges
@@ -0,0 +1,165 @@
+import numpy as np
+from time import perf_counter
+from typing import Iterable, Optional, Tuple
+from command import Command, CommandType, OPCODES
+from commands_processor import CommandsProcessor
+from input_parser import InputParser
+from intersection_checker import AnyIntersections, intersect_coordinates
+from segment import Node, Segment, SegmentStore
+from spatial_index import SegmentIndex
+
+SUFFIX_CHUNK = 64 # Consecutive suffix segments whose common bounding box is looked up before the segments themselves
+
+class EditSession:
+    """
+    Intersection check of a program that is edited a few commands at a time, e.g. in an editor.
+
+    An edit replaces a range of commands. The segments drawn before it (the prefix) do not change,
+    and the ones drawn after it (the suffix) are the old ones moved by the change of the turtle's
+    position and heading, as long as the pen is in the same state after the edit. Crossings within
+    the prefix and within the suffix are then the same as before, so only the new segments and
+    the pairs of a prefix and a suffix segment are checked, against a SegmentIndex of the prefix
+    that is kept from edit to edit.
+
+    Coordinates are rounded after every move, so a suffix turned by anything else than a multiple
+    of 90 degrees is only nearly a rotation of the old one, and a retrace can stop overlapping the
+    segment it retraces. Only a shift or a quarter turn, which move the fixed-point coordinates
+    exactly, keep the old suffix. Any other turn, a change of the pen state, and an edit that
+    removes a segment of the known crossing are checked again in full. Float coordinates are not
+    even shifted exactly, so in the float mode a touch within the suffix can come and go like it
+    does between a float check and an exact one; a known crossing is confirmed before it is kept.
+    """
+    fixedPoint: bool
+    engine: str # Engine of the full checks, see AnyIntersections.ENGINES
+    witness: Optional[Tuple[int, int]] # Indices of an intersecting pair of segments of the current version
+
+    def __init__(self, commands: Iterable[Command] = (), fixedPoint: bool = False, engine: str = 'auto'):
+        commands = list(commands)
+        self.fixedPoint = fixedPoint
+        self.engine = engine
+        self.processor = CommandsProcessor(fixedPoint)
+        self.opcodes = np.array([OPCODES[command.command_type] for command in commands], dtype=np.uint8)
+        self.values = np.array([command.value or 0 for command in commands], dtype=np.int64)
+        self.index = SegmentIndex(SegmentStore(typecode='q' if fixedPoint else 'd'))
+        self._update()
+        self.witness = self._fullCheck()
+
+    @classmethod
+    def from_file(cls, filename, fixedPoint: bool = False, engine: str = 'auto') -> 'EditSession':
+        session = cls(fixedPoint=fixedPoint, engine=engine)
+        chunks = list(InputParser.iter_command_arrays(filename))
+        if chunks:
+            session.opcodes = np.concatenate([opcodes for opcodes, _ in chunks]).astype(np.uint8)
+            session.values = np.concatenate([values for _, values in chunks]).astype(np.int64)
+            session._update()
+            session.witness = session._fullCheck()
+        return session
+
+    def __len__(self) -> int:
+        return len(self.opcodes)
+
+    def segments(self) -> SegmentStore:
+        return SegmentStore.from_arrays(*self.coordinates)
+
+    def insert(self, index: int, command: Command) -> Tuple[bool, float, str]:
+        return self.edit(index, index, [command])
+
+    def delete(self, index: int) -> Tuple[bool, float, str]:
+        return self.edit(index, index + 1)
+
+    def replace(self, index: int, command: Command) -> Tuple[bool, float, str]:
+        return self.edit(index, index + 1, [command])
+
+    def edit(self, start: int, stop: int, commands: Iterable[Command] = ()) -> Tuple[bool, float, str]:
+        """
+        Replaces the commands start to stop (exclusive) and checks the new version for intersections.
+
+        Returns:
+            Tuple[bool, float, str]: Whether the new version has an intersection, the time of the
+            edit in ms, and 'incremental' or 'full' for how it was checked.
+        """
+        begin = perf_counter()
+        commands = list(commands)
+        prefixLength, oldSuffixStart = int(self.drawnBefore[start]), int(self.drawnBefore[stop])
+        oldHeading, oldPen = int(self.headings[stop]), bool(self.pens[stop])
+
+        self.opcodes = np.concatenate((self.opcodes[:start], np.array([OPCODES[command.command_type] for command in commands], dtype=np.uint8), self.opcodes[stop:]))
+        self.values = np.concatenate((self.values[:start], np.array([command.value or 0 for command in commands], dtype=np.int64), self.values[stop:]))
+        self._update()
+
+        resume = start + len(commands)
+        suffixStart = int(self.drawnBefore[resume])
+        turn = (int(self.headings[resume]) - oldHeading) % 360
+        rigid = bool(self.pens[resume]) == oldPen and turn % 90 == 0
+        self.index.truncate(prefixLength)
+
+        mode = 'incremental'
+        if self.witness is not None and self.witness[1] < prefixLength:
+            pass
+        elif self.witness is not None and self.witness[0] >= oldSuffixStart and rigid \
+                and self._intersect(self.witness[0] + suffixStart - oldSuffixStart, self.witness[1] + suffixStart - oldSuffixStart):
+            shift = suffixStart - oldSuffixStart
+            self.witness = (self.witness[0] + shift, self.witness[1] + shift)
+        elif self.witness is None and rigid:
+            self.witness = self._crossCheck(prefixLength, suffixStart)
+        else:
+            self.witness = self._fullCheck()
+            mode = 'full'
+        return [self.witness is not None, (perf_counter() - begin) * 1000, mode]
+
+    def _update(self):
+        # Turtle state before every command, and the segments of the whole program
+        opcodes, values = self.opcodes, self.values
+        turns = np.where(opcodes == OPCODES[CommandType.RIGHT_TURN], values, 0) \
+            - np.where(opcodes == OPCODES[CommandType.LEFT_TURN], values, 0)
+        self.headings = np.mod(np.concatenate(([0], np.cumsum(turns))), 360)
+
+        isPenCommand = (opcodes == OPCODES[CommandType.PEN_DOWN]) | (opcodes == OPCODES[CommandType.PEN_UP])
+        lastPenCommand = np.maximum.accumulate(np.where(isPenCommand, np.arange(len(opcodes)), -1))
+        self.pens = np.concatenate(([True], np.where(lastPenCommand < 0, True, opcodes[lastPenCommand] == OPCODES[CommandType.PEN_DOWN])))
+
+        isMove = (opcodes == OPCODES[CommandType.MOVE_FORWARD]) | (opcodes == OPCODES[CommandType.MOVE_BACKWARDS])
+        self.drawnBefore = np.concatenate(([0], np.cumsum(isMove & self.pens[:-1])))
+        self.coordinates = self.processor.processArrays(opcodes, values)
+
+    def _intersect(self, first: int, second: int) -> bool:
+        return intersect_coordinates(*(array[first].item() for array in self.coordinates), *(array[second].item() for array in self.coordinates))
+
+    def _fullCheck(self) -> Optional[Tuple[int, int]]:
+        return AnyIntersections.find(self.segments(), self.engine)[0]
+
+    def _crossCheck(self, prefixLength: int, suffixStart: int) -> Optional[Tuple[int, int]]:
+        # Checks the new segments against everything before them and the suffix against the
+        # prefix and the new segments, given that neither the prefix nor the suffix intersects itself
+        x0, y0, x1, y1 = self.coordinates
+        indexed = len(self.index)
+        if indexed < prefixLength:
+            self.index.extend(x0[indexed:prefixLength], y0[indexed:prefixLength], x1[indexed:prefixLength], y1[indexed:prefixLength])
+
+        for label in range(prefixLength, suffixStart):
+            startX, startY, endX, endY = x0[label].item(), y0[label].item(), x1[label].item(), y1[label].item()
+            segment = Segment(Node(startX, startY), Node(endX, endY))
+            crossed = self.index.crossings(segment)
+            if crossed:
+                return crossed[0], label
+            self.index.append(segment)
+
+        if suffixStart == 0 or suffixStart == len(x0):
+            return None
+        minX, minY = np.minimum(x0[suffixStart:], x1[suffixStart:]), np.minimum(y0[suffixStart:], y1[suffixStart:])
+        maxX, maxY = np.maximum(x0[suffixStart:], x1[suffixStart:]), np.maximum(y0[suffixStart:], y1[suffixStart:])
+        chunks = np.arange(0, len(minX), SUFFIX_CHUNK)
+        near = np.flatnonzero(self.index.near(np.minimum.reduceat(minX, chunks), np.minimum.reduceat(minY, chunks),
+                                              np.maximum.reduceat(maxX, chunks), np.maximum.reduceat(maxY, chunks)))
+        candidates = (near[:, None] * SUFFIX_CHUNK + np.arange(SUFFIX_CHUNK)).ravel()
+        candidates = candidates[candidates < len(minX)]
+        queries, labels = self.index.overlapping(minX[candidates], minY[candidates], maxX[candidates], maxY[candidates])
+
+        suffixLabels = candidates[queries] + suffixStart
+        order = np.lexsort((labels, suffixLabels))
+        suffixLabels, labels = suffixLabels[order], labels[order]
+        for label, suffixLabel, coordinates in zip(labels.tolist(), suffixLabels.tolist(),
+                                                   zip(*(array[suffixLabels].tolist() for array in self.coordinates))):
+            if intersect_coordinates(*self.index.store.coordinates(label), *coordinates):
+                return label, suffixLabel
+        return None
@@ -0,0 +1,248 @@
+import heapq
+import os
+import shutil
+import tempfile
+import numpy as np
+from time import perf_counter
+from typing import Iterator, Optional, Tuple
+from check_stats import CheckStats
+from commands_processor import CommandsProcessor
+from input_parser import InputParser
+from intersection_checker import intersect_coordinates
+from newAvlTree import StatusNode, SweepStatus
+
+RUN_EVENTS = 1 << 21 # Events sorted in memory at once and written as one run (25 bytes each)
+READ_EVENTS = 1 << 12 # Events read from every run at once while the runs are merged
+LEFT, RIGHT = 0, 1 # Event kinds, a segment starts before another one ends at the same x
+
+class ExternalSweep:
+    """
+    The sweep of first_intersection over a path too large for memory, with its events on disk.
+
+    Segments are added in batches as they are processed, e.g. by from_file, which streams
+    them from the file. Their endpoints and slope are appended to a file of packed records,
+    and their endpoint events to a buffer of runEvents packed events, which is sorted with
+    `lexsort` and written out as a run whenever it is full. The sweep then merges the runs
+    with a heap, READ_EVENTS at a time from each, in the order of the sweep of first_intersection.
+    Only the edges at the sweep line are in memory, each read back from the memory-mapped records
+    by its index when it starts. Peak memory is the buffer, the read blocks of the runs and the
+    sweep status, whatever the length of the path.
+
+    It finds the same pair as that sweep, but there is no collinear_overlap pass ahead of it,
+    so for a path with retraces the witness can be another pair than first_intersection's.
+    """
+    count: int # Segments added so far
+    runEvents: int
+    typecode: Optional[str] # 'd' or 'q' like in SegmentStore, set by the first batch
+
+    def __init__(self, directory: Optional[str] = None, runEvents: int = RUN_EVENTS):
+        self.count = 0
+        self.runEvents = runEvents
+        self.typecode = None
+        self.directory = tempfile.mkdtemp(prefix='turtle-sweep-', dir=directory)
+        self._segments = open(os.path.join(self.directory, 'segments'), 'wb')
+        self._runs: list[str] = []
+        self._buffer: Optional[np.ndarray] = None
+        self._buffered = 0
+
+    @classmethod
+    def from_file(cls, filename, fixedPoint: bool = False, directory: Optional[str] = None, runEvents: int = RUN_EVENTS) -> 'ExternalSweep':
+        """
+        Streams the segments of a command file (text or binary) into a new ExternalSweep.
+        """
+        sweep = cls(directory, runEvents)
+        try:
+            for batch in CommandsProcessor(fixedPoint).processArrayChunks(InputParser.iter_command_arrays(filename)):
+                sweep.add(*batch)
+        except BaseException:
+            sweep.close()
+            raise
+        return sweep
+
+    def __enter__(self) -> 'ExternalSweep':
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add(self, x0: np.ndarray, y0: np.ndarray, x1: np.ndarray, y1: np.ndarray):
+        """
+        Adds a batch of segments, e.g. from CommandsProcessor.processArrays, after those added before.
+        """
+        x0, y0, x1, y1 = (np.asarray(array) for array in (x0, y0, x1, y1))
+        n = len(x0)
+        if not n:
+            return
+        if self.typecode is None:
+            self.typecode = 'd' if x0.dtype.kind == 'f' else 'q'
+            self._buffer = np.empty(self.runEvents, dtype=_event_dtype(self.typecode))
+
+        swap = (x1 < x0) | ((x1 == x0) & (y1 < y0))
+        records = np.empty(n, dtype=_segment_dtype(self.typecode))
+        records['lx'], records['ly'] = np.where(swap, x1, x0), np.where(swap, y1, y0)
+        records['rx'], records['ry'] = np.where(swap, x0, x1), np.where(swap, y0, y1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            records['slope'] = np.where(records['rx'] != records['lx'],
+                                        (records['ry'] - records['ly']) / (records['rx'] - records['lx']), np.inf)
+        records.tofile(self._segments)
+
+        labels = np.arange(self.count, self.count + n)
+        self._addEvents(records['lx'], records['ly'], LEFT, labels)
+        self._addEvents(records['rx'], records['ry'], RIGHT, labels)
+        self.count += n
+
+    def check(self, stats: Optional[CheckStats] = None) -> Tuple[bool, float, str]:
+        witness, execution_time, engine = self.find(stats)
+        return [witness is not None, execution_time, engine]
+
+    def find(self, stats: Optional[CheckStats] = None) -> Tuple[Optional[Tuple[int, int]], float, str]:
+        """
+        Same result as AnyIntersections.find with the sweep engine, on the segments added so far,
+        with the witness of its sweep alone (see the class docstring). The time covers the last run and the sweep, not the runs written while adding.
+        """
+        start = perf_counter()
+        self._flush()
+        self._segments.flush()
+        sorted_ = perf_counter()
+        witness = self._sweep(stats) if self.count >= 2 else None
+        if stats is not None:
+            stats.phases['sort'] = stats.phases.get('sort', 0.0) + (sorted_ - start) * 1000
+            stats.phases['sweep'] = stats.phases.get('sweep', 0.0) + (perf_counter() - sorted_) * 1000
+        return [witness, (perf_counter() - start) * 1000, 'external']
+
+    def close(self):
+        """
+        Deletes the files on disk.
+        """
+        self._segments.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _addEvents(self, xs: np.ndarray, ys: np.ndarray, kind: int, labels: np.ndarray):
+        # Copies events into the buffer, writing a run every time it is full
+        done = 0
+        while done < len(xs):
+            taken = min(len(xs) - done, self.runEvents - self._buffered)
+            events = self._buffer[self._buffered:self._buffered + taken]
+            events['x'], events['y'] = xs[done:done + taken], ys[done:done + taken]
+            events['kind'], events['label'] = kind, labels[done:done + taken]
+            self._buffered += taken
+            done += taken
+            if self._buffered == self.runEvents:
+                self._flush()
+
+    def _flush(self):
+        # Writes the buffered events as a run in sweep order: x, left before right, y, segment
+        if not self._buffered:
+            return
+        events = self._buffer[:self._buffered]
+        run = os.path.join(self.directory, f'run{len(self._runs)}')
+        events[np.lexsort((events['label'], events['y'], events['kind'], events['x']))].tofile(run)
+        self._runs.append(run)
+        self._buffered = 0
+
+    def _sweep(self, stats: Optional[CheckStats]) -> Optional[Tuple[int, int]]:
+        segments = np.memmap(self._segments.name, dtype=_segment_dtype(self.typecode), mode='r', shape=(self.count,))
+        runs = [_read_run(run, _event_dtype(self.typecode)) for run in self._runs]
+        edges: dict[int, Tuple[float, float, float, float, float]] = {} # lx, ly, rx, ry and slope of the edges at the sweep line
+        nodes: dict[int, StatusNode] = {}
+        sweepX = 0.0
+
+        def y_at_sweep(label: int) -> float:
+            lx, ly, rx, ry, slope = edges[label]
+            if sweepX == lx:
+                return ly
+            if sweepX == rx:
+                return ry
+            return ly + (sweepX - lx) * slope
+
+        class Edge:
+            __slots__ = ('label',)
+            label: int # Segment index
+
+            def __init__(self, label: int):
+                self.label = label
+
+            def __lt__(self, other: 'Edge') -> bool:
+                y, other_y = y_at_sweep(self.label), y_at_sweep(other.label)
+                if y != other_y:
+                    return y < other_y
+                slope, other_slope = edges[self.label][4], edges[other.label][4]
+                if slope != other_slope:
+                    return slope < other_slope
+                return self.label < other.label
+
+        def test(first: int, second: int) -> bool:
+            return intersect_coordinates(*edges[first][:4], *edges[second][:4])
+
+        if stats is not None:
+            # Counting versions, so that a check without stats pays nothing for them
+            class Edge(Edge):
+                __slots__ = ()
+
+                def __lt__(self, other: 'Edge') -> bool:
+                    stats.comparisons += 1
+                    return super().__lt__(other)
+
+            uncounted = test
+
+            def test(first: int, second: int) -> bool:
+                stats.intersectCalls += 1
+                return uncounted(first, second)
+
+        activeEdges: SweepStatus[Edge] = SweepStatus[Edge]()
+        witness = None
+        processed = 0
+        try:
+            for processed, (x, kind, _, label) in enumerate(heapq.merge(*runs), 1):
+                sweepX = x
+                if kind == LEFT:
+                    edges[label] = tuple(segments[label].tolist())
+                    node = nodes[label] = activeEdges.insert(Edge(label))
+                    if stats is not None:
+                        stats.maxHeight = max(stats.maxHeight, activeEdges.height)
+
+                    pre, suc = activeEdges.previous(node), activeEdges.next(node)
+                    if pre is not None and test(label, pre.val.label):
+                        witness = tuple(sorted((label, pre.val.label)))
+                        break
+                    if suc is not None and test(label, suc.val.label):
+                        witness = tuple(sorted((label, suc.val.label)))
+                        break
+                else:
+                    node = nodes.pop(label)
+                    pre, suc = activeEdges.previous(node), activeEdges.next(node)
+                    if pre is not None and suc is not None and test(pre.val.label, suc.val.label):
+                        witness = tuple(sorted((pre.val.label, suc.val.label)))
+                        break
+                    activeEdges.remove(node)
+                    del edges[label]
+        finally:
+            for run in runs:
+                run.close()
+            del segments
+
+        if stats is not None:
+            stats.events += processed
+            stats.rotations += activeEdges.rotations
+        return witness
+
+
+def _segment_dtype(typecode: str) -> np.dtype:
+    coordinate = '<f8' if typecode == 'd' else '<i8'
+    return np.dtype([('lx', coordinate), ('ly', coordinate), ('rx', coordinate), ('ry', coordinate), ('slope', '<f8')])
+
+def _event_dtype(typecode: str) -> np.dtype:
+    coordinate = '<f8' if typecode == 'd' else '<i8'
+    return np.dtype([('x', coordinate), ('kind', 'u1'), ('y', coordinate), ('label', '<i8')])
+
+def _read_run(filename: str, dtype: np.dtype) -> Iterator[Tuple[float, int, float, int]]:
+    # Events of a run as tuples, which compare in the order the run is sorted in
+    with open(filename, 'rb') as file:
+        while True:
+            events = np.fromfile(file, dtype=dtype, count=READ_EVENTS)
+            if not len(events):
+                return
+            yield from zip(events['x'].tolist(), events['kind'].tolist(), events['y'].tolist(), events['label'].tolist())
@@ -1,28 +1,258 @@
 import logging
+import mmap
+import numpy as np
+import binary_format
+from typing import Iterable, Iterator, Optional, Tuple
 from command import *
 
+CHUNK_SIZE = 1 << 20 # Bytes of the mapped file decoded at once
+BATCH_SIZE = 1 << 16 # Commands per array batch of iter_command_arrays
+
+COMMAND_TYPES = {command_type.value: command_type for command_type in CommandType}
+VALUE_COMMANDS = {CommandType.MOVE_FORWARD.value, CommandType.MOVE_BACKWARDS.value, CommandType.LEFT_TURN.value, CommandType.RIGHT_TURN.value}
+PEN_COMMANDS = {CommandType.PEN_DOWN.value, CommandType.PEN_UP.value}
+REPEAT = 'repeat'
+VALUE_OPCODES = np.array([OPCODES[COMMAND_TYPES[command]] for command in VALUE_COMMANDS])
+MAX_DIGITS = 18 # Longer values are left to the line-by-line parser, as they may not fit in an int64
+POWERS_OF_TEN = 10 ** np.arange(MAX_DIGITS, dtype=np.int64)
+INT64 = np.iinfo(np.int64) # Range of the values iter_command_arrays can hold
+
+def _byte_table(characters: bytes) -> np.ndarray:
+    table = np.zeros(256, dtype=bool)
+    table[list(characters)] = True
+    return table
+
+WHITESPACE = _byte_table(b' \t\n\r\x0b\x0c') # What bytes.split() splits on
+LINE_BREAKS = _byte_table(b'\n\r')
+DIGITS = _byte_table(b'0123456789')
+
+def _token_table() -> np.ndarray:
+    # Opcode of every two-byte token, looked up by first byte * 256 + second byte, -1 for other tokens
+    table = np.full(1 << 16, -1, dtype=np.int16)
+    for command_type in CommandType:
+        table[int.from_bytes(command_type.value.encode(), 'big')] = OPCODES[command_type]
+    return table
+
+TOKEN_OPCODES = _token_table()
+
 class InputParser:
-    
+
     @staticmethod
     def parse_file(filename) -> list[Command]:
-        commands = []
+        return list(InputParser.iter_commands(filename))
+
+    @staticmethod
+    def iter_commands(filename, chunk_size: int = CHUNK_SIZE) -> Iterator[Command]:
+        """
+        Lazily parses a command file, see iter_parsed.
+
+        Args:
+            filename: Path of the command file.
+            chunk_size (int): Bytes of the mapped file decoded at once.
+
+        Yields:
+            Command: The parsed commands, in file order.
+        """
+        for command_type, value in InputParser.iter_parsed(filename, chunk_size):
+            yield Command(command_type, value)
+
+    @staticmethod
+    def iter_command_arrays(filename, chunk_size: int = CHUNK_SIZE, batch_size: int = BATCH_SIZE) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Bulk variant of iter_commands that skips Command objects entirely. Binary command files
+        (see binary_format) are not parsed at all, the batches are views of the mapped file.
+
+        Text files are parsed a chunk of the mapped file at a time with whole-array operations
+        (see _parse_chunk). From the first chunk that is not plain `command value` lines, e.g.
+        one with a repeat block or a malformed line, the rest of the file goes through
+        iter_parsed, so that blocks are expanded and errors are reported like there. A value
+        that does not fit in an int64 is logged as a warning and its command skipped.
+
+        Yields:
+            Tuple[np.ndarray, np.ndarray]: Batches of opcodes (see OPCODES) and values,
+            ready for CommandsProcessor.processArrays.
+        """
+        if binary_format.is_binary(filename):
+            yield from InputParser._read_binary(binary_format.iter_arrays, filename, batch_size)
+            return
+
+        start, lines = 0, 0
         try:
-            with open(filename, 'r') as file:
-                for line_num, line in enumerate(file, start=1):
-                    parts = line.strip().split()
-                    if len(parts) == 2:
-                        command_type, value = parts
-                        if command_type in [CommandType.MOVE_FORWARD.value, CommandType.MOVE_BACKWARDS.value, CommandType.LEFT_TURN.value, CommandType.RIGHT_TURN.value]:
-                            value = int(value)
-                        commands.append(Command(command_type, value))
-                    elif len(parts) == 1:
-                        command_type = parts[0]
-                        if command_type in [CommandType.PEN_DOWN.value, CommandType.PEN_UP.value]:
-                            commands.append(Command(command_type))
-                        else:
-                            logging.warning(f"Value missing at line {line_num}: {line}")
+            with open(filename, 'rb') as file:
+                if file.seek(0, 2) == 0:
+                    return
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    for start, end in InputParser._iter_chunks(data, chunk_size):
+                        chunk = data[start:end]
+                        parsed = InputParser._parse_chunk(chunk)
+                        if parsed is None:
+                            break
+                        opcodes, values = parsed
+                        for position in range(0, len(opcodes), batch_size):
+                            yield opcodes[position:position + batch_size], values[position:position + batch_size]
+                        lines += InputParser._count_lines(chunk)
                     else:
-                        logging.warning(f"Invalid command at line {line_num}: {line}")
+                        return
+        except OSError:
+            pass # Reported by the line-by-line parser below
+
+        opcodes: list[int] = []
+        values: list[int] = []
+        for command_type, value in InputParser._iter_items(filename, chunk_size, expand=True, start=start, first_line=lines + 1):
+            if type(value) is int and not INT64.min <= value <= INT64.max:
+                logging.warning(f"Value out of range, skipped: {command_type.value} {value}")
+                continue
+            opcodes.append(OPCODES[command_type])
+            values.append(value if type(value) is int else 0)
+            if len(opcodes) == batch_size:
+                yield np.array(opcodes, dtype=np.uint8), np.array(values, dtype=np.int64)
+                opcodes, values = [], []
+        if opcodes:
+            yield np.array(opcodes, dtype=np.uint8), np.array(values, dtype=np.int64)
+
+    @staticmethod
+    def _parse_chunk(chunk: bytes) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        # Opcodes and values of a chunk made only of `command value` and pen command lines, or None
+        # if any line of it needs the line-by-line parser. Tokens are found on the raw bytes: a
+        # command must be the first token of its line and a value the second and last one, and
+        # there must be a command per line, as blank lines are warned about.
+        if not chunk or not chunk.isascii() or b'[' in chunk:
+            return None
+        data = np.frombuffer(chunk, dtype=np.uint8)
+        space = WHITESPACE[data]
+        starts = np.flatnonzero(~space & np.concatenate(([True], space[:-1])))
+        ends = np.flatnonzero(~space & np.concatenate((space[1:], [True]))) + 1
+        line = np.cumsum(LINE_BREAKS[data])[starts]
+        first = np.concatenate(([True], line[1:] != line[:-1]))
+
+        keys = data[starts].astype(np.int32) * 256 + data[np.minimum(starts + 1, len(data) - 1)]
+        codes = np.where(ends - starts == 2, TOKEN_OPCODES[keys], -1)
+        isCommand = codes >= 0
+        takesValue = np.isin(codes, VALUE_OPCODES)
+        if not np.array_equal(isCommand, first) or not np.array_equal(takesValue, np.concatenate((~first[1:], [False]))) \
+                or np.count_nonzero(isCommand) != InputParser._count_lines(chunk):
+            return None
+
+        # A value is an optional sign and decimal digits, summed up digit by digit
+        valueStarts, valueEnds = starts[~isCommand], ends[~isCommand]
+        signs = data[valueStarts]
+        digitStarts = valueStarts + ((signs == ord('-')) | (signs == ord('+')))
+        lengths = valueEnds - digitStarts
+        if np.any(lengths < 1) or np.any(lengths > MAX_DIGITS):
+            return None
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        positions = np.arange(lengths.sum()) + np.repeat(digitStarts - offsets, lengths)
+        if not np.all(DIGITS[data[positions]]):
+            return None
+        digits = (data[positions] - ord('0')).astype(np.int64) * POWERS_OF_TEN[np.repeat(valueEnds, lengths) - positions - 1]
+        parsed = np.add.reduceat(digits, offsets) if len(lengths) else digits
+        parsed[signs == ord('-')] *= -1
+
+        values = np.zeros(np.count_nonzero(isCommand), dtype=np.int64)
+        values[takesValue[isCommand]] = parsed
+        return codes[isCommand].astype(np.uint8), values
+
+    @staticmethod
+    def _count_lines(chunk: bytes) -> int:
+        # Number of lines _iter_lines yields for a chunk
+        if b'\r' in chunk:
+            chunk = chunk.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+        return chunk.count(b'\n') + (len(chunk) > 0 and not chunk.endswith(b'\n'))
+
+    @staticmethod
+    def parse_program(filename, chunk_size: int = CHUNK_SIZE) -> list:
+        """
+        Parses a command file like parse_file, but keeps `repeat N [ ... ]` blocks as Repeat
+        objects instead of expanding them.
+
+        Returns:
+            list: Commands and Repeats, in file order.
+        """
+        return [item if type(item) is Repeat else Command(*item) for item in InputParser._iter_items(filename, chunk_size, expand=False)]
+
+    @staticmethod
+    def has_repeats(filename) -> bool:
+        """
+        Checks whether a text command file has a `repeat` block, without parsing it.
+        """
+        if binary_format.is_binary(filename):
+            return False
+        with open(filename, 'rb') as file:
+            if file.seek(0, 2) == 0:
+                return False
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return data.find(b'[') >= 0
+
+    @staticmethod
+    def iter_parsed(filename, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[CommandType, Optional[int]]]:
+        """
+        Parses a command file through mmap, chunk by chunk, in constant memory.
+
+        Malformed lines are reported exactly like the original line-by-line parser did:
+        lines with a wrong number of parts are logged as warnings and skipped, while an
+        unknown command or a bad value is logged as an error and ends parsing. Binary command
+        files (see binary_format) are recognized by their header and read instead.
+
+        A line starting with `repeat` opens a `repeat N [ ... ]` block, which may span lines and
+        nest, and the block is expanded lazily (see iter_expanded). The `[` must be on the line of
+        the `repeat`, a line without one is logged as a warning and skipped. Any other malformed
+        or an unterminated block is an error like an unknown command.
+
+        Yields:
+            Tuple[CommandType, Optional[int]]: Command type and value of each command.
+        """
+        return InputParser._iter_items(filename, chunk_size, expand=True)
+
+    @staticmethod
+    def _iter_items(filename, chunk_size: int, expand: bool, start: int = 0, first_line: int = 1) -> Iterator:
+        # Command types and values like iter_parsed, and Repeat objects for the blocks unless they are expanded.
+        # Text files are read from byte offset `start` on, which is line `first_line` of the file.
+        if binary_format.is_binary(filename):
+            yield from InputParser._read_binary(binary_format.iter_parsed, filename)
+            return
+
+        line_num = first_line - 1
+        block: Optional[list[str]] = None # Tokens of the repeat block being read
+        block_line = depth = 0
+        try:
+            with open(filename, 'rb') as file:
+                for line_num, line in enumerate(InputParser._iter_lines(file, chunk_size, start), start=first_line):
+                    if block is None:
+                        parts = line.split()
+                        if len(parts) == 2 and parts[0] != REPEAT:
+                            command_type, value = parts
+                            if command_type in VALUE_COMMANDS:
+                                value = int(value)
+                            yield COMMAND_TYPES.get(command_type) or CommandType(command_type), value
+                            continue
+                        elif len(parts) == 1 and parts[0] != REPEAT:
+                            command_type = parts[0]
+                            if command_type in PEN_COMMANDS:
+                                yield COMMAND_TYPES[command_type], None
+                            else:
+                                logging.warning(f"Value missing at line {line_num}: {line}")
+                            continue
+                        elif not parts or parts[0] != REPEAT:
+                            logging.warning(f"Invalid command at line {line_num}: {line}")
+                            continue
+                        elif '[' not in line:
+                            # Reading on to the next '[' would swallow every line up to it
+                            logging.warning(f"Repeat block not opened at line {line_num}: {line}")
+                            continue
+                        block, block_line, depth = [], line_num, 0
+
+                    block.extend(line.replace('[', ' [ ').replace(']', ' ] ').split())
+                    depth += line.count('[') - line.count(']')
+                    if depth <= 0 and '[' in block:
+                        repeat = InputParser._parse_block(block)
+                        block = None
+                        if expand:
+                            for command in iter_expanded([repeat]):
+                                yield command.command_type, command.value
+                        else:
+                            yield repeat
+            if block is not None:
+                logging.error(f"Unterminated repeat block starting at line {block_line}.")
         except FileNotFoundError:
             logging.error(f"File '{filename}' not found.")
         except ValueError as e:
@@ -30,7 +260,88 @@ class InputParser:
         except Exception as e:
             logging.error(f"An error occurred: {e}")
 
-        return commands
+    @staticmethod
+    def _parse_block(tokens: list[str]) -> Repeat:
+        # Parses the tokens of one `repeat N [ ... ]` block, nested blocks included
+        position = 0
+
+        def parse_repeat() -> Repeat:
+            nonlocal position
+            if position + 2 >= len(tokens) or tokens[position + 2] != '[':
+                raise ValueError(f"expected 'repeat N [' but got '{' '.join(tokens[position:position + 3])}'")
+            count = int(tokens[position + 1])
+            if count < 0:
+                raise ValueError(f"negative repeat count {count}")
+            position += 3
+            body = []
+            while position < len(tokens) and tokens[position] != ']':
+                token = tokens[position]
+                if token == REPEAT:
+                    body.append(parse_repeat())
+                    continue
+                command_type = COMMAND_TYPES.get(token) or CommandType(token)
+                if token in PEN_COMMANDS:
+                    body.append(Command(command_type))
+                    position += 1
+                elif position + 1 < len(tokens) and tokens[position + 1] not in '[]':
+                    body.append(Command(command_type, int(tokens[position + 1])))
+                    position += 2
+                else:
+                    raise ValueError(f"value missing after '{token}' in a repeat block")
+            position += 1
+            return Repeat(count, body)
+
+        repeat = parse_repeat()
+        if position != len(tokens):
+            raise ValueError(f"unexpected '{' '.join(tokens[position:])}' after a repeat block")
+        return repeat
+
+    @staticmethod
+    def _read_binary(reader, filename, *args) -> Iterator:
+        try:
+            yield from reader(filename, *args)
+        except ValueError as e:
+            logging.error(f"Error reading binary file: {e}")
+
+    @staticmethod
+    def _iter_chunks(data: mmap.mmap, chunk_size: int, start: int = 0) -> Iterator[Tuple[int, int]]:
+        # Byte ranges of about chunk_size from `start` on, each ending on a line break
+        size = len(data)
+        while start < size:
+            end = size
+            if start + chunk_size < size:
+                end = data.rfind(b'\n', start, start + chunk_size) + 1 or data.find(b'\n', start + chunk_size) + 1 or size
+            yield start, end
+            start = end
+
+    @staticmethod
+    def _iter_lines(file, chunk_size: int, start: int = 0) -> Iterator[str]:
+        # Yields lines like text-mode iteration does (universal newlines, '\n' kept),
+        # decoding the mapped file in chunks that end on a line break.
+        if file.seek(0, 2) == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for start, end in InputParser._iter_chunks(data, chunk_size, start):
+                text = data[start:end].decode()
+                if '\r' in text:
+                    text = text.replace('\r\n', '\n').replace('\r', '\n')
+                lines = text.split('\n')
+                for line in lines[:-1]:
+                    yield line + '\n'
+                if lines[-1]:
+                    yield lines[-1]
+
+    @staticmethod
+    def write_command_arrays_to_file(chunks: Iterable[Tuple[np.ndarray, np.ndarray]], filename):
+        """
+        Writes chunks of opcodes (see OPCODES) and values in the text format, chunk by chunk.
+        """
+        tokens = [command_type.value for command_type in OPCODES]
+        pen_opcodes = {OPCODES[CommandType.PEN_DOWN], OPCODES[CommandType.PEN_UP]}
+        with open(filename, 'w') as file:
+            for opcodes, values in chunks:
+                file.write(''.join(f"{tokens[opcode]}\n" if opcode in pen_opcodes else f"{tokens[opcode]} {value}\n"
+                                   for opcode, value in zip(opcodes.tolist(), values.tolist())))
 
     @staticmethod
     def write_commands_to_file(commands, filename):
@@ -42,4 +353,4 @@ class InputParser:
                     else:
                         file.write(f"{command.command_type.value} {command.value}\n")
         except Exception as e:
-            logging.error(f"An error occurred while writing to file: {e}")
\ No newline at end of file
+            logging.error(f"An error occurred while writing to file: {e}")
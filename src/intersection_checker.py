@@ -1,11 +1,44 @@
-from timeit import timeit
-from typing import Tuple
-from newAvlTree import AVL_Tree, TreeNode, findPreSuc
-from segment import Node, Segment
+import heapq
+import logging
+import math
+import multiprocessing
+import os
+import queue
+from fractions import Fraction
+from multiprocessing import shared_memory
+import numpy as np
+from time import perf_counter
+from typing import Callable, Iterator, Optional, Tuple, Union
+from check_stats import CheckStats
+from commands_processor import SCALE
+from newAvlTree import StatusNode, SweepStatus
+from segment import Node, Segment, SegmentStore
+
+FLOAT_ERROR = 1e-12 # Relative error bound below which sweep comparisons switch to exact arithmetic
+FLOAT_TOLERANCE = 1e-6 # Slack on segment parameters before a candidate crossing is rejected in floating point
+CELL_MARGIN = 1e-7 # Segments also claim grid cells they only touch within this margin
+LENGTH_SAMPLE = 1024 # Segments sampled for the length statistics of the engine selection
+GRID_MIN_SEGMENTS = 64 # Below this the sweep is always fast enough
+GRID_MAX_SPREAD = 4.0 # Largest 90th percentile / median length ratio the grid is used for
+GRID_MAX_OCCUPANCY = 4.0 # Largest expected number of segments per grid cell the grid is used for
+CHAIN_MIN_LENGTH = 2.0 # Smallest average number of segments per monotone chain the chain sweep is used for
+SLAB_MIN_SEGMENTS = 20_000 # Below this starting worker processes costs more than the sweep itself
+SLAB_MAX_DUPLICATION = 1.5 # Largest average number of slabs per segment before the slabs fall back to one sweep
+SLAB_POLL_INTERVAL = 0.1 # Seconds between checks that the slab workers still running are alive
+RETRACE_MIN_SEGMENTS = 64 # Below this the sweeps find overlaps on a common line as fast as collinear_overlap
+LINE_KEY_LIMIT = 2.0 ** 62 # Segments whose line offset (see collinear_overlap) may reach this are left to the sweep
+LINE_HASH = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9], dtype=np.uint64) # Odd multipliers mixing line keys
+
+def orientation(px: float, py: float, x0: float, y0: float, x1: float, y1: float) -> float:
+    """
+    Coordinate form of `is_left` for a point (px, py) and a segment (x0, y0) -> (x1, y1).
+    """
+    return (x0 - px) * (y1 - py) - (y0 - py) * (x1 - px)
 
 def is_left(point: Node, segment: Segment) -> float:
     """
     Determines whether a point is to the left, on, or to the right of a line segment.
+    With integer coordinates (see the fixed-point mode of CommandsProcessor) the result is exact.
 
     Args:
         point (Node): The point to be checked.
@@ -17,11 +50,28 @@ def is_left(point: Node, segment: Segment) -> float:
                Negative if the point is to the right.
                Zero     if the point is on the segment.
     """
-    return (segment.start.x - point.x) * (segment.end.y - point.y) - (segment.start.y - point.y) * (segment.end.x - point.x)
+    return orientation(point.x, point.y, segment.start.x, segment.start.y, segment.end.x, segment.end.y)
+
+def within(px: float, py: float, x0: float, y0: float, x1: float, y1: float) -> bool:
+    """
+    Coordinate form of `on_segment` for a point (px, py) and a segment (x0, y0) -> (x1, y1).
+    """
+    # Inclusive bounds, so that points inside horizontal and vertical segments count too
+    return min(x0, x1) <= px <= max(x0, x1) and min(y0, y1) <= py <= max(y0, y1) \
+        and (px != x0 or py != y0) and (px != x1 or py != y1)
+
+def overlap(ax0: float, ay0: float, ax1: float, ay1: float, bx0: float, by0: float, bx1: float, by1: float) -> bool:
+    """
+    Checks whether two collinear segments share more than a single point, e.g. when the turtle retraces its path.
+    """
+    if ax0 == ax1 and bx0 == bx1:
+        # Vertical line, compare the y ranges instead of the x ranges
+        ax0, ax1, bx0, bx1 = ay0, ay1, by0, by1
+    return min(max(ax0, ax1), max(bx0, bx1)) > max(min(ax0, ax1), min(bx0, bx1))
 
 def on_segment(point: Node, segment: Segment) -> bool:
     """
-    Checks if a point lies on a given line segment.
+    Checks if a point lies on a given line segment, exactly for integer coordinates.
 
     Args:
         point (Node): The point to be checked.
@@ -30,11 +80,41 @@ def on_segment(point: Node, segment: Segment) -> bool:
     Returns:
         bool: True if the point lies on the segment, False otherwise or if point is exactly on either of end points of segment.
     """
-    return min(segment.start.x, segment.end.x) < point.x < max(segment.start.x, segment.end.x) and min(segment.start.y, segment.end.y) < point.y < max(segment.start.y, segment.end.y)
+    return within(point.x, point.y, segment.start.x, segment.start.y, segment.end.x, segment.end.y)
+
+def intersect_coordinates(ax0: float, ay0: float, ax1: float, ay1: float, bx0: float, by0: float, bx1: float, by1: float) -> bool:
+    """
+    Coordinate form of `intersect` for segments (ax0, ay0) -> (ax1, ay1) and (bx0, by0) -> (bx1, by1).
+    """
+    d1 = orientation(ax0, ay0, bx0, by0, bx1, by1)
+    d2 = orientation(ax1, ay1, bx0, by0, bx1, by1)
+    d3 = orientation(bx0, by0, ax0, ay0, ax1, ay1)
+    d4 = orientation(bx1, by1, ax0, ay0, ax1, ay1)
+
+    if ((d1 > 0 and d2 < 0) or (d1 < 0 and d2 > 0)) and ((d3 > 0 and d4 < 0) or (d3 < 0 and d4 > 0)):
+        return True
+    elif d1 == 0 and d2 == 0 and d3 == 0 and d4 == 0:
+        return overlap(ax0, ay0, ax1, ay1, bx0, by0, bx1, by1)
+    elif d1 == 0 and within(ax0, ay0, bx0, by0, bx1, by1):
+        return True
+    elif d2 == 0 and within(ax1, ay1, bx0, by0, bx1, by1):
+        return True
+    elif d3 == 0 and within(bx0, by0, ax0, ay0, ax1, ay1):
+        return True
+    elif d4 == 0 and within(bx1, by1, ax0, ay0, ax1, ay1):
+        return True
+    else:
+        return False
 
 def intersect(segment1: Segment, segment2: Segment) -> bool:
     """
-    Checks whether two line segments intersect.
+    Checks whether two line segments intersect. Segments that only share an endpoint, like
+    consecutive segments of a path, do not intersect, while collinear segments overlapping
+    in more than a point do.
+
+    Coordinates are only multiplied and compared, so with integer coordinates, e.g. from the
+    fixed-point mode of CommandsProcessor, every test is exact Python integer arithmetic and
+    touching segments are never misclassified.
 
     Args:
         segment1 (Segment): The first line segment.
@@ -43,100 +123,749 @@ def intersect(segment1: Segment, segment2: Segment) -> bool:
     Returns:
         bool: True if the line segments intersect, False otherwise.
     """
-    p1, p2 = segment1.start, segment1.end
-    p3, p4 = segment2.start, segment2.end
+    return intersect_coordinates(segment1.start.x, segment1.start.y, segment1.end.x, segment1.end.y,
+                                 segment2.start.x, segment2.start.y, segment2.end.x, segment2.end.y)
 
-    d1 = is_left(p1, segment2)
-    d2 = is_left(p2, segment2)
-    d3 = is_left(p3, segment1)
-    d4 = is_left(p4, segment1)
+def intersect_stored(store: SegmentStore, first: int, second: int) -> bool:
+    """
+    Checks whether two segments of a SegmentStore intersect, without building Segment objects.
 
-    if ((d1 > 0 and d2 < 0) or (d1 < 0 and d2 > 0)) and ((d3 > 0 and d4 < 0) or (d3 < 0 and d4 > 0)):
-        return True
-    elif d1 == 0 and on_segment(p1, segment2):
-        return True
-    elif d2 == 0 and on_segment(p2, segment2):
-        return True
-    elif d3 == 0 and on_segment(p3, segment1):
-        return True
-    elif d4 == 0 and on_segment(p4, segment1):
-        return True
-    else:
-        return False
+    Args:
+        store (SegmentStore): The segments.
+        first (int): Index of the first segment.
+        second (int): Index of the second segment.
 
+    Returns:
+        bool: True if the line segments intersect, False otherwise.
+    """
+    return intersect_coordinates(*store.coordinates(first), *store.coordinates(second))
 
-def any_intersections(segments: list[Segment]) -> bool:
-    class Endpoint:
-        node: Node
-        label: int # Segment index
-        isLeft: bool # Is endpoint left in segment (has lesser x)
 
-        def __init__(self, node: Node, label: int, isLeft: bool):
-            self.node = node
-            self.label = label
-            self.isLeft = isLeft
+def any_intersections(segments: Union[list[Segment], SegmentStore]) -> bool:
+    """
+    Checks whether any two segments intersect with a Shamos-Hoey sweep, see first_intersection.
+    """
+    return first_intersection(segments) is not None
 
-        def __lt__(self, other: 'Endpoint') -> bool:
-            if self.node.x == other.node.x:
-                if self.isLeft == other.isLeft:
-                    return self.node.y < other.node.y
-                else:
-                    return self.isLeft
-            else:
-                return self.node.x < other.node.x
+def first_intersection(segments: Union[list[Segment], SegmentStore], stats: Optional[CheckStats] = None) -> Optional[Tuple[int, int]]:
+    """
+    Finds a pair of intersecting segments with a Shamos-Hoey sweep in O(n log n).
 
-        def __gt__(self, other: 'Endpoint') -> bool:
-            if self.node.x == other.node.x:
-                if self.isLeft == other.isLeft:
-                    return self.node.y > other.node.y
-                else:
-                    return other.isLeft
-            else:
-                return self.node.x > other.node.x
+    The left and right endpoints and the slope of every segment are computed once up front
+    and the endpoint events are sorted with NumPy `lexsort` by x, left before right, y and
+    segment index. The sweep status orders edges by their y at the x of the current event,
+    so each new edge is only tested with `intersect()` against its neighbours, and the
+    neighbours of each ending edge against each other. Overlaps on a common line, the edges
+    the status orders worst, are looked for by collinear_overlap before any event is built.
 
+    Args:
+        segments (Union[list[Segment], SegmentStore]): The line segments to check.
+        stats (Optional[CheckStats]): Collects the counters and the retraces, sort and sweep times.
 
+    Returns:
+        Optional[Tuple[int, int]]: Indices of the first intersecting pair found, smaller one first,
+        or None if no two segments intersect.
+    """
+    store = SegmentStore.of(segments)
+    n = len(store)
+    if n < 2:
+        return None
+    witness = _retraces(store, stats)
+    if witness is not None:
+        return witness
+
+    start = perf_counter()
+    x0, y0 = np.frombuffer(store.x0, dtype=store.typecode), np.frombuffer(store.y0, dtype=store.typecode)
+    x1, y1 = np.frombuffer(store.x1, dtype=store.typecode), np.frombuffer(store.y1, dtype=store.typecode)
+    swap = (x1 < x0) | ((x1 == x0) & (y1 < y0))
+    leftX, leftY = np.where(swap, x1, x0), np.where(swap, y1, y0)
+    rightX, rightY = np.where(swap, x0, x1), np.where(swap, y0, y1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes = np.where(rightX != leftX, (rightY - leftY) / (rightX - leftX), np.inf)
+
+    # Event i < n is the left endpoint of segment i, event n + i its right endpoint
+    eventX = np.concatenate((leftX, rightX))
+    eventY = np.concatenate((leftY, rightY))
+    isRight = np.repeat(np.array([False, True]), n)
+    events = np.lexsort((np.arange(2 * n), eventY, isRight, eventX)).tolist()
+
+    lx, ly, rx, ry = leftX.tolist(), leftY.tolist(), rightX.tolist(), rightY.tolist()
+    slope = slopes.tolist()
+    sweepX = 0.0
+
+    def y_at_sweep(label: int) -> float:
+        # Vertical edges are placed at their lower endpoint
+        if sweepX == lx[label]:
+            return ly[label]
+        if sweepX == rx[label]:
+            return ry[label]
+        return ly[label] + (sweepX - lx[label]) * slope[label]
 
-        def __ne__(self, other: 'Endpoint') -> bool:
-            return not self.__eq__(other)
     class Edge:
+        __slots__ = ('label',)
         label: int  # Segment index
 
         def __init__(self, label: int):
             self.label = label
 
-        def _getNodesSorted(self) -> Tuple[Node, Node]:
-            segment = segments[self.label]
-            if segment.start.x == segment.end.x:
-                isStartLeft = segment.start.y < segment.end.y
-            else:
-                isStartLeft = segment.start.x < segment.end.x
+        def __lt__(self, other: 'Edge') -> bool:
+            y, other_y = y_at_sweep(self.label), y_at_sweep(other.label)
+            if y != other_y:
+                return y < other_y
+            # Edges meeting on the sweep line are ordered as they leave it
+            if slope[self.label] != slope[other.label]:
+                return slope[self.label] < slope[other.label]
+            return self.label < other.label
+
+    test = intersect_stored
+    if stats is not None:
+        # Counting versions, so that a check without stats pays nothing for them
+        class Edge(Edge):
+            __slots__ = ()
+
+            def __lt__(self, other: 'Edge') -> bool:
+                stats.comparisons += 1
+                return super().__lt__(other)
+
+        def test(store: SegmentStore, first: int, second: int) -> bool:
+            stats.intersectCalls += 1
+            return intersect_stored(store, first, second)
+
+    sorted_ = perf_counter()
+    activeEdges: SweepStatus[Edge] = SweepStatus[Edge]()
+    nodes: list[Optional[StatusNode[Edge]]] = [None] * n
+    witness = None
+    processed = 0
+    for processed, event in enumerate(events, 1):
+        if event < n:
+            # Edge is starting
+            sweepX = lx[event]
+            node = activeEdges.insert(Edge(event))
+            nodes[event] = node
+            if stats is not None:
+                stats.maxHeight = max(stats.maxHeight, activeEdges.height)
+
+            pre, suc = activeEdges.previous(node), activeEdges.next(node)
+            if pre is not None and test(store, event, pre.val.label):
+                witness = tuple(sorted((event, pre.val.label)))
+                break
+            if suc is not None and test(store, event, suc.val.label):
+                witness = tuple(sorted((event, suc.val.label)))
+                break
+        else:
+            # Edge is ending, its neighbours become adjacent
+            label = event - n
+            sweepX = rx[label]
+            node = nodes[label]
+
+            pre, suc = activeEdges.previous(node), activeEdges.next(node)
+            if pre is not None and suc is not None and test(store, pre.val.label, suc.val.label):
+                witness = tuple(sorted((pre.val.label, suc.val.label)))
+                break
+            activeEdges.remove(node)
+            nodes[label] = None
+
+    if stats is not None:
+        stats.events += processed
+        stats.rotations += activeEdges.rotations
+        stats.phases['sort'] = stats.phases.get('sort', 0.0) + (sorted_ - start) * 1000
+        stats.phases['sweep'] = stats.phases.get('sweep', 0.0) + (perf_counter() - sorted_) * 1000
+    return witness
+
+
+def monotone_chains(store: SegmentStore) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Splits a path into x-monotone chains: maximal runs of consecutive, connected segments that
+    all go left or all go right. A vertical segment only joins a chain between two segments
+    going the same way, and is a chain of its own otherwise. A chain can only touch itself
+    where its consecutive segments meet.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The segment indices of every chain in left to right
+        order, one chain after the other, and the offset of every chain in them (plus the total).
+    """
+    n = len(store)
+    x0, y0 = np.frombuffer(store.x0, dtype=store.typecode), np.frombuffer(store.y0, dtype=store.typecode)
+    x1, y1 = np.frombuffer(store.x1, dtype=store.typecode), np.frombuffer(store.y1, dtype=store.typecode)
+    direction = np.sign(x1 - x0).astype(np.int8)
+    connected = (x0[1:] == x1[:-1]) & (y0[1:] == y1[:-1])
+    inner = np.zeros(n, dtype=bool)
+    inner[1:-1] = (direction[1:-1] == 0) & connected[:-1] & connected[1:] & (direction[:-2] != 0) & (direction[:-2] == direction[2:])
+    joined = connected & (((direction[:-1] != 0) & (direction[:-1] == direction[1:])) | inner[1:] | inner[:-1])
+    offsets = np.concatenate(([0], np.flatnonzero(~joined) + 1, [n]))
+
+    # Chains going left are walked from their last segment
+    chain = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    indices = np.arange(n)
+    order = np.where(direction[offsets[:-1]][chain] < 0, offsets[chain] + offsets[chain + 1] - 1 - indices, indices)
+    return order, offsets
+
+def chain_first_intersection(segments: Union[list[Segment], SegmentStore], stats: Optional[CheckStats] = None) -> Optional[Tuple[int, int]]:
+    """
+    Finds a pair of intersecting segments with a sweep over x-monotone chains instead of segments.
+
+    The path is split by monotone_chains and the sweep status holds chains, each pointing to
+    its edge at the sweep line. Only the ends of a chain insert it into or remove it from the
+    status; at every inner vertex the chain just moves on to its next edge, which is then tested
+    against the edges of the neighbouring chains. Chains are ordered as they leave the sweep
+    line, by the edge they continue with, so moving on keeps the order of the status unless two
+    chains swap places at a vertex they share, which is no intersection; the chain is then
+    inserted again. Long runs such as spirals and polylines need several times fewer tree
+    operations than first_intersection. Like there, overlaps on a common line are looked for
+    by collinear_overlap first.
+
+    Args:
+        segments (Union[list[Segment], SegmentStore]): The line segments to check.
+        stats (Optional[CheckStats]): Collects the counters and the retraces, sort and sweep times.
+
+    Returns:
+        Optional[Tuple[int, int]]: Indices of the first intersecting pair found, smaller one first,
+        or None if no two segments intersect.
+    """
+    store = SegmentStore.of(segments)
+    n = len(store)
+    if n < 2:
+        return None
+    witness = _retraces(store, stats)
+    if witness is not None:
+        return witness
+
+    start = perf_counter()
+    x0, y0 = np.frombuffer(store.x0, dtype=store.typecode), np.frombuffer(store.y0, dtype=store.typecode)
+    x1, y1 = np.frombuffer(store.x1, dtype=store.typecode), np.frombuffer(store.y1, dtype=store.typecode)
+    swap = (x1 < x0) | ((x1 == x0) & (y1 < y0))
+    leftX, leftY = np.where(swap, x1, x0), np.where(swap, y1, y0)
+    rightX, rightY = np.where(swap, x0, x1), np.where(swap, y0, y1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes = np.where(rightX != leftX, (rightY - leftY) / (rightX - leftX), np.inf)
+
+    order, offsets = monotone_chains(store)
+    chains = len(offsets) - 1
+    # Events: chain c starts (0, c), the chain of edges[p] moves on to it (1, p), chain c ends (2, c).
+    # Sorted by x, kind, y and label, which keeps the order of a chain along a vertical edge
+    inner = np.setdiff1d(np.arange(n), offsets[:-1], assume_unique=True)
+    firsts, lasts = order[offsets[:-1]], order[offsets[1:] - 1]
+    eventKind = np.repeat(np.array([0, 1, 2]), [chains, len(inner), chains])
+    eventLabel = np.concatenate((np.arange(chains), inner, np.arange(chains)))
+    eventX = np.concatenate((leftX[firsts], leftX[order[inner]], rightX[lasts]))
+    eventY = np.concatenate((leftY[firsts], leftY[order[inner]], rightY[lasts]))
+    events = np.lexsort((eventLabel, eventY, eventKind, eventX))
+    events = zip(eventKind[events].tolist(), eventLabel[events].tolist())
+
+    lx, ly, rx, ry = leftX.tolist(), leftY.tolist(), rightX.tolist(), rightY.tolist()
+    slope = slopes.tolist()
+    edges = order.tolist()
+    ends = offsets[1:].tolist()
+    chainOf = np.repeat(np.arange(chains), np.diff(offsets)).tolist()
+    current = offsets[:-1].tolist() # Position in edges of the edge of every chain at the sweep line
+    sweepX = 0.0
+
+    def leaving(chain: int) -> int:
+        # The edge a chain leaves the sweep line with, past a vertex and a vertical edge on it
+        position = current[chain]
+        while rx[edges[position]] == sweepX and position + 1 < ends[chain]:
+            position += 1
+        return edges[position]
+
+    def y_at_sweep(label: int) -> float:
+        # Vertical edges are placed at their lower endpoint
+        if sweepX == lx[label]:
+            return ly[label]
+        if sweepX == rx[label]:
+            return ry[label]
+        return ly[label] + (sweepX - lx[label]) * slope[label]
+
+    class Chain:
+        __slots__ = ('chain',)
+        chain: int
+
+        def __init__(self, chain: int):
+            self.chain = chain
+
+        def __lt__(self, other: 'Chain') -> bool:
+            edge, other_edge = leaving(self.chain), leaving(other.chain)
+            y, other_y = y_at_sweep(edge), y_at_sweep(other_edge)
+            if y != other_y:
+                return y < other_y
+            # Chains meeting on the sweep line are ordered as they leave it
+            if slope[edge] != slope[other_edge]:
+                return slope[edge] < slope[other_edge]
+            return self.chain < other.chain
+
+    test = intersect_stored
+    if stats is not None:
+        class Chain(Chain):
+            __slots__ = ()
+
+            def __lt__(self, other: 'Chain') -> bool:
+                stats.comparisons += 1
+                return super().__lt__(other)
+
+        def test(store: SegmentStore, first: int, second: int) -> bool:
+            stats.intersectCalls += 1
+            return intersect_stored(store, first, second)
+
+    sorted_ = perf_counter()
+    activeChains: SweepStatus[Chain] = SweepStatus[Chain]()
+    nodes: list[Optional[StatusNode[Chain]]] = [None] * chains
+    witness = None
+    processed = 0
+    for processed, (kind, label) in enumerate(events, 1):
+        if kind == 2:
+            # Chain is ending, its neighbours become adjacent
+            sweepX = rx[edges[ends[label] - 1]]
+            node = nodes[label]
+            pre, suc = activeChains.previous(node), activeChains.next(node)
+            if pre is not None and suc is not None:
+                first, second = edges[current[pre.val.chain]], edges[current[suc.val.chain]]
+                if test(store, first, second):
+                    witness = tuple(sorted((first, second)))
+                    break
+            activeChains.remove(node)
+            nodes[label] = None
+            continue
+
+        if kind == 0:
+            # Chain is starting
+            chain = label
+            edge = edges[current[chain]]
+            sweepX = lx[edge]
+            node = nodes[chain] = activeChains.insert(Chain(chain))
+        else:
+            # Chain moves on to its next edge and keeps its place, unless it swaps places
+            # with a neighbour at a vertex they share
+            chain = chainOf[label]
+            edge = edges[label]
+            current[chain] = label
+            sweepX = lx[edge]
+            node = nodes[chain]
+            pre, suc = activeChains.previous(node), activeChains.next(node)
+            if (pre is not None and not pre.val < node.val) or (suc is not None and not node.val < suc.val):
+                activeChains.remove(node)
+                node = nodes[chain] = activeChains.insert(node.val)
+        if stats is not None:
+            stats.maxHeight = max(stats.maxHeight, activeChains.height)
+
+        pre, suc = activeChains.previous(node), activeChains.next(node)
+        if pre is not None and test(store, edge, edges[current[pre.val.chain]]):
+            witness = tuple(sorted((edge, edges[current[pre.val.chain]])))
+            break
+        if suc is not None and test(store, edge, edges[current[suc.val.chain]]):
+            witness = tuple(sorted((edge, edges[current[suc.val.chain]])))
+            break
+
+    if stats is not None:
+        stats.events += processed
+        stats.rotations += activeChains.rotations
+        stats.phases['sort'] = stats.phases.get('sort', 0.0) + (sorted_ - start) * 1000
+        stats.phases['sweep'] = stats.phases.get('sweep', 0.0) + (perf_counter() - sorted_) * 1000
+    return witness
+
+
+def is_orthogonal(segments: Union[list[Segment], SegmentStore]) -> bool:
+    """
+    Whether every segment of a path is horizontal or vertical, e.g. a turtle path with quarter turns only.
+    """
+    store = SegmentStore.of(segments)
+    x0, y0 = np.frombuffer(store.x0, dtype=store.typecode), np.frombuffer(store.y0, dtype=store.typecode)
+    x1, y1 = np.frombuffer(store.x1, dtype=store.typecode), np.frombuffer(store.y1, dtype=store.typecode)
+    return bool(np.all((x0 == x1) | (y0 == y1)))
+
+def orthogonal_first_intersection(segments: Union[list[Segment], SegmentStore], stats: Optional[CheckStats] = None) -> Optional[Tuple[int, int]]:
+    """
+    Finds a pair of intersecting segments of a path made of horizontal and vertical segments only.
+
+    Such paths need no orientation tests. Two segments on the same line intersect when they
+    overlap by more than a point, which sorting them by line and start reveals at once. A
+    horizontal and a vertical segment intersect when the point where their lines cross lies on
+    both without being an end of both. Those are found with a sweep over x, which counts the
+    horizontal segments at the sweep line per y in a Fenwick tree: every vertical segment asks
+    for the count strictly between its ends and looks at the few horizontal segments at the y of
+    its ends one by one. Every event is a few integer operations instead of the tree walks of
+    first_intersection, and as only coordinates are compared, the result is exact in both
+    processing modes. Segments of length zero intersect nothing, like for `intersect()`, and
+    paths with other segments are left to first_intersection.
+
+    Args:
+        segments (Union[list[Segment], SegmentStore]): The line segments to check.
+        stats (Optional[CheckStats]): Collects the events and the sort and sweep times.
+
+    Returns:
+        Optional[Tuple[int, int]]: Indices of the first intersecting pair found, smaller one first,
+        or None if no two segments intersect.
+    """
+    store = SegmentStore.of(segments)
+    if len(store) < 2:
+        return None
+    if not is_orthogonal(store):
+        return first_intersection(store, stats)
+
+    start = perf_counter()
+    x0, y0 = np.frombuffer(store.x0, dtype=store.typecode), np.frombuffer(store.y0, dtype=store.typecode)
+    x1, y1 = np.frombuffer(store.x1, dtype=store.typecode), np.frombuffer(store.y1, dtype=store.typecode)
+    lowX, highX, lowY, highY = np.minimum(x0, x1), np.maximum(x0, x1), np.minimum(y0, y1), np.maximum(y0, y1)
+    horizontal, vertical = np.flatnonzero(lowX < highX), np.flatnonzero(lowY < highY)
+    witness = _collinear_overlap(horizontal, (y0,), lowX, highX) or _collinear_overlap(vertical, (x0,), lowY, highY)
+    sorted_ = perf_counter()
+    processed = 0
+    if witness is None and len(horizontal) and len(vertical):
+        hy, hLow, hHigh = y0[horizontal], lowX[horizontal], highX[horizontal]
+        vx, vLow, vHigh = x0[vertical], lowY[vertical], highY[vertical]
+        # Fenwick positions are the distinct y of the horizontal segments, from 1
+        ys = np.unique(hy)
+        rows = np.searchsorted(ys, hy) + 1
+        below, above = np.searchsorted(ys, vLow, side='right'), np.searchsorted(ys, vHigh, side='left')
+        lowRows = np.where((below > 0) & (ys[np.maximum(below - 1, 0)] == vLow), below, 0)
+        highRows = np.where((above < len(ys)) & (ys[np.minimum(above, len(ys) - 1)] == vHigh), above + 1, 0)
+
+        # Event kinds: 0 a horizontal segment starts, 1 a vertical one is queried, 2 a horizontal one ends
+        h, v = len(horizontal), len(vertical)
+        eventX = np.concatenate((hLow, vx, hHigh))
+        kinds = np.repeat(np.array([0, 1, 2], dtype=np.int8), [h, v, h])
+        items = np.concatenate((np.arange(h), np.arange(v), np.arange(h)))
+        events = np.lexsort((kinds, eventX))
+        sorted_ = perf_counter()
+
+        size = len(ys)
+        tree = [0] * (size + 1)
+        active: dict[int, list[int]] = {} # Horizontal segments at the sweep line by Fenwick position
+        rowOf, lowOf, highOf, xOf = rows.tolist(), hLow.tolist(), hHigh.tolist(), vx.tolist()
+        belowOf, aboveOf, lowRowOf, highRowOf = below.tolist(), above.tolist(), lowRows.tolist(), highRows.tolist()
+        for kind, item in zip(kinds[events].tolist(), items[events].tolist()):
+            processed += 1
+            if kind != 1:
+                row = rowOf[item]
+                position, delta = row, 1 if kind == 0 else -1
+                while position <= size:
+                    tree[position] += delta
+                    position += position & -position
+                if kind == 0:
+                    active.setdefault(row, []).append(item)
+                else:
+                    active[row].remove(item)
+                continue
+
+            # Prefix sum up to `above` minus the one up to `below`, over their common part once
+            low, high, count = belowOf[item], aboveOf[item], 0
+            while high > low:
+                count += tree[high]
+                high &= high - 1
+            while low > high:
+                count -= tree[low]
+                low &= low - 1
+            if count:
+                low, before = belowOf[item], 0
+                while low:
+                    before += tree[low]
+                    low &= low - 1
+                witness = (active[_fenwick_search(tree, before)][0], item)
+                break
+            # At the y of an end of the vertical segment only the inside of a horizontal one counts
+            x = xOf[item]
+            for row in (lowRowOf[item], highRowOf[item]):
+                for other in active.get(row, ()) if row else ():
+                    if lowOf[other] < x < highOf[other]:
+                        witness = (other, item)
+                        break
+                if witness is not None:
+                    break
+            if witness is not None:
+                break
+        if witness is not None:
+            first, second = int(horizontal[witness[0]]), int(vertical[witness[1]])
+            witness = (min(first, second), max(first, second))
+
+    if stats is not None:
+        stats.events += processed
+        stats.phases['sort'] = stats.phases.get('sort', 0.0) + (sorted_ - start) * 1000
+        stats.phases['sweep'] = stats.phases.get('sweep', 0.0) + (perf_counter() - sorted_) * 1000
+    return witness
+
+def collinear_overlap(segments: Union[list[Segment], SegmentStore]) -> Optional[Tuple[int, int]]:
+    """
+    Finds a pair of segments that overlap on a common line by more than a point, such as a move
+    and the move back over it, without a sweep.
+
+    Every segment is keyed by a hash of its line: the direction divided by the gcd of its
+    coordinates and turned to point right or up, and the offset of the line along that
+    direction's normal. Sorted by key and start, a segment overlapping an earlier one of its
+    line also overlaps the one just before it, so only neighbours are compared. The line is
+    computed on exact integers, so float coordinates are taken in 10^-DECIMALS units (see
+    CommandsProcessor). Segments off that grid or too far out for an int64 offset are skipped,
+    which the sweeps still check. The pair found is confirmed with `intersect()`, against both
+    a hash collision and the rounding of float coordinates, which can miss the overlap of a
+    sloped pair.
+
+    Args:
+        segments (Union[list[Segment], SegmentStore]): The line segments to check.
+
+    Returns:
+        Optional[Tuple[int, int]]: Indices of an overlapping pair, smaller one first, or None.
+    """
+    store = SegmentStore.of(segments)
+    coordinates = [np.frombuffer(array, dtype=store.typecode) for array in (store.x0, store.y0, store.x1, store.y1)]
+    if store.typecode == 'd':
+        units = [np.rint(array * SCALE) for array in coordinates]
+        exact = np.logical_and.reduce([(unit / SCALE == array) & (np.abs(unit) < 2 ** 52) for unit, array in zip(units, coordinates)])
+        x0, y0, x1, y1 = (np.where(exact, unit, 0).astype(np.int64) for unit in units)
+    else:
+        exact = np.ones(len(store), dtype=bool)
+        x0, y0, x1, y1 = (array.astype(np.int64) for array in coordinates)
+
+    dx, dy = x1 - x0, y1 - y0
+    divisor = np.gcd(dx, dy)
+    exact &= divisor > 0
+    divisor[divisor == 0] = 1
+    dx, dy = dx // divisor, dy // divisor
+    flip = (dx < 0) | ((dx == 0) & (dy < 0))
+    dx, dy = np.where(flip, -dx, dx), np.where(flip, -dy, dy)
+    exact &= np.abs(dy) * np.abs(x0.astype(np.float64)) + np.abs(dx) * np.abs(y0.astype(np.float64)) < LINE_KEY_LIMIT
+    # Positions along a line are on x, or on y for vertical ones
+    offset = dy * x0 - dx * y0
+    vertical = dx == 0
+    low = np.where(vertical, np.minimum(y0, y1), np.minimum(x0, x1))
+    high = np.where(vertical, np.maximum(y0, y1), np.maximum(x0, x1))
+    key = np.bitwise_xor.reduce([array.view(np.uint64) * multiplier for array, multiplier in zip((dx, dy, offset), LINE_HASH)])
+    witness = _collinear_overlap(np.flatnonzero(exact), (key,), low, high)
+    if witness is not None and not intersect_stored(store, *witness):
+        return None
+    return witness
+
+def _retraces(store: SegmentStore, stats: Optional[CheckStats]) -> Optional[Tuple[int, int]]:
+    # collinear_overlap ahead of a sweep, timed as its own phase
+    if len(store) < RETRACE_MIN_SEGMENTS:
+        return None
+    if stats is None:
+        return collinear_overlap(store)
+    with stats.phase('retraces'):
+        return collinear_overlap(store)
+
+def _collinear_overlap(labels: np.ndarray, lines: Tuple[np.ndarray, ...], low: np.ndarray, high: np.ndarray) -> Optional[Tuple[int, int]]:
+    # A pair of the segments `labels`, each spanning low to high on the line keyed by `lines`, that overlap by more than a point
+    if len(labels) < 2:
+        return None
+    labels = labels[np.lexsort((low[labels], *(key[labels] for key in lines)))]
+    sameLine = np.logical_and.reduce([key[labels][1:] == key[labels][:-1] for key in lines])
+    # A segment overlapping an earlier one of its line overlaps the one just before it too, as
+    # that one starts in between, so either the two of them or an earlier pair already do
+    overlapping = np.flatnonzero(sameLine & (low[labels][1:] < high[labels][:-1]))
+    if not len(overlapping):
+        return None
+    first, second = labels[overlapping[0]], labels[overlapping[0] + 1]
+    return int(min(first, second)), int(max(first, second))
+
+def _fenwick_search(tree: list[int], count: int) -> int:
+    # Smallest position whose prefix sum exceeds count
+    position, step = 0, 1 << (len(tree) - 1).bit_length()
+    while step:
+        if position + step < len(tree) and tree[position + step] <= count:
+            position += step
+            count -= tree[position]
+        step >>= 1
+    return position + 1
+
+
+class IntersectionReport:
+    pairs: list[Tuple[int, int]]  # Segment indices, lower index first
+    points: list[Node]  # First point at which each pair was found to meet
+
+    def __init__(self):
+        self.pairs = []
+        self.points = []
+
+    @property
+    def count(self) -> int:
+        return len(self.pairs)
+
+    def __repr__(self) -> str:
+        return f"Intersections: {self.count}"
+
+
+def crossing_point(segment1: Segment, segment2: Segment) -> Optional[Tuple[Fraction, Fraction]]:
+    """
+    Computes the exact point where two line segments cross.
+
+    Args:
+        segment1 (Segment): The first line segment.
+        segment2 (Segment): The second line segment.
+
+    Returns:
+        Optional[Tuple[Fraction, Fraction]]: The crossing point, or None if the segments are parallel or do not meet.
+    """
+    # Most candidate pairs are far from crossing, floating point rejects them cheaply
+    rx, ry = segment1.end.x - segment1.start.x, segment1.end.y - segment1.start.y
+    sx, sy = segment2.end.x - segment2.start.x, segment2.end.y - segment2.start.y
+    qpx, qpy = segment2.start.x - segment1.start.x, segment2.start.y - segment1.start.y
+    denominator = rx * sy - ry * sx
+    if abs(denominator) > FLOAT_ERROR * (abs(rx * sy) + abs(ry * sx)):
+        t = (qpx * sy - qpy * sx) / denominator
+        u = (qpx * ry - qpy * rx) / denominator
+        if t < -FLOAT_TOLERANCE or t > 1 + FLOAT_TOLERANCE or u < -FLOAT_TOLERANCE or u > 1 + FLOAT_TOLERANCE:
+            return None
+
+    px, py = Fraction(segment1.start.x), Fraction(segment1.start.y)
+    qx, qy = Fraction(segment2.start.x), Fraction(segment2.start.y)
+    rx, ry = Fraction(segment1.end.x) - px, Fraction(segment1.end.y) - py
+    sx, sy = Fraction(segment2.end.x) - qx, Fraction(segment2.end.y) - qy
+    denominator = rx * sy - ry * sx
+    if denominator == 0:
+        return None
+
+    t = ((qx - px) * sy - (qy - py) * sx) / denominator
+    u = ((qx - px) * ry - (qy - py) * rx) / denominator
+    if not (0 <= t <= 1 and 0 <= u <= 1):
+        return None
+    return px + t * rx, py + t * ry
 
-            if isStartLeft:
-                return segment.start, segment.end
+
+def _decimal_scale(segments: list[Segment]) -> int:
+    # SCALE if every coordinate is a float on the 10^-DECIMALS grid, 1 to sweep the coordinates as they are
+    coordinates = [value for segment in segments for value in (segment.start.x, segment.start.y, segment.end.x, segment.end.y)]
+    if all(type(value) is int for value in coordinates):
+        return 1
+    # The float mode starts at Node(0, 0), ints are on the grid too
+    return SCALE if all(type(value) is int or (type(value) is float and math.isfinite(value) and round(value * SCALE) / SCALE == value)
+                        for value in coordinates) else 1
+
+
+def all_intersections(segments: list[Segment]) -> IntersectionReport:
+    """
+    Finds every pair of intersecting segments with a Bentley-Ottmann sweep in O((n + k) log n).
+
+    Events are processed in (x, y) order. At every event point p the segments starting at p,
+    ending at p and passing through p are gathered, every pair among them is tested with
+    `intersect()`, and the segments through p are reinserted so that their order in the
+    sweep status matches the order just after p. Crossing points are kept as exact fractions
+    and the order of the sweep status falls back to exact arithmetic whenever floating point
+    cannot tell two edges apart, so degenerate paths cannot corrupt the tree.
+
+    Float coordinates on the 10^-DECIMALS grid of CommandsProcessor are swept as the integers
+    of the fixed-point mode, and the pairs met there are accepted with the float `intersect()`
+    the other engines use. As binary fractions 10.6066 and the like are only close to the
+    grid, so an endpoint touching a segment in decimal can be off it in exact arithmetic, and
+    a sweep of the floats themselves would miss pairs that `AnyIntersections.check` counts.
+    Pairs the float predicate only accepts through rounding, e.g. collinear segments a gap
+    apart whose orientations come out with opposite signs, are never met by the sweep, so in
+    the float mode the report can still miss a few pairs that `check` counts. Float coordinates
+    off the grid are swept as they are. The fixed-point mode is exact throughout.
+
+    Args:
+        segments (list[Segment]): The line segments to check.
+
+    Returns:
+        IntersectionReport: The intersecting pairs, their meeting points and their count.
+    """
+    BEFORE, AFTER = False, True
+
+    original = segments
+    scale = _decimal_scale(segments)
+    if scale != 1:
+        segments = [Segment(Node(round(segment.start.x * scale), round(segment.start.y * scale)),
+                            Node(round(segment.end.x * scale), round(segment.end.y * scale))) for segment in segments]
+
+    class SweepState:
+        x: float  # Fraction for crossing events
+        y: float  # Fraction for crossing events
+        exactX: Fraction
+        exactY: Fraction
+        approximateX: float
+        approximateY: float
+        error: float  # Zero for endpoint events, whose coordinates are exact floats
+        mode: bool  # Order just before (deletions) or just after (insertions) the event point
+
+        def move_to(self, x: float, y: float):
+            self.x, self.y = x, y
+            self.exactX, self.exactY = Fraction(x), Fraction(y)
+            self.approximateX, self.approximateY = float(x), float(y)
+            self.error = 0.0 if not isinstance(x, Fraction) and not isinstance(y, Fraction) else FLOAT_ERROR * (1 + abs(self.approximateY))
+
+    sweep = SweepState()
+
+    left: list[Node] = []
+    right: list[Node] = []
+    slope: list[float] = []
+    for segment in segments:
+        start, end = segment.start, segment.end
+        if (start.x, start.y) <= (end.x, end.y):
+            left.append(start)
+            right.append(end)
+        else:
+            left.append(end)
+            right.append(start)
+        dx = right[-1].x - left[-1].x
+        slope.append((right[-1].y - left[-1].y) / dx if dx != 0 else math.inf)
+
+    exactSlopes: dict[int, Fraction] = {}
+
+    def exact_slope(label: int) -> Fraction:
+        if label not in exactSlopes:
+            l, r = left[label], right[label]
+            if l.x == r.x:
+                exactSlopes[label] = math.inf
             else:
-                return segment.end, segment.start
+                exactSlopes[label] = (Fraction(r.y) - Fraction(l.y)) / (Fraction(r.x) - Fraction(l.x))
+        return exactSlopes[label]
+
+    def approximate_y(label: int) -> Tuple[float, float]:
+        # Returns the y of the edge on the sweep line together with a bound on its rounding error
+        l, r = left[label], right[label]
+        if l.x == r.x:
+            return min(max(sweep.approximateY, l.y), r.y), sweep.error
+        if sweep.error == 0:
+            if sweep.x == l.x:
+                return l.y, 0.0
+            if sweep.x == r.x:
+                return r.y, 0.0
+        x = sweep.approximateX
+        return l.y + (x - l.x) * slope[label], FLOAT_ERROR * (1 + abs(l.y) + (abs(x) + abs(l.x)) * abs(slope[label]))
+
+    def exact_y(label: int) -> Fraction:
+        l, r = left[label], right[label]
+        if l.x == r.x:
+            return min(max(sweep.exactY, Fraction(l.y)), Fraction(r.y))
+        return Fraction(l.y) + (sweep.exactX - Fraction(l.x)) * exact_slope(label)
 
-        def _getLeft(self) -> Node:
-            return self._getNodesSorted()[0]
+    def compare_with(label: int, other: Optional[int]) -> int:
+        # Sign of the y of edge `label` minus the y of edge `other` (or of the event point if None)
+        y, error = approximate_y(label)
+        if other is None:
+            other_y, other_error = sweep.approximateY, sweep.error
+        else:
+            other_y, other_error = approximate_y(other)
+        if abs(y - other_y) > error + other_error:
+            return -1 if y < other_y else 1
+        if error == 0 and other_error == 0:
+            return 0
+
+        exact = exact_y(label)
+        other_exact = sweep.exactY if other is None else exact_y(other)
+        return (exact > other_exact) - (exact < other_exact)
 
-        def _getRight(self) -> Node:
-            return self._getNodesSorted()[1]
+    class Edge:
+        label: int  # Segment index
+
+        def __init__(self, label: int):
+            self.label = label
 
         def compare_y(self, other: 'Edge') -> bool:
-            # Calculate cross product to determine which edge is above the other
-            self_left, _ = self._getNodesSorted()
-            other_left, _ = other._getNodesSorted()
+            order = compare_with(self.label, other.label)
+            if order != 0:
+                return order < 0
 
-            if self_left.y==other_left.y:
-                return self_left.x < other_left.x
-            else:
-                return self_left.y < other_left.y
+            # Edges meet on the sweep line, so the order is decided by slopes. Below the
+            # event point they have already crossed, above it they have not crossed yet.
+            position = compare_with(self.label, None)
+            after = sweep.mode if position == 0 else position < 0
+            self_slope, other_slope = exact_slope(self.label), exact_slope(other.label)
+            if self_slope != other_slope:
+                return self_slope < other_slope if after else self_slope > other_slope
+            return self.label < other.label
 
         def __lt__(self, other: 'Edge') -> bool:
             return self.compare_y(other)
 
         def __gt__(self, other: 'Edge') -> bool:
-            return not self.compare_y(other)
+            return other.compare_y(self)
 
         def __eq__(self, other: 'Edge') -> bool:
             if isinstance(other, Edge):
@@ -147,84 +876,358 @@ def any_intersections(segments: list[Segment]) -> bool:
         def __ne__(self, other: 'Edge') -> bool:
             return not self.__eq__(other)
 
-    endpoints = list[Endpoint]()
+    def edges_through_point(root: Optional[StatusNode[Edge]], found: list[int]):
+        if root is None:
+            return
+        position = compare_with(root.val.label, None)
+        if position >= 0:
+            edges_through_point(root.left, found)
+        if position == 0:
+            found.append(root.val.label)
+        if position <= 0:
+            edges_through_point(root.right, found)
+
+    def neighbours_of_point(root: Optional[StatusNode[Edge]]) -> Tuple[Optional[Edge], Optional[Edge]]:
+        below = above = None
+        while root is not None:
+            if compare_with(root.val.label, None) < 0:
+                below = root.val
+                root = root.right
+            else:
+                above = root.val
+                root = root.left
+        return below, above
+
+    # Event point -> (labels of segments starting there, labels of segments ending there)
+    events: dict[Tuple[float, float], Tuple[list[int], list[int]]] = {}
+    for i in range(len(segments)):
+        events.setdefault((left[i].x, left[i].y), ([], []))[0].append(i)
+        events.setdefault((right[i].x, right[i].y), ([], []))[1].append(i)
+    queue = list(events.keys())
+    heapq.heapify(queue)
+
+    def find_new_event(first: Optional[Edge], second: Optional[Edge]):
+        if first is None or second is None:
+            return
+        point = crossing_point(segments[first.label], segments[second.label])
+        if point is not None and point > (sweep.x, sweep.y) and point not in events:
+            events[point] = ([], [])
+            heapq.heappush(queue, point)
+
+    report = IntersectionReport()
+    reported: set[Tuple[int, int]] = set()
+
+    activeEdges: SweepStatus[Edge] = SweepStatus[Edge]()
+    while queue:
+        sweep.move_to(*heapq.heappop(queue))
+        upper, lower = events.pop((sweep.x, sweep.y))
 
-    activeEdges: AVL_Tree[Edge]  = AVL_Tree[Edge]()
-    activeEdgesRoot: TreeNode[Edge] = None
-    for i, segment in enumerate(segments):
-        if segment.start.x == segment.end.x:
-            isStartLeft = segment.start.y <= segment.end.y
+        passing: list[int] = []
+        edges_through_point(activeEdges.root, passing)
+        ending = set(lower)
+        containing = [label for label in passing if label not in ending]
+
+        involved = list(dict.fromkeys(upper + lower + containing))
+        for i, first in enumerate(involved):
+            for second in involved[i + 1:]:
+                pair = (min(first, second), max(first, second))
+                if pair not in reported and intersect(original[first], original[second]):
+                    reported.add(pair)
+                    report.pairs.append(pair)
+                    report.points.append(Node(float(sweep.x / scale), float(sweep.y / scale)))
+
+        sweep.mode = BEFORE
+        for label in dict.fromkeys(passing + lower):
+            activeEdges.delete(Edge(label))
+
+        sweep.mode = AFTER
+        inserted = [Edge(label) for label in dict.fromkeys(upper + containing) if label not in ending]
+        for edge in inserted:
+            activeEdges.insert(edge)
+
+        if not inserted:
+            below, above = neighbours_of_point(activeEdges.root)
+            find_new_event(below, above)
         else:
-            isStartLeft = segment.start.x < segment.end.x
-        endpoints.append(Endpoint(segment.start, i, isStartLeft))
-        endpoints.append(Endpoint(segment.end, i, not isStartLeft))
-    endpoints.sort()
-    
+            lowest, highest = min(inserted), max(inserted)
 
-    for endpoint in endpoints:
-        segmentIndex = endpoint.label
-        isLeft = endpoint.isLeft
-        segment = segments[segmentIndex]
+            find_new_event(activeEdges.predecessor(lowest), lowest)
+            find_new_event(highest, activeEdges.successor(highest))
 
-        # for edge in activeEdges.inOrder(activeEdgesRoot):
-        #     print(f"edge {edge.label}", end=" ")
-        # print("\n")
+    return report
 
-        pre = suc = None
 
-        if isLeft:
-            # Edge is starting
-            newEdge = Edge(endpoint.label)
-            
-            activeEdgesRoot = activeEdges.insert(activeEdgesRoot, newEdge)
-
-            findPreSuc.pre = None
-            findPreSuc.suc = None
-            
-            findPreSuc(activeEdgesRoot, newEdge)
-
-            pre: TreeNode[Edge] = findPreSuc.pre
-            suc: TreeNode[Edge] = findPreSuc.suc
-
-            if pre is not None and intersect(segments[segmentIndex], segments[pre.val.label]):
-                # print(f"Intersection in {segmentIndex} and {pre.val.label}")
-                return True
-            if suc is not None and intersect(segments[segmentIndex], segments[suc.val.label]):
-                # print(f"Intersection in {segmentIndex} and {suc.val.label}")
-                return True
+def grid_cells(x0: float, y0: float, x1: float, y1: float, size: float) -> Iterator[Tuple[int, int]]:
+    """
+    Enumerates the cells of a uniform grid that a segment passes through.
+
+    The grid is walked column by column and only the cells covered by the part of the segment
+    inside each column are claimed, so long segments do not claim their whole bounding box.
+    Cells touched within CELL_MARGIN are claimed too, so that touching segments share a cell.
+
+    Args:
+        x0, y0, x1, y1 (float): The segment.
+        size (float): Side of a grid cell.
+
+    Yields:
+        Tuple[int, int]: Column and row of every claimed cell.
+    """
+    if x0 > x1:
+        x0, y0, x1, y1 = x1, y1, x0, y0
+    for column in range(math.floor((x0 - CELL_MARGIN) / size), math.floor((x1 + CELL_MARGIN) / size) + 1):
+        if x0 == x1:
+            low, high = min(y0, y1), max(y0, y1)
         else:
+            slope = (y1 - y0) / (x1 - x0)
+            ya = y0 + (min(max(column * size, x0), x1) - x0) * slope
+            yb = y0 + (min(max((column + 1) * size, x0), x1) - x0) * slope
+            low, high = min(ya, yb), max(ya, yb)
+        for row in range(math.floor((low - CELL_MARGIN) / size), math.floor((high + CELL_MARGIN) / size) + 1):
+            yield column, row
+
+
+def grid_intersections(segments: Union[list[Segment], SegmentStore], cellSize: Optional[float] = None) -> bool:
+    """
+    Checks whether any two segments intersect using a uniform grid, see grid_first_intersection.
+    """
+    return grid_first_intersection(segments, cellSize) is not None
+
+def grid_first_intersection(segments: Union[list[Segment], SegmentStore], cellSize: Optional[float] = None,
+                            stats: Optional[CheckStats] = None) -> Optional[Tuple[int, int]]:
+    """
+    Finds a pair of intersecting segments using a uniform grid instead of a sweep.
+
+    Each segment is only tested with `intersect()` against the earlier segments sharing one
+    of its grid cells. This beats the sweep when segments are short and of similar length,
+    as in typical turtle paths, see AnyIntersections.select_engine.
+
+    Args:
+        segments (Union[list[Segment], SegmentStore]): The line segments to check.
+        cellSize (Optional[float]): Side of a grid cell, by default the median segment length.
+        stats (Optional[CheckStats]): Collects the intersect() calls and the time of the grid phase.
+
+    Returns:
+        Optional[Tuple[int, int]]: Indices of the first intersecting pair found, smaller one first,
+        or None if no two segments intersect.
+    """
+    store = SegmentStore.of(segments)
+    if stats is None:
+        if cellSize is None:
+            cellSize = SegmentStatistics(store).median
+        return _grid_search(store, cellSize, intersect_stored)
+
+    def test(store: SegmentStore, first: int, second: int) -> bool:
+        stats.intersectCalls += 1
+        return intersect_stored(store, first, second)
+
+    with stats.phase('grid'):
+        if cellSize is None:
+            cellSize = SegmentStatistics(store).median
+        return _grid_search(store, cellSize, test)
+
+def _grid_search(store: SegmentStore, cellSize: float, test: Callable[[SegmentStore, int, int], bool]) -> Optional[Tuple[int, int]]:
+    cells: dict[Tuple[int, int], list[int]] = {}
+    for label, (x0, y0, x1, y1) in enumerate(store):
+        tested = set()
+        for cell in grid_cells(x0, y0, x1, y1, cellSize):
+            bucket = cells.get(cell)
+            if bucket is None:
+                cells[cell] = [label]
+                continue
+            for other in bucket:
+                if other not in tested:
+                    tested.add(other)
+                    if test(store, other, label):
+                        return other, label
+            bucket.append(label)
+    return None
+
+
+def slab_first_intersection(segments: Union[list[Segment], SegmentStore], workers: Optional[int] = None,
+                            stats: Optional[CheckStats] = None) -> Optional[Tuple[int, int]]:
+    """
+    Finds a pair of intersecting segments with one sweep per vertical slab, in parallel.
+
+    The x range is split into one slab per worker at quantiles of the segment midpoints, so
+    the slabs hold about the same number of segments, and every segment belongs to all slabs
+    its x range overlaps. Two segments that intersect at some x then both belong to the slab
+    of that x, and any pair a slab reports is a real intersection. The coordinates are shared
+    with the workers through shared memory, each worker picks its own segments and runs
+    first_intersection on them, and the remaining workers are terminated as soon as one finds
+    an intersection. This pays off for long paths of short segments; when segments would span
+    more than SLAB_MAX_DUPLICATION slabs on average, e.g. in a spiral, one sweep is run instead.
+    One sweep is also run, after a warning, if a worker fails or dies without a result.
+
+    Args:
+        segments (Union[list[Segment], SegmentStore]): The line segments to check.
+        workers (Optional[int]): Number of worker processes, by default the number of CPUs.
+        stats (Optional[CheckStats]): Collects the time of the partition phase and the sums over
+            the slabs that finished (the others are terminated before they report).
+
+    Returns:
+        Optional[Tuple[int, int]]: Indices of the first intersecting pair found, smaller one first,
+        or None if no two segments intersect.
+    """
+    store = SegmentStore.of(segments)
+    n = len(store)
+    workers = workers or os.cpu_count() or 1
+    if workers < 2 or n < SLAB_MIN_SEGMENTS:
+        return first_intersection(store, stats)
 
-            endingEdge = Edge(endpoint.label)
+    start = perf_counter()
+    dtype = np.float64 if store.typecode == 'd' else np.int64
+    memory = shared_memory.SharedMemory(create=True, size=4 * n * np.dtype(dtype).itemsize)
+    processes = []
+    try:
+        coordinates = np.ndarray((4, n), dtype=dtype, buffer=memory.buf)
+        for row, array in enumerate((store.x0, store.y0, store.x1, store.y1)):
+            coordinates[row] = np.frombuffer(array, dtype=dtype)
+        lows, highs = np.minimum(coordinates[0], coordinates[2]), np.maximum(coordinates[0], coordinates[2])
+        bounds = np.quantile((lows + highs) / 2, np.linspace(0, 1, workers + 1)[1:-1])
+        slabs = np.searchsorted(bounds, highs, side='right') - np.searchsorted(bounds, lows, side='left') + 1
+        del coordinates, lows, highs
+        if slabs.sum() > SLAB_MAX_DUPLICATION * n:
+            return first_intersection(store, stats)
+        bounds = bounds.tolist()
+        if stats is not None:
+            stats.phases['partition'] = stats.phases.get('partition', 0.0) + (perf_counter() - start) * 1000
 
-            findPreSuc.pre = None
-            findPreSuc.suc = None
-            
-            findPreSuc(activeEdgesRoot, newEdge)
+        results = multiprocessing.Queue()
+        for low, high in zip([-math.inf, *bounds], [*bounds, math.inf]):
+            process = multiprocessing.Process(target=_slab_worker, args=(memory.name, n, dtype, low, high, results, stats is not None), daemon=True)
+            process.start()
+            processes.append(process)
 
-            pre: TreeNode[Edge] = findPreSuc.pre
-            suc: TreeNode[Edge] = findPreSuc.suc
+        witness, error = None, None
+        received = silent = 0
+        while received < len(processes) and error is None:
+            try:
+                witness, slabStats, error = results.get(timeout=SLAB_POLL_INTERVAL)
+            except queue.Empty:
+                # A worker flushes its result before it exits, so a poll that finds more workers
+                # gone than results, and then a second one, means one of them died without a result
+                exited = sum(process.exitcode is not None for process in processes)
+                silent = silent + 1 if exited > received else 0
+                if silent > 1:
+                    error = f"a slab worker exited without a result, exit codes {[process.exitcode for process in processes]}"
+                continue
+            received += 1
+            if slabStats is not None:
+                stats.merge(slabStats)
+            if witness is not None:
+                return witness
+        if error is None:
+            return None
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        memory.close()
+        memory.unlink()
 
-            if suc is not None and pre is not None and intersect(segments[suc.val.label], segments[pre.val.label]):
-                # print(f"Intersection in {suc.val.label} and {pre.val.label}")
-                return True
+    logging.warning(f"Slab check failed ({error}), checking with one sweep instead.")
+    return first_intersection(store, stats)
 
-            # print(f"Pre delete of {endingEdge.label}")
-            # for edge in activeEdges.inOrder(activeEdgesRoot):
-            #     print(f"edge {edge.label}", end=" ")
-            # print("\n")
-            activeEdgesRoot = activeEdges.delete(activeEdgesRoot, endingEdge)
-            # print(f"Post delete of {endingEdge.label}")
-            # for edge in activeEdges.inOrder(activeEdgesRoot):
-            #     print(f"edge {edge.label}", end=" ")
-            # print("\n")
+def _slab_worker(name: str, n: int, dtype, low: float, high: float, results, collectStats: bool):
+    # Puts (witness, stats, None), or (None, None, error) if the slab could not be checked
+    try:
+        memory = shared_memory.SharedMemory(name=name)
+        try:
+            x0, y0, x1, y1 = np.ndarray((4, n), dtype=dtype, buffer=memory.buf)
+            labels = np.flatnonzero((np.minimum(x0, x1) <= high) & (np.maximum(x0, x1) >= low))
+            slab = SegmentStore.from_arrays(x0[labels], y0[labels], x1[labels], y1[labels])
+            del x0, y0, x1, y1
+        finally:
+            memory.close()
+        stats = CheckStats() if collectStats else None
+        witness = first_intersection(slab, stats)
+    except Exception as e:
+        results.put((None, None, f"{type(e).__name__}: {e}"))
+        return
+    results.put((None if witness is None else (int(labels[witness[0]]), int(labels[witness[1]])), stats, None))
 
-    return False
+
+class SegmentStatistics:
+    """
+    Length and extent statistics of a path, estimated from an evenly spaced sample of segments.
+    """
+    count: int
+    median: float # Median segment length (largest coordinate difference)
+    spread: float # 90th percentile length over the median length
+    occupancy: float # Expected segments per grid cell for a grid of median sized cells
+
+    def __init__(self, store: SegmentStore):
+        self.count = len(store)
+        step = max(1, self.count // LENGTH_SAMPLE)
+        lengths = sorted(max(abs(store.x1[i] - store.x0[i]), abs(store.y1[i] - store.y0[i])) for i in range(0, self.count, step))
+        if not lengths or lengths[len(lengths) // 2] == 0:
+            self.median, self.spread, self.occupancy = 1.0, math.inf, math.inf
+            return
+        self.median = lengths[len(lengths) // 2]
+        self.spread = lengths[min(len(lengths) - 1, len(lengths) * 9 // 10)] / self.median
+
+        width = max(max(store.x0), max(store.x1)) - min(min(store.x0), min(store.x1))
+        height = max(max(store.y0), max(store.y1)) - min(min(store.y0), min(store.y1))
+        cellsClaimed = self.count * (1 + sum(lengths) / len(lengths) / self.median) * 2
+        self.occupancy = cellsClaimed / ((width / self.median + 1) * (height / self.median + 1))
 
 
 class AnyIntersections:
+    # Every engine takes the segments and an optional CheckStats and returns an intersecting pair of segment indices, or None
+    ENGINES = {
+        'sweep': first_intersection,
+        'grid': grid_first_intersection,
+        'chains': chain_first_intersection,
+        'slab': slab_first_intersection,
+        'orthogonal': orthogonal_first_intersection,
+    }
+
+    @staticmethod
+    def select_engine(segments: Union[list[Segment], SegmentStore]) -> str:
+        """
+        Picks the orthogonal sweep for paths of horizontal and vertical segments only, which
+        beats the others at any size. Otherwise the grid for large paths of short, similarly
+        long segments that spread out over the plane, and a sweep for the rest (few segments,
+        mixed lengths or dense paths): the chain sweep for paths made of long monotone chains,
+        the plain one otherwise.
+        """
+        store = SegmentStore.of(segments)
+        if is_orthogonal(store):
+            return 'orthogonal'
+        statistics = SegmentStatistics(store)
+        if statistics.count >= GRID_MIN_SEGMENTS and statistics.spread <= GRID_MAX_SPREAD and statistics.occupancy <= GRID_MAX_OCCUPANCY:
+            return 'grid'
+        if len(store) >= 2 and len(store) >= CHAIN_MIN_LENGTH * (len(monotone_chains(store)[1]) - 1):
+            return 'chains'
+        return 'sweep'
+
+    @staticmethod
+    def check(segments: Union[list[Segment], SegmentStore], engine: str = 'auto', stats: Optional[CheckStats] = None) -> Tuple[bool, float, str]:
+        witness, execution_time, engine = AnyIntersections.find(segments, engine, stats)
+        return [witness is not None, execution_time, engine]
+
+    @staticmethod
+    def find(segments: Union[list[Segment], SegmentStore], engine: str = 'auto', stats: Optional[CheckStats] = None) -> Tuple[Optional[Tuple[int, int]], float, str]:
+        """
+        Same as check, but returns the intersecting pair of segment indices (or None) instead of a bool.
+        Counters and phase times of the engine are added to stats, if given.
+        """
+        if engine == 'auto':
+            engine = AnyIntersections.select_engine(segments)
+        method = AnyIntersections.ENGINES[engine]
+        start = perf_counter()
+        witness = method(segments, stats=stats)
+        execution_time = (perf_counter() - start) * 1000
+
+        return [witness, execution_time, engine]
+
+
+class AllIntersections:
     @staticmethod
-    def check(segments: list[Segment]) -> Tuple[bool, float]:
-        value = any_intersections(segments)
-        execution_time = timeit(lambda: any_intersections(segments), number=1) * 1000
+    def check(segments: list[Segment]) -> Tuple[IntersectionReport, float]:
+        start = perf_counter()
+        report = all_intersections(segments)
+        execution_time = (perf_counter() - start) * 1000
 
-        return [value, execution_time]
+        return [report, execution_time]
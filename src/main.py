@@ -1,40 +1,262 @@
-import sys
-import matplotlib.pyplot as plt
+import argparse
+import glob
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from time import perf_counter
+from typing import Iterable, Optional
+import numpy as np
+import binary_format
 from input_parser import InputParser
+from check_stats import CheckStats
+from command import Repeat, expanded_length, iter_expanded
 from commands_processor import CommandsProcessor
+from external_sweep import RUN_EVENTS, ExternalSweep
 from intersection_checker import AnyIntersections
-from commandGenerator import generate_commands
+from path_optimizer import optimize_path
+from renderer import draw_edges
+from periodic_checker import PeriodicPath
+from result_cache import DEFAULT_DIRECTORY, DEFAULT_MAX_ENTRIES, CachedResult, ResultCache, command_key, program_key
+from segment import SegmentStore
+
+BATCH_CHUNK_SIZE = 64 # Largest number of files sent to a worker at once
 
 def main():
-    if len(sys.argv) != 2:
-        print("Incorrect input. Example input:\n$ python src/main.py data/simple.txt\t - Solve case from file\n$")
+    parser = argparse.ArgumentParser(description="Check whether the path of a turtle program intersects itself.")
+    parser.add_argument("paths", type=str, nargs="*", help="Command file to check. With --batch also directories (all .txt files) and glob patterns.")
+    parser.add_argument("--batch", action="store_true", help="Check all files headless and print one JSON line per file.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes of the batch mode (default is the number of CPUs).")
+    parser.add_argument("--engine", type=str, choices=['auto', *AnyIntersections.ENGINES], default='auto', help="Intersection engine (default is 'auto').")
+    parser.add_argument("--fixed-point", action="store_true", help="Use exact integer coordinates in 10^-4 units instead of rounded floats.")
+    parser.add_argument("--optimize", action="store_true", help="Shrink the program and join collinear moves before checking.")
+    parser.add_argument("--no-draw", action="store_true", help="Do not draw the path of a single file.")
+    parser.add_argument("--output", type=str, default=None, help="Save the drawing of a single file to this .png or .svg file instead of showing it.")
+    parser.add_argument("--figures", type=str, default=None, help="Directory to save a drawing of every file of the batch mode to.")
+    parser.add_argument("--format", type=str, choices=['png', 'svg'], default='png', help="Format of the drawings of the batch mode (default is 'png').")
+    parser.add_argument("--max-segments", type=int, default=None, help="Downsample drawn paths to about this many segments.")
+    parser.add_argument("--cache", type=str, nargs="?", const=DEFAULT_DIRECTORY, default=None, help=f"Reuse results of programs checked before, stored in this directory (default is {DEFAULT_DIRECTORY}).")
+    parser.add_argument("--stats", action="store_true", help="Report counters of the check (comparisons, rotations, intersect() calls, events) and the time of every phase.")
+    parser.add_argument("--cache-entries", type=int, default=DEFAULT_MAX_ENTRIES, help=f"Results kept in the cache before the least recently used are evicted (default is {DEFAULT_MAX_ENTRIES}).")
+    parser.add_argument("--external", type=str, nargs="?", const=tempfile.gettempdir(), default=None, help=f"Check a single file too large for memory with the sweep's events sorted on disk in this directory (default is {tempfile.gettempdir()}). Nothing is drawn.")
+    parser.add_argument("--run-events", type=int, default=RUN_EVENTS, help=f"Events sorted in memory at once by --external (default is {RUN_EVENTS}).")
+    args = parser.parse_args()
+    if args.external is not None:
+        # The external sweep streams the path straight to disk, so none of these can apply
+        ignored = [option for option, used in (('--batch', args.batch), ('--engine', args.engine != 'auto'),
+                                               ('--optimize', args.optimize), ('--cache', args.cache is not None)) if used]
+        if ignored:
+            parser.error(f"--external cannot be combined with {', '.join(ignored)}")
+
+    if args.batch:
+        run_batch(args.paths, args.workers, args.engine, args.figures, args.format, args.max_segments, args.fixed_point, args.optimize,
+                  args.cache, args.cache_entries, args.stats)
+        return
+    if len(args.paths) != 1:
+        print("Incorrect input. Example input:\n$ python src/main.py data/simple.txt\t - Solve case from file\n$ python src/main.py --batch data 'tests/*.txt'\t - Check many files\n$")
         return
     else:
-        print(f"Processing file {sys.argv[1]}.")
-        commands = InputParser.parse_file(sys.argv[1])
-    
-        commandProcessor = CommandsProcessor()
-        segments = commandProcessor.processCommands(commands)
-
-        ret = AnyIntersections.check(segments)
-        print(f"\033[KResult: {ret[0]}\ttime: {ret[1]:.4f}ms")
-        draw_edges(segments)
-
-
-    
-def draw_edges(segments):
-    for idx, segment in enumerate(segments):
-        x_values = [segment.start.x, segment.end.x]
-        y_values = [segment.start.y, segment.end.y]
-        plt.plot(x_values, y_values, 'b-')  # Blue line connecting start and end points
-        plt.text((segment.start.x + segment.end.x) / 2, (segment.start.y + segment.end.y) / 2, str(idx), fontsize=10, color='red')
-
-    plt.xlabel('X')
-    plt.ylabel('Y')
-    plt.title('Graphical representation of turtle path')
-    plt.grid(True)
-    plt.show()
-
-
-    
-main()
\ No newline at end of file
+        print(f"Processing file {args.paths[0]}.")
+        stats = CheckStats() if args.stats else None
+        start = perf_counter()
+        if args.external is not None:
+            # The segments are streamed to disk as they are processed, see ExternalSweep
+            with ExternalSweep.from_file(args.paths[0], args.fixed_point, args.external, args.run_events) as sweep:
+                processed = perf_counter()
+                ret = sweep.check(stats)
+            print(f"\033[KResult: {ret[0]}\ttime: {ret[1]:.4f}ms\tengine: {ret[2]}")
+            if stats is not None:
+                stats.phases['process'] = (processed - start) * 1000
+                print(stats)
+            return
+        commands = InputParser.parse_program(args.paths[0])
+
+        parsed = perf_counter()
+        commandProcessor = CommandsProcessor(args.fixed_point)
+        resultCache = key = None
+        if args.cache is not None:
+            # Keyed by the program like check_file, so that a hit skips processing too
+            resultCache = ResultCache.open(args.cache, args.cache_entries)
+            key = program_key(list(iter_expanded(commands)) if args.optimize else commands,
+                              engine=args.engine, fixedPoint=args.fixed_point, optimize=args.optimize)
+            cached = resultCache.get(key)
+            if cached is not None:
+                print(f"\033[KResult: {cached.result}\ttime: {(perf_counter() - parsed) * 1000:.4f}ms\tengine: {cached.engine}\t(cached)")
+                if stats is not None:
+                    stats.phases['parse'] = (parsed - start) * 1000
+                    print(stats)
+                if not args.no_draw:
+                    # The witness is indexed in the segments that were checked
+                    segments = optimize_path(list(iter_expanded(commands)), commandProcessor).segments if args.optimize \
+                        else commandProcessor.processCommands(commands)
+                    draw_edges(segments, output=args.output, highlight=cached.witness or (), maxSegments=args.max_segments)
+                return
+
+        periodic = None
+        if args.optimize:
+            segments = optimize_path(list(iter_expanded(commands)), commandProcessor).segments
+        elif any(type(command) is Repeat for command in commands):
+            # Long repeat blocks are checked by period, see PeriodicPath
+            segments = periodic = PeriodicPath(commands, args.fixed_point)
+        else:
+            segments = commandProcessor.processCommands(commands)
+        if stats is not None:
+            stats.phases['parse'] = (parsed - start) * 1000
+            stats.phases['process'] = (perf_counter() - parsed) * 1000
+
+        if periodic is not None:
+            witness, checkTime, usedEngine = periodic.find(args.engine, stats)
+        else:
+            witness, checkTime, usedEngine = AnyIntersections.find(segments, args.engine, stats)
+        if resultCache is not None:
+            resultCache.put(key, CachedResult(witness is not None, witness, usedEngine,
+                                              periodic.commands if periodic is not None else expanded_length(commands),
+                                              periodic.segments if periodic is not None else len(segments)))
+        print(f"\033[KResult: {witness is not None}\ttime: {checkTime:.4f}ms\tengine: {usedEngine}")
+        if stats is not None:
+            print(stats)
+        if not args.no_draw:
+            if periodic is not None:
+                segments = commandProcessor.processCommands(commands)
+            draw_edges(segments, output=args.output, highlight=witness or (), maxSegments=args.max_segments)
+
+
+def expand_paths(paths: Iterable[str]) -> list[str]:
+    """
+    Expands directories to the .txt files they contain and glob patterns to the files they match.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '*.txt'))))
+        elif any(character in path for character in '*?['):
+            files.extend(sorted(glob.glob(path, recursive=True)))
+        else:
+            files.append(path)
+    return files
+
+def check_file(filename: str, engine: str = 'auto', figures: Optional[str] = None, figureFormat: str = 'png',
+               maxSegments: Optional[int] = None, fixedPoint: bool = False, optimize: bool = False,
+               cache: Optional[str] = None, cacheEntries: int = DEFAULT_MAX_ENTRIES, collectStats: bool = False) -> dict:
+    """
+    Parses, processes and checks one command file, timing every phase, and optionally saves a drawing of it.
+
+    With a cache directory the parsed program is hashed first (see result_cache.command_key)
+    and a cached result is returned right away, unless the path still has to be drawn.
+
+    Returns:
+        dict: The file, the result, an intersecting pair of segments, the engine used, the numbers
+        of commands and segments and the phase times in ms (and the drawing, whether the result was
+        cached and the CheckStats), or the file and an 'error' if checking failed.
+    """
+    if not os.path.isfile(filename):
+        return {'file': filename, 'error': 'File not found'}
+    try:
+        start = perf_counter()
+        resultCache = ResultCache.open(cache, cacheEntries) if cache is not None else None
+        arrays = None # Opcodes and values, when the program is read without Command objects
+        program = None # Commands and repeat blocks, when the program has blocks
+        if binary_format.is_binary(filename):
+            # Straight from the mapped file to the vectorized processor
+            arrays = binary_format.read_arrays(filename)
+        elif not optimize and InputParser.has_repeats(filename):
+            program = InputParser.parse_program(filename)
+        elif resultCache is not None:
+            chunks = list(InputParser.iter_command_arrays(filename))
+            arrays = (np.concatenate([opcodes for opcodes, _ in chunks]) if chunks else np.empty(0, dtype=np.uint8),
+                      np.concatenate([values for _, values in chunks]) if chunks else np.empty(0, dtype=np.int64))
+
+        key = cached = None
+        if resultCache is not None:
+            options = {'engine': engine, 'fixedPoint': fixedPoint, 'optimize': optimize}
+            key = program_key(program, **options) if program is not None else command_key([arrays], **options)
+            cached = resultCache.get(key)
+            if cached is not None and figures is None:
+                return {
+                    'file': filename,
+                    'result': cached.result,
+                    'witness': cached.witness,
+                    'engine': cached.engine,
+                    'commands': cached.commands,
+                    'segments': cached.segments,
+                    'parse_ms': (perf_counter() - start) * 1000,
+                    'cached': True,
+                }
+
+        if program is not None:
+            parsed = perf_counter()
+            segments = PeriodicPath(program, fixedPoint)
+        elif arrays is not None and not optimize:
+            commands, values = arrays
+            parsed = perf_counter()
+            segments = SegmentStore.from_arrays(*CommandsProcessor(fixedPoint).processArrays(commands, values))
+        else:
+            commands = InputParser.parse_file(filename)
+            parsed = perf_counter()
+            if optimize:
+                segments = optimize_path(commands, CommandsProcessor(fixedPoint)).segments
+            else:
+                segments = CommandsProcessor(fixedPoint).processCommands(commands)
+        processed = perf_counter()
+        stats = CheckStats() if collectStats else None
+        if cached is not None:
+            witness, checkTime, usedEngine = cached.witness, 0.0, cached.engine
+        elif program is not None:
+            witness, checkTime, usedEngine = segments.find(engine, stats)
+        else:
+            witness, checkTime, usedEngine = AnyIntersections.find(segments, engine, stats)
+        line = {
+            'file': filename,
+            'result': witness is not None,
+            'witness': witness,
+            'engine': usedEngine,
+            'commands': segments.commands if program is not None else len(commands),
+            'segments': segments.segments if program is not None else len(segments),
+            'parse_ms': (parsed - start) * 1000,
+            'process_ms': (processed - parsed) * 1000,
+            'check_ms': checkTime,
+        }
+        if stats is not None:
+            stats.phases['parse'] = line['parse_ms']
+            stats.phases['process'] = line['process_ms']
+            line['stats'] = stats.as_dict()
+        if resultCache is not None:
+            line['cached'] = cached is not None
+            if cached is None:
+                resultCache.put(key, CachedResult(witness is not None, witness, usedEngine, line['commands'], line['segments']))
+
+        if figures is not None:
+            figure = os.path.join(figures, f"{os.path.splitext(os.path.basename(filename))[0]}.{figureFormat}")
+            start = perf_counter()
+            if program is not None:
+                segments = CommandsProcessor(fixedPoint).processCommands(program)
+            draw_edges(segments, output=figure, highlight=witness or (), maxSegments=maxSegments)
+            line['figure'] = figure
+            line['draw_ms'] = (perf_counter() - start) * 1000
+    except Exception as e:
+        return {'file': filename, 'error': str(e)}
+
+    return line
+
+def run_batch(paths: Iterable[str], workers: Optional[int] = None, engine: str = 'auto',
+              figures: Optional[str] = None, figureFormat: str = 'png', maxSegments: Optional[int] = None, fixedPoint: bool = False, optimize: bool = False,
+              cache: Optional[str] = None, cacheEntries: int = DEFAULT_MAX_ENTRIES, collectStats: bool = False):
+    """
+    Checks many command files in worker processes and prints one JSON line per file, in input
+    order, as soon as its result is known. Files are sent to the workers in chunks, so that
+    thousands of small files do not pay for one round trip each.
+    """
+    files = expand_paths(paths)
+    if figures is not None:
+        os.makedirs(figures, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, min(BATCH_CHUNK_SIZE, len(files) // (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for line in executor.map(check_file, files, repeat(engine), repeat(figures), repeat(figureFormat), repeat(maxSegments), repeat(fixedPoint), repeat(optimize),
+                                 repeat(cache), repeat(cacheEntries), repeat(collectStats), chunksize=chunksize):
+            print(json.dumps(line), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from typing import TypeVar, Generic, Optional, Generator
+from typing import TypeVar, Generic, Optional, Generator, Iterator, Tuple
 
 T = TypeVar('T')
 
@@ -254,4 +254,233 @@ def findPreSuc(root, key: TreeNode[T]):
  
     else: # go to right subtree
         findPreSuc.pre = root
-        findPreSuc(root.right, key)
\ No newline at end of file
+        findPreSuc(root.right, key)
+
+# Node of SweepStatus, with a parent link that
+# is kept correct by every rotation and deletion
+class StatusNode(Generic[T]):
+    __slots__ = ('val', 'parent', 'left', 'right', 'height')
+
+    def __init__(self, val: T, parent: Optional['StatusNode[T]']):
+        self.val = val
+        self.parent = parent
+        self.left = None
+        self.right = None
+        self.height = 1
+
+
+# Non-recursive AVL tree used as the status of a
+# sweep. Values are ordered with < and found with ==,
+# like in AVL_Tree, but the tree owns its root and
+# all queries return their results, so separate
+# trees can be used from separate threads.
+class SweepStatus(Generic[T]):
+    __slots__ = ('root', 'size', 'rotations')
+
+    def __init__(self):
+        self.root: Optional[StatusNode[T]] = None
+        self.size = 0
+        self.rotations = 0 # Rotations done so far, for CheckStats
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> Iterator[T]:
+        stack: list[StatusNode[T]] = []
+        node = self.root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.val
+            node = node.right
+
+    @property
+    def height(self) -> int:
+        return _height(self.root)
+
+    # Inserts val after all equal values and returns
+    # its node, which stays valid until it is removed
+    def insert(self, val: T) -> StatusNode[T]:
+        parent = None
+        goLeft = False
+        current = self.root
+        while current is not None:
+            parent = current
+            goLeft = val < current.val
+            current = current.left if goLeft else current.right
+
+        node = StatusNode(val, parent)
+        if parent is None:
+            self.root = node
+        elif goLeft:
+            parent.left = node
+        else:
+            parent.right = node
+        self.size += 1
+        self._rebalance(parent)
+        return node
+
+    # Removes the node holding val, returns
+    # False if there is no such node
+    def delete(self, val: T) -> bool:
+        node = self.find(val)
+        if node is None:
+            return False
+        self.remove(node)
+        return True
+
+    def remove(self, node: StatusNode[T]):
+        if node.left is not None and node.right is not None:
+            # The successor takes the place of the node,
+            # so the nodes of all other values stay valid
+            successor = node.right
+            while successor.left is not None:
+                successor = successor.left
+            if successor.parent is node:
+                start = successor
+            else:
+                start = successor.parent
+                self._replace(successor, successor.right)
+                successor.right = node.right
+                successor.right.parent = successor
+            self._replace(node, successor)
+            successor.left = node.left
+            successor.left.parent = successor
+            successor.height = node.height
+        else:
+            start = node.parent
+            self._replace(node, node.left if node.left is not None else node.right)
+        node.parent = node.left = node.right = None
+        self.size -= 1
+        self._rebalance(start)
+
+    def find(self, val: T) -> Optional[StatusNode[T]]:
+        current = self.root
+        while current is not None:
+            if val == current.val:
+                return current
+            current = current.left if val < current.val else current.right
+        return None
+
+    # Returns the values right before and right after val,
+    # the same ones findPreSuc finds, val need not be present
+    def neighbours(self, val: T) -> Tuple[Optional[T], Optional[T]]:
+        pre = suc = None
+        current = self.root
+        while current is not None:
+            if val == current.val:
+                if current.left is not None:
+                    pre = self.last(current.left)
+                if current.right is not None:
+                    suc = self.first(current.right)
+                break
+            if val < current.val:
+                suc = current
+                current = current.left
+            else:
+                pre = current
+                current = current.right
+        return (pre.val if pre is not None else None,
+                suc.val if suc is not None else None)
+
+    def predecessor(self, val: T) -> Optional[T]:
+        return self.neighbours(val)[0]
+
+    def successor(self, val: T) -> Optional[T]:
+        return self.neighbours(val)[1]
+
+    # Leftmost node of the subtree, of the whole tree by default
+    def first(self, node: Optional[StatusNode[T]] = None) -> Optional[StatusNode[T]]:
+        node = self.root if node is None else node
+        while node is not None and node.left is not None:
+            node = node.left
+        return node
+
+    # Rightmost node of the subtree, of the whole tree by default
+    def last(self, node: Optional[StatusNode[T]] = None) -> Optional[StatusNode[T]]:
+        node = self.root if node is None else node
+        while node is not None and node.right is not None:
+            node = node.right
+        return node
+
+    # In-order neighbours of a node, found through the parent links
+    def previous(self, node: StatusNode[T]) -> Optional[StatusNode[T]]:
+        if node.left is not None:
+            return self.last(node.left)
+        while node.parent is not None and node is node.parent.left:
+            node = node.parent
+        return node.parent
+
+    def next(self, node: StatusNode[T]) -> Optional[StatusNode[T]]:
+        if node.right is not None:
+            return self.first(node.right)
+        while node.parent is not None and node is node.parent.right:
+            node = node.parent
+        return node.parent
+
+    # Puts new in the place of old under old's parent
+    def _replace(self, old: StatusNode[T], new: Optional[StatusNode[T]]):
+        parent = old.parent
+        if new is not None:
+            new.parent = parent
+        if parent is None:
+            self.root = new
+        elif parent.left is old:
+            parent.left = new
+        else:
+            parent.right = new
+
+    # Restores heights and balance from node up to
+    # the root, stopping once a subtree height holds
+    def _rebalance(self, node: Optional[StatusNode[T]]):
+        while node is not None:
+            parent = node.parent
+            leftHeight, rightHeight = _height(node.left), _height(node.right)
+            if leftHeight - rightHeight > 1:
+                if _height(node.left.left) < _height(node.left.right):
+                    self._leftRotate(node.left)
+                self._rightRotate(node)
+            elif rightHeight - leftHeight > 1:
+                if _height(node.right.right) < _height(node.right.left):
+                    self._rightRotate(node.right)
+                self._leftRotate(node)
+            else:
+                height = 1 + max(leftHeight, rightHeight)
+                if height == node.height:
+                    break
+                node.height = height
+            node = parent
+
+    def _leftRotate(self, z: StatusNode[T]) -> StatusNode[T]:
+        self.rotations += 1
+        y = z.right
+        z.right = y.left
+        if y.left is not None:
+            y.left.parent = z
+        self._replace(z, y)
+        y.left = z
+        z.parent = y
+
+        z.height = 1 + max(_height(z.left), _height(z.right))
+        y.height = 1 + max(_height(y.left), _height(y.right))
+        return y
+
+    def _rightRotate(self, z: StatusNode[T]) -> StatusNode[T]:
+        self.rotations += 1
+        y = z.left
+        z.left = y.right
+        if y.right is not None:
+            y.right.parent = z
+        self._replace(z, y)
+        y.right = z
+        z.parent = y
+
+        z.height = 1 + max(_height(z.left), _height(z.right))
+        y.height = 1 + max(_height(y.left), _height(y.right))
+        return y
+
+
+def _height(node: Optional[StatusNode[T]]) -> int:
+    return node.height if node is not None else 0
@@ -0,0 +1,106 @@
+from typing import Iterable, Optional, Tuple
+from command import Command, CommandType
+from commands_processor import CommandsProcessor
+from intersection_checker import grid_cells, intersect_stored
+from segment import Node, Segment, SegmentStore
+
+DEFAULT_CELL_SIZE = 20.0 # Close to the typical turtle step, see commandGenerator
+
+class OnlineIntersectionDetector:
+    """
+    Detects the first self-intersection of a path while it is being drawn.
+
+    Segments are added one at a time and indexed in a uniform grid (spatial hash), so each
+    new segment is only tested with `intersect()` against earlier segments sharing a cell.
+    The work per segment grows with its length over cellSize, which suits turtle paths made
+    of many short steps.
+
+    Consecutive segments only share an endpoint, which `intersect()` does not count, so they
+    are reported only when the turtle turns back over its own line.
+    """
+    cellSize: float
+    segments: SegmentStore
+    cells: dict[Tuple[int, int], list[int]] # Grid cell -> indices of segments claiming it
+    crossing: Optional[Tuple[int, int]] # Segment indices of the first crossing found
+    crossingCommand: Optional[int] # Index of the command that drew the crossing segment
+
+    def __init__(self, cellSize: float = DEFAULT_CELL_SIZE):
+        self.cellSize = cellSize
+        self.segments = SegmentStore()
+        self.cells = {}
+        self.crossing = None
+        self.crossingCommand = None
+
+        self._processor = CommandsProcessor()
+        self._position = Node(0, 0)
+        self._relativeAngle = 0
+        self._penDown = True
+        self._commandCount = 0
+
+    def add_segment(self, segment: Segment, commandIndex: Optional[int] = None) -> bool:
+        """
+        Adds the next segment of the path.
+
+        Args:
+            segment (Segment): The segment drawn after all previously added ones.
+            commandIndex (Optional[int]): Index of the command that drew it, kept for reporting.
+
+        Returns:
+            bool: True if the segment intersects an earlier segment.
+        """
+        label = len(self.segments)
+        self.segments.append(segment.start.x, segment.start.y, segment.end.x, segment.end.y)
+
+        tested = set()
+        for cell in grid_cells(segment.start.x, segment.start.y, segment.end.x, segment.end.y, self.cellSize):
+            bucket = self.cells.setdefault(cell, [])
+            if self.crossing is None:
+                for other in bucket:
+                    if other not in tested:
+                        tested.add(other)
+                        if intersect_stored(self.segments, other, label):
+                            self.crossing = (other, label)
+                            self.crossingCommand = commandIndex
+                            break
+            bucket.append(label)
+        return self.crossing is not None and self.crossing[1] == label
+
+    def add_command(self, command: Command) -> bool:
+        """
+        Executes the next command of the program.
+
+        Returns:
+            bool: True if the command draws a segment that intersects an earlier segment.
+        """
+        index = self._commandCount
+        self._commandCount += 1
+        if command.command_type in [CommandType.MOVE_FORWARD, CommandType.MOVE_BACKWARDS]:
+            start = self._position
+            self._position = self._processor._processMove(command, start, self._relativeAngle)
+            if self._penDown:
+                return self.add_segment(Segment(start, self._position), index)
+        elif command.command_type is CommandType.RIGHT_TURN:
+            self._relativeAngle = (self._relativeAngle + command.value) % 360
+        elif command.command_type is CommandType.LEFT_TURN:
+            self._relativeAngle = (self._relativeAngle - command.value) % 360
+        elif command.command_type is CommandType.PEN_DOWN:
+            self._penDown = True
+        elif command.command_type is CommandType.PEN_UP:
+            self._penDown = False
+        return False
+
+    def first_crossing(self, commands: Iterable[Command]) -> Optional[int]:
+        """
+        Feeds commands until one of them makes the path intersect itself. The iterable is not
+        read any further, so with InputParser.iter_commands the rest of the file is never parsed.
+
+        Args:
+            commands (Iterable[Command]): The program, possibly a lazy stream.
+
+        Returns:
+            Optional[int]: Index of the first command whose segment intersects an earlier one, or None.
+        """
+        for command in commands:
+            if self.add_command(command):
+                return self.crossingCommand
+        return None
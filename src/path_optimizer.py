@@ -0,0 +1,154 @@
+from collections import Counter
+from fractions import Fraction
+from typing import Iterable, Optional, Tuple
+from command import Command, CommandType
+from commands_processor import CommandsProcessor
+from intersection_checker import orientation
+from segment import Segment
+
+MOVE_COMMANDS = (CommandType.MOVE_FORWARD, CommandType.MOVE_BACKWARDS)
+PEN_COMMANDS = (CommandType.PEN_DOWN, CommandType.PEN_UP)
+
+class OptimizedCommands:
+    commands: list[Command]
+    origins: list[Tuple[int, int]] # First and last original command folded into each command
+
+    def __init__(self):
+        self.commands = []
+        self.origins = []
+
+    def __len__(self) -> int:
+        return len(self.commands)
+
+    def append(self, command: Command, first: int, last: int):
+        self.commands.append(command)
+        self.origins.append((first, last))
+
+
+class OptimizedPath:
+    segments: list[Segment]
+    origins: list[Tuple[int, int]] # First and last original command drawing each segment
+
+    def __init__(self):
+        self.segments = []
+        self.origins = []
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    def command_range(self, segment: int) -> Tuple[int, int]:
+        """
+        Maps a segment of the optimized path, e.g. one reported by an intersection engine, back to
+        the original commands that drew it.
+        """
+        return self.origins[segment]
+
+
+def optimize_commands(commands: Iterable[Command]) -> OptimizedCommands:
+    """
+    Rewrites a program into an equivalent one with fewer commands.
+
+    Consecutive turns are folded into one right turn, or dropped when they cancel out, and
+    consecutive pen commands into the one state change they amount to, if any. Turns and pen
+    commands commute, so both are emitted right before the next move. Moves are kept as they
+    are: merging them would move the positions, which are rounded after every move.
+
+    Args:
+        commands (Iterable[Command]): The program.
+
+    Returns:
+        OptimizedCommands: The rewritten program and the original commands behind every command.
+    """
+    optimized = OptimizedCommands()
+    penDown = True
+    turn, turnFirst = 0, None
+    pen, penFirst = True, None
+    index = -1
+
+    def flush(last: int):
+        nonlocal turn, turnFirst, penDown, penFirst
+        if penFirst is not None and pen != penDown:
+            optimized.append(Command(CommandType.PEN_DOWN if pen else CommandType.PEN_UP), penFirst, last)
+            penDown = pen
+        if turnFirst is not None and turn % 360 != 0:
+            optimized.append(Command(CommandType.RIGHT_TURN, turn % 360), turnFirst, last)
+        turn, turnFirst = 0, None
+        penFirst = None
+
+    for index, command in enumerate(commands):
+        if command.command_type in MOVE_COMMANDS:
+            flush(index - 1)
+            optimized.append(command, index, index)
+        elif command.command_type in PEN_COMMANDS:
+            pen = command.command_type is CommandType.PEN_DOWN
+            penFirst = index if penFirst is None else penFirst
+        else:
+            turn += command.value if command.command_type is CommandType.RIGHT_TURN else -command.value
+            turnFirst = index if turnFirst is None else turnFirst
+    flush(index)
+    return optimized
+
+
+def optimize_path(commands: Iterable[Command], processor: Optional[CommandsProcessor] = None) -> OptimizedPath:
+    """
+    Builds the path of a program with as few segments as possible, without changing which parts of it intersect.
+
+    The program is first shrunk by optimize_commands and then processed as usual, so every
+    position is exactly the one the original program reaches. Pen-up moves draw nothing, so
+    each run of them ends up as a single jump between two drawn segments. Consecutive drawn
+    moves along the same heading and in the same direction are then joined into one segment
+    when their shared point lies exactly on the joined segment and is not a vertex anywhere
+    else in the path, where joining it would turn a touch at an endpoint into a touch inside.
+    Moves in opposite directions, such as `fd` followed by `bk`, are never joined, so retracing
+    is still reported as an overlap.
+
+    Args:
+        commands (Iterable[Command]): The program.
+        processor (Optional[CommandsProcessor]): Processor to use, e.g. in fixed-point mode.
+
+    Returns:
+        OptimizedPath: The segments and the original commands behind every segment.
+    """
+    processor = processor or CommandsProcessor()
+    optimized = optimize_commands(commands)
+    segments = processor.processCommands(optimized.commands)
+
+    # Origins and heading of the move behind every drawn segment
+    drawn: list[Tuple[int, int]] = []
+    headings: list[int] = []
+    penDown = True
+    heading = 0
+    for command, origin in zip(optimized.commands, optimized.origins):
+        if command.command_type in MOVE_COMMANDS:
+            if penDown:
+                drawn.append(origin)
+                headings.append(heading)
+        elif command.command_type in PEN_COMMANDS:
+            penDown = command.command_type is CommandType.PEN_DOWN
+        else:
+            heading = (heading + command.value) % 360
+
+    vertices = Counter()
+    for segment in segments:
+        vertices[(segment.start.x, segment.start.y)] += 1
+        vertices[(segment.end.x, segment.end.y)] += 1
+
+    path = OptimizedPath()
+    for i, segment in enumerate(segments):
+        if path.segments and headings[i] == headings[i - 1] and _joinable(path.segments[-1], segment, vertices):
+            path.segments[-1] = Segment(path.segments[-1].start, segment.end)
+            path.origins[-1] = (path.origins[-1][0], drawn[i][1])
+        else:
+            path.segments.append(segment)
+            path.origins.append(drawn[i])
+    return path
+
+
+def _joinable(first: Segment, second: Segment, vertices: Counter) -> bool:
+    joint = second.start
+    if (first.end.x, first.end.y) != (joint.x, joint.y) or vertices[(joint.x, joint.y)] != 2:
+        return False
+    # Same heading, but rounding after every move can bend the path slightly and a negative
+    # distance turns it around, so check exactly that the joint lies inside the joined segment
+    x0, y0, x1, y1, x2, y2 = map(Fraction, (first.start.x, first.start.y, joint.x, joint.y, second.end.x, second.end.y))
+    return orientation(x1, y1, x0, y0, x2, y2) == 0 and (x1 - x0) * (x2 - x1) + (y1 - y0) * (y2 - y1) > 0
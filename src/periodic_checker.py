@@ -0,0 +1,302 @@
+import numpy as np
+from math import gcd
+from typing import Iterable, Iterator, Optional, Tuple
+from check_stats import CheckStats
+from command import CommandType, OPCODES, Repeat, expanded_length, iter_expanded
+from commands_processor import SCALE, CommandsProcessor, TurtleState
+from intersection_checker import AnyIntersections
+from segment import SegmentStore
+
+PERIODIC_MIN_COMMANDS = 4096 # Repeat blocks expanding to fewer commands are processed like plain commands
+PERIODIC_MIN_COPIES = 3 # Fewer full turns of a block than this are processed like plain commands
+
+class PeriodicPiece:
+    """
+    The copies of the body of a repeat block after its first iteration, grouped into periods.
+
+    A period is the body repeated until its turns add up to a multiple of 360 degrees, so every
+    period starts with the same heading and pen state and is the first one shifted by a multiple
+    of the same vector, as steps only depend on the heading and the distance. That is exact in the
+    fixed-point mode; in the float mode the rare steps rounded at a tie (see
+    CommandsProcessor._positions) may differ by a unit.
+
+    A period is kept as arrays of commands, or as the program of the period if the body holds
+    long blocks itself, which are then never expanded either.
+    """
+    __slots__ = ('start', 'opcodes', 'values', 'program', 'copies', 'drawn', 'firstLabel', 'box', 'shift')
+    start: TurtleState # State at the start of the first period
+    opcodes: Optional[np.ndarray] # One period, None if it is kept as a program
+    values: Optional[np.ndarray]
+    program: Optional[list] # One period, if the body holds long blocks
+    copies: int # Number of periods
+    drawn: int # Segments drawn by every period
+    firstLabel: int # Index of the first segment of the first period in the full path
+    box: np.ndarray # minX, minY, maxX, maxY of the first period in 10^-DECIMALS units
+    shift: Tuple[int, int] # Move of the turtle over one period in 10^-DECIMALS units
+
+    def __init__(self, start, opcodes, values, program, copies, drawn, firstLabel, box, shift):
+        self.start, self.opcodes, self.values, self.program, self.copies = start, opcodes, values, program, copies
+        self.drawn, self.firstLabel, self.box, self.shift = drawn, firstLabel, box, shift
+
+    def sweptBox(self) -> np.ndarray:
+        last = self.box + np.array(self.shift * 2) * (self.copies - 1)
+        return np.concatenate((np.minimum(self.box[:2], last[:2]), np.maximum(self.box[2:], last[2:])))
+
+    def selfCopies(self) -> int:
+        """
+        Returns the number of leading periods that hold an intersecting pair whenever the block
+        intersects itself: a pair of periods d apart looks like periods 0 and d, and periods
+        whose boxes are apart cannot meet. A block that does not move retraces itself.
+        """
+        if self.shift == (0, 0):
+            return min(self.copies, 2)
+        extents = (int(self.box[2] - self.box[0]), int(self.box[3] - self.box[1]))
+        apart = min(extent // abs(shift) + 1 for extent, shift in zip(extents, self.shift) if shift)
+        return min(self.copies, apart)
+
+    def copiesMeeting(self, boxes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the range of periods (first, last inclusive, empty if first > last) whose box
+        meets each of the boxes (rows of minX, minY, maxX, maxY in 10^-DECIMALS units).
+        """
+        first = np.zeros(len(boxes), dtype=np.int64)
+        last = np.full(len(boxes), self.copies - 1, dtype=np.int64)
+        for axis, shift in enumerate(self.shift):
+            # Period d spans low + d * shift to high + d * shift on this axis
+            low, high = self.box[axis], self.box[axis + 2]
+            below, above = boxes[:, axis + 2] - low, boxes[:, axis] - high
+            if shift > 0:
+                first = np.maximum(first, -((-above) // shift))
+                last = np.minimum(last, below // shift)
+            elif shift < 0:
+                first = np.maximum(first, -((-below) // shift))
+                last = np.minimum(last, above // shift)
+            else:
+                last = np.where((below >= 0) & (above <= 0), last, -1)
+        return first, last
+
+
+class PeriodicPath:
+    """
+    The segments of a program with repeat blocks (see InputParser.parse_program) that decide
+    whether its path intersects itself, without expanding the long blocks.
+
+    Plain commands and short blocks are processed as usual. A long block is processed once
+    for its first iteration, after which its periods (see PeriodicPiece) only differ by a
+    shift, and a pair of periods intersects like the first period and the one as far away
+    from it. So only the leading periods up to the first one whose box is apart from the first
+    are kept, plus the periods whose boxes meet a segment outside of the block or the area
+    swept by another long block. Any intersection of the full path has a copy among the kept
+    segments, which keep their index in the full path, so a witness is a pair of the full path.
+    Blocks nested in a block repeated fewer than PERIODIC_MIN_COPIES times count as top-level.
+
+    Long blocks nested in a long block are reduced the same way: the periods of the outer block
+    are laid out as parts of their own, and every range of them that is kept is written out as
+    copies of the body whose inner blocks keep only the periods that matter within the range or
+    meet the boxes of the rest of the path.
+    """
+    store: SegmentStore # The kept segments
+    labels: np.ndarray # Index of every kept segment in the full path
+    commands: int # Commands of the expanded program
+    segments: int # Segments of the full path
+
+    def __init__(self, program: Iterable, fixedPoint: bool = False):
+        self._layout(program, fixedPoint, TurtleState(), 0)
+        coordinates, self.labels = self._selected(np.zeros((0, 4), dtype=np.int64))
+        self.store = SegmentStore.from_arrays(*coordinates)
+
+    @classmethod
+    def _part(cls, program: Iterable, fixedPoint: bool, state: TurtleState, firstLabel: int) -> 'PeriodicPath':
+        # Lays out a part of a path starting with the given state and segment index, see _layout
+        part = cls.__new__(cls)
+        part._layout(program, fixedPoint, state, firstLabel)
+        return part
+
+    def check(self, engine: str = 'auto', stats: Optional[CheckStats] = None) -> Tuple[bool, float, str]:
+        witness, execution_time, engine = self.find(engine, stats)
+        return [witness is not None, execution_time, engine]
+
+    def find(self, engine: str = 'auto', stats: Optional[CheckStats] = None) -> Tuple[Optional[Tuple[int, int]], float, str]:
+        """
+        Same as AnyIntersections.find on the full path, with the witness indexed in the full path.
+        """
+        witness, execution_time, engine = AnyIntersections.find(self.store, engine, stats)
+        if witness is not None:
+            witness = tuple(sorted((int(self.labels[witness[0]]), int(self.labels[witness[1]]))))
+        return [witness, execution_time, engine]
+
+    def _layout(self, program: Iterable, fixedPoint: bool, state: TurtleState, firstLabel: int):
+        # Processes the plain commands and the first iterations and periods of the long blocks
+        self.processor = CommandsProcessor(fixedPoint)
+        self.fixedPoint = fixedPoint
+        self._state = state
+        self._firstLabel = firstLabel
+        self._pieces: list[Tuple[tuple, int]] = [] # Coordinates and first label of everything processed as usual
+        self._periodic: list[PeriodicPiece] = []
+        self.commands = 0
+        self.segments = 0
+        self._processItems(program)
+
+    def _processItems(self, program: Iterable):
+        plain = []
+        for item in _unrolled(program):
+            if _isLong(item):
+                if plain:
+                    self._process(*_arrays(plain))
+                    plain = []
+                self._processRepeat(item)
+            else:
+                plain.append(item)
+        if plain:
+            self._process(*_arrays(plain))
+
+    def _process(self, opcodes: np.ndarray, values: np.ndarray):
+        # Processes commands as usual, from the current state
+        coordinates = self.processor.processArrays(opcodes, values, self._state)
+        self._pieces.append((coordinates, self._firstLabel + self.segments))
+        self.commands += len(opcodes)
+        self.segments += len(coordinates[0])
+
+    def _processRepeat(self, repeat: Repeat):
+        if repeat.count == 0 or expanded_length(repeat.body) == 0:
+            return
+        nested = any(_isLong(item) for item in _unrolled(repeat.body))
+        # After the first iteration every one starts with the same pen state
+        self._processItems(repeat.body)
+
+        period = 360 // gcd(_turn(repeat.body), 360)
+        copies, rest = divmod(repeat.count - 1, period)
+        if copies < PERIODIC_MIN_COPIES:
+            if nested:
+                self._processItems(repeat.body * (repeat.count - 1))
+            else:
+                opcodes, values = _arrays(repeat.body)
+                self._process(np.tile(opcodes, repeat.count - 1), np.tile(values, repeat.count - 1))
+            return
+
+        start = _copy(self._state)
+        if nested:
+            opcodes = values = None
+            program = repeat.body * period
+            part = PeriodicPath._part(program, self.fixedPoint, _copy(start), 0)
+            self._state, commands, drawn, box = part._state, part.commands, part.segments, part._box()
+        else:
+            program = None
+            opcodes, values = _arrays(repeat.body)
+            opcodes, values = np.tile(opcodes, period), np.tile(values, period)
+            coordinates = self.processor.processArrays(opcodes, values, self._state)
+            commands, drawn, box = len(opcodes), len(coordinates[0]), self._box(coordinates)
+        shift = (self._state.x - start.x, self._state.y - start.y)
+        if drawn:
+            self._periodic.append(PeriodicPiece(start, opcodes, values, program, copies, drawn, self._firstLabel + self.segments, box, shift))
+        self._state.x, self._state.y = start.x + copies * shift[0], start.y + copies * shift[1]
+        self.commands += copies * commands
+        self.segments += copies * drawn
+
+        if nested:
+            self._processItems(repeat.body * rest)
+        else:
+            opcodes, values = _arrays(repeat.body)
+            self._process(np.tile(opcodes, rest), np.tile(values, rest))
+
+    def _selected(self, context: np.ndarray) -> Tuple[tuple, np.ndarray]:
+        # Coordinates and labels of the plain segments and the periods that matter, see the class
+        # docstring, where context holds the boxes of the path outside of this part
+        boxes = [self._boxes(coordinates) for coordinates, _ in self._pieces]
+        plainBoxes = np.concatenate([context] + boxes)
+
+        kept = [(coordinates, np.arange(len(coordinates[0])) + firstLabel) for coordinates, firstLabel in self._pieces]
+        for piece in self._periodic:
+            others = np.concatenate([plainBoxes] + [other.sweptBox()[None, :] for other in self._periodic if other is not piece]).astype(np.int64)
+            ranges = [(0, piece.selfCopies())]
+            if piece.shift != (0, 0):
+                # Periods of a block that does not move all lie on the first one
+                first, last = piece.copiesMeeting(others)
+                meets = first <= last
+                ranges += zip(first[meets].tolist(), (last[meets] + 1).tolist())
+            for begin, end in _merged(sorted(ranges)):
+                state = _copy(piece.start)
+                state.x, state.y = piece.start.x + begin * piece.shift[0], piece.start.y + begin * piece.shift[1]
+                if piece.program is None:
+                    coordinates = self.processor.processArrays(np.tile(piece.opcodes, end - begin), np.tile(piece.values, end - begin), state)
+                    kept.append((coordinates, piece.firstLabel + begin * piece.drawn + np.arange((end - begin) * piece.drawn)))
+                else:
+                    # The periods written out, so that they are not taken for a long block again
+                    part = PeriodicPath._part(piece.program * (end - begin), self.fixedPoint, state, piece.firstLabel + begin * piece.drawn)
+                    kept.append(part._selected(others))
+
+        if not kept:
+            empty = np.zeros(0, dtype=np.int64 if self.fixedPoint else np.float64)
+            return (empty,) * 4, np.zeros(0, dtype=np.int64)
+        return tuple(np.concatenate([coordinates[axis] for coordinates, _ in kept]) for axis in range(4)), \
+            np.concatenate([labels for _, labels in kept])
+
+    def _boxes(self, coordinates: tuple) -> np.ndarray:
+        # Bounding box of every segment in 10^-DECIMALS units
+        x0, y0, x1, y1 = self._units(coordinates)
+        return np.stack((np.minimum(x0, x1), np.minimum(y0, y1), np.maximum(x0, x1), np.maximum(y0, y1)), axis=1)
+
+    def _box(self, coordinates: Optional[tuple] = None) -> Optional[np.ndarray]:
+        # Bounding box of the given segments, or of everything laid out, in 10^-DECIMALS units
+        if coordinates is not None:
+            boxes = self._boxes(coordinates)
+        else:
+            boxes = np.concatenate([self._boxes(coordinates) for coordinates, _ in self._pieces] +
+                                   [piece.sweptBox()[None, :] for piece in self._periodic] + [np.zeros((0, 4), dtype=np.int64)])
+        if not len(boxes):
+            return None
+        return np.concatenate((boxes[:, :2].min(axis=0), boxes[:, 2:].max(axis=0)))
+
+    def _units(self, coordinates: tuple) -> tuple:
+        # Coordinates in 10^-DECIMALS units, exact for the float mode too as they are such units / SCALE
+        if self.fixedPoint:
+            return coordinates
+        return tuple(np.rint(axis * SCALE).astype(np.int64) for axis in coordinates)
+
+
+def _isLong(item) -> bool:
+    return type(item) is Repeat and item.count * expanded_length(item.body) >= PERIODIC_MIN_COMMANDS
+
+def _turn(program: Iterable) -> int:
+    # Sum of the turns of the expansion of a program, modulo 360
+    turn = 0
+    for item in program:
+        if type(item) is Repeat:
+            turn += item.count * _turn(item.body)
+        elif item.command_type is CommandType.RIGHT_TURN:
+            turn += item.value
+        elif item.command_type is CommandType.LEFT_TURN:
+            turn -= item.value
+    return turn % 360
+
+def _unrolled(program: Iterable) -> Iterator:
+    for item in program:
+        if type(item) is Repeat and item.count < PERIODIC_MIN_COPIES:
+            for _ in range(item.count):
+                yield from _unrolled(item.body)
+        else:
+            yield item
+
+def _arrays(program: Iterable) -> Tuple[np.ndarray, np.ndarray]:
+    commands = list(iter_expanded(program))
+    return (np.fromiter((OPCODES[command.command_type] for command in commands), dtype=np.uint8, count=len(commands)),
+            np.fromiter((command.value or 0 for command in commands), dtype=np.int64, count=len(commands)))
+
+def _copy(state: TurtleState) -> TurtleState:
+    copy = TurtleState()
+    copy.x, copy.y, copy.heading, copy.penDown = state.x, state.y, state.heading, state.penDown
+    return copy
+
+def _merged(ranges: list[Tuple[int, int]]) -> Iterator[Tuple[int, int]]:
+    begin, end = None, None
+    for low, high in ranges:
+        if low >= high:
+            continue
+        if end is not None and low <= end:
+            end = max(end, high)
+            continue
+        if end is not None:
+            yield begin, end
+        begin, end = low, high
+    if end is not None:
+        yield begin, end
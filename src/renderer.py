@@ -0,0 +1,93 @@
+import math
+import numpy as np
+from typing import Iterable, Optional, Union
+from segment import Segment, SegmentStore
+
+LABEL_THRESHOLD = 200 # Larger paths only get labels on highlighted segments
+RASTERIZE_THRESHOLD = 20_000 # Larger paths are rasterized inside vector output such as SVG
+DEFAULT_DPI = 150
+
+def pen_down_runs(store: SegmentStore) -> list[np.ndarray]:
+    """
+    Joins consecutive segments into polylines, one for every run drawn without lifting the pen.
+
+    Args:
+        store (SegmentStore): The segments, in drawing order.
+
+    Returns:
+        list[np.ndarray]: The vertices of every run as an array of shape (k + 1, 2) for k segments.
+    """
+    if len(store) == 0:
+        return []
+    x0, y0 = np.frombuffer(store.x0, dtype=store.typecode), np.frombuffer(store.y0, dtype=store.typecode)
+    x1, y1 = np.frombuffer(store.x1, dtype=store.typecode), np.frombuffer(store.y1, dtype=store.typecode)
+    breaks = np.flatnonzero((x0[1:] != x1[:-1]) | (y0[1:] != y1[:-1])) + 1
+    ends = np.column_stack((x1, y1))
+
+    runs = []
+    for start, stop in zip(np.r_[0, breaks], np.r_[breaks, len(store)]):
+        runs.append(np.vstack(((x0[start], y0[start]), ends[start:stop])))
+    return runs
+
+def downsample(runs: list[np.ndarray], maxSegments: int) -> list[np.ndarray]:
+    """
+    Keeps every k-th vertex of each run, and its last one, so that about maxSegments segments remain.
+    """
+    total = sum(len(run) - 1 for run in runs)
+    if total <= maxSegments:
+        return runs
+    stride = math.ceil(total / maxSegments)
+    return [run[np.r_[0:len(run) - 1:stride, len(run) - 1]] for run in runs]
+
+def draw_edges(segments: Union[list[Segment], SegmentStore], output: Optional[str] = None, labels: Optional[bool] = None,
+               highlight: Iterable[int] = (), maxSegments: Optional[int] = None, dpi: int = DEFAULT_DPI):
+    """
+    Draws a turtle path as a single LineCollection, so even millions of segments draw in seconds.
+
+    Args:
+        segments (Union[list[Segment], SegmentStore]): The path.
+        output (Optional[str]): File to save the figure to, in the format of its extension (.png, .svg, .pdf).
+            The figure is saved without pyplot, so no display is needed. If None, it is shown in a window.
+        labels (Optional[bool]): Whether to label every segment with its index. By default only paths of
+            at most LABEL_THRESHOLD segments are; highlighted segments are labelled either way.
+        highlight (Iterable[int]): Indices of segments drawn in red, for example the intersecting ones.
+        maxSegments (Optional[int]): Downsample the path to about this many segments before drawing.
+        dpi (int): Resolution of raster output.
+    """
+    from matplotlib.collections import LineCollection
+
+    if output is None:
+        import matplotlib.pyplot as plt
+        figure = plt.figure()
+    else:
+        from matplotlib.figure import Figure
+        figure = Figure()
+    axes = figure.add_subplot()
+
+    store = SegmentStore.of(segments)
+    runs = pen_down_runs(store)
+    if maxSegments is not None:
+        runs = downsample(runs, maxSegments)
+    axes.add_collection(LineCollection(runs, colors='b', rasterized=len(store) > RASTERIZE_THRESHOLD))
+
+    highlight = sorted(set(highlight))
+    if highlight:
+        lines = [((x0, y0), (x1, y1)) for x0, y0, x1, y1 in map(store.coordinates, highlight)]
+        axes.add_collection(LineCollection(lines, colors='r', zorder=3))
+
+    if labels is None:
+        labels = len(store) <= LABEL_THRESHOLD
+    for idx in (range(len(store)) if labels else highlight):
+        x0, y0, x1, y1 = store.coordinates(idx)
+        axes.text((x0 + x1) / 2, (y0 + y1) / 2, str(idx), fontsize=10, color='red')
+
+    axes.autoscale_view()
+    axes.set_xlabel('X')
+    axes.set_ylabel('Y')
+    axes.set_title('Graphical representation of turtle path')
+    axes.grid(True)
+
+    if output is None:
+        plt.show()
+    else:
+        figure.savefig(output, dpi=dpi)
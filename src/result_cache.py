@@ -0,0 +1,213 @@
+import hashlib
+import os
+import sqlite3
+from collections import OrderedDict
+from time import perf_counter, time
+from typing import Iterable, Optional, Tuple, Union
+import numpy as np
+from check_stats import CheckStats
+from command import CommandType, OPCODES, Repeat
+from intersection_checker import AnyIntersections
+from segment import Segment, SegmentStore
+
+CACHE_VERSION = 5 # Bumped whenever parsing, processing or an engine changes in a way that can change results, see tests/test_result_cache.py
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'turtle-intersections')
+DEFAULT_MAX_ENTRIES = 1_000_000 # Entries kept on disk before the least recently used ones are evicted
+MEMORY_ENTRIES = 4096 # Entries kept in the in-memory front tier of every process
+EVICTION_TARGET = 0.9 # Eviction shrinks the cache to this fraction of its limit, so it does not run on every write
+BUSY_TIMEOUT = 30.0 # Seconds to wait for the database while other processes write to it
+REPEAT_OPCODE, END_OPCODE = 254, 255 # Stand for `repeat N [` and `]` in program_key, no command has these opcodes
+PEN_OPCODES = np.array([OPCODES[CommandType.PEN_DOWN], OPCODES[CommandType.PEN_UP]], dtype=np.uint8)
+
+def command_key(chunks: Iterable[Tuple[np.ndarray, np.ndarray]], **options) -> str:
+    """
+    Hashes a normalized command stream, so that the same program gets the same key whether it
+    comes from a text or a binary file, however it is formatted and however it is batched.
+
+    Args:
+        chunks (Iterable[Tuple[np.ndarray, np.ndarray]]): Batches of opcodes and values, e.g. from
+            InputParser.iter_command_arrays.
+        options: Everything else the result depends on, e.g. the engine and the processing mode.
+
+    Returns:
+        str: The key, as hex.
+    """
+    opcodeHash, valueHash = hashlib.blake2b(digest_size=20), hashlib.blake2b(digest_size=20)
+    for opcodes, values in chunks:
+        opcodes = np.asarray(opcodes, dtype=np.uint8)
+        # Pen commands have no value, whatever a file stores for them
+        values = np.where(np.isin(opcodes, PEN_OPCODES), 0, values).astype('<i8')
+        opcodeHash.update(opcodes.tobytes())
+        valueHash.update(values.tobytes())
+    return _key('commands', opcodeHash.digest() + valueHash.digest(), options)
+
+def program_key(program, **options) -> str:
+    """
+    command_key of a program with repeat blocks (see InputParser.parse_program), which hashes
+    the blocks as written instead of their expansion.
+    """
+    opcodes, values = [], []
+
+    def flatten(items):
+        for item in items:
+            if type(item) is Repeat:
+                opcodes.append(REPEAT_OPCODE)
+                values.append(item.count)
+                flatten(item.body)
+                opcodes.append(END_OPCODE)
+                values.append(0)
+            else:
+                opcodes.append(OPCODES[item.command_type])
+                values.append(item.value or 0)
+
+    flatten(program)
+    return command_key([(np.array(opcodes, dtype=np.uint8), np.array(values, dtype=np.int64))], **options)
+
+def segment_key(segments: Union[list[Segment], SegmentStore], **options) -> str:
+    """
+    Hashes the coordinates of a path, for paths that do not come from a command file.
+    """
+    store = SegmentStore.of(segments)
+    digest = hashlib.blake2b(store.typecode.encode(), digest_size=20)
+    for coordinates in (store.x0, store.y0, store.x1, store.y1):
+        digest.update(memoryview(coordinates).cast('B'))
+    return _key('segments', digest.digest(), options)
+
+def _key(kind: str, digest: bytes, options: dict) -> str:
+    header = f"{CACHE_VERSION}|{kind}|" + ",".join(f"{name}={options[name]}" for name in sorted(options))
+    return hashlib.blake2b(header.encode() + digest, digest_size=20).hexdigest()
+
+
+class CachedResult:
+    __slots__ = ('result', 'witness', 'engine', 'commands', 'segments')
+    result: bool
+    witness: Optional[Tuple[int, int]] # Indices of an intersecting pair of segments
+    engine: str
+    commands: Optional[int]
+    segments: Optional[int]
+
+    def __init__(self, result: bool, witness: Optional[Tuple[int, int]], engine: str,
+                 commands: Optional[int] = None, segments: Optional[int] = None):
+        self.result = result
+        self.witness = witness
+        self.engine = engine
+        self.commands = commands
+        self.segments = segments
+
+    def __repr__(self) -> str:
+        return f"CachedResult: {self.result} {self.witness} ({self.engine})"
+
+
+class ResultCache:
+    """
+    Two-tier cache of intersection results, keyed by command_key or segment_key.
+
+    Results are stored on disk in an SQLite database, which processes of the batch mode share,
+    and the least recently used entries are evicted beyond maxEntries. Entries of another CACHE_VERSION are dropped when the cache is
+    opened. Every process also keeps the last memoryEntries results in memory, so repeated
+    files of a batch do not reach the database.
+    """
+    directory: str
+    maxEntries: int
+    memoryEntries: int
+    hits: int
+    misses: int
+
+    _opened: dict = {} # Caches of this process by directory, see open
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, maxEntries: int = DEFAULT_MAX_ENTRIES, memoryEntries: int = MEMORY_ENTRIES):
+        self.directory = directory
+        self.maxEntries = maxEntries
+        self.memoryEntries = memoryEntries
+        self.hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, CachedResult] = OrderedDict()
+
+        os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(os.path.join(directory, 'results.sqlite'), timeout=BUSY_TIMEOUT, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("""CREATE TABLE IF NOT EXISTS results (
+            key TEXT PRIMARY KEY, version INTEGER, result INTEGER, first INTEGER, second INTEGER,
+            engine TEXT, commands INTEGER, segments INTEGER, used REAL)""")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+        self._connection.execute("DELETE FROM results WHERE version != ?", (CACHE_VERSION,))
+        self._entries = len(self) # Kept up to date with the writes of this process only, as counting is O(n)
+
+    @classmethod
+    def open(cls, directory: str = DEFAULT_DIRECTORY, maxEntries: int = DEFAULT_MAX_ENTRIES) -> 'ResultCache':
+        """
+        Returns the cache of this process for a directory, so that its memory tier lasts across files.
+        """
+        cache = cls._opened.get(directory)
+        if cache is None:
+            cache = cls._opened[directory] = cls(directory, maxEntries)
+        cache.maxEntries = maxEntries
+        return cache
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        cached = self._memory.get(key)
+        if cached is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return cached
+
+        row = self._connection.execute(
+            "SELECT result, first, second, engine, commands, segments FROM results WHERE key = ? AND version = ?",
+            (key, CACHE_VERSION)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self._connection.execute("UPDATE results SET used = ? WHERE key = ?", (time(), key))
+        result, first, second, engine, commands, segments = row
+        cached = CachedResult(bool(result), None if first is None else (first, second), engine, commands, segments)
+        self._remember(key, cached)
+        self.hits += 1
+        return cached
+
+    def put(self, key: str, cached: CachedResult):
+        first, second = cached.witness if cached.witness is not None else (None, None)
+        new = self._connection.execute("SELECT 1 FROM results WHERE key = ?", (key,)).fetchone() is None
+        self._connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                 (key, CACHE_VERSION, int(cached.result), first, second, cached.engine,
+                                  cached.commands, cached.segments, time()))
+        self._remember(key, cached)
+        self._entries += new
+        if self._entries > self.maxEntries:
+            self.evict()
+
+    def evict(self):
+        """
+        Deletes the least recently used entries once there are more than maxEntries.
+        """
+        entries = len(self)
+        if entries > self.maxEntries:
+            excess = entries - int(self.maxEntries * EVICTION_TARGET)
+            self._connection.execute("DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY used LIMIT ?)", (excess,))
+        self._entries = len(self)
+
+    def check(self, segments: Union[list[Segment], SegmentStore], engine: str = 'auto', stats: Optional[CheckStats] = None) -> Tuple[bool, float, str]:
+        """
+        Cached AnyIntersections.check, keyed by segment_key. The time is that of the lookup on a hit.
+        """
+        start = perf_counter()
+        key = segment_key(segments, engine=engine)
+        cached = self.get(key)
+        if cached is not None:
+            return [cached.result, (perf_counter() - start) * 1000, cached.engine]
+        witness, execution_time, usedEngine = AnyIntersections.find(segments, engine, stats)
+        self.put(key, CachedResult(witness is not None, witness, usedEngine, segments=len(segments)))
+        return [witness is not None, execution_time, usedEngine]
+
+    def clear(self):
+        self._memory.clear()
+        self._connection.execute("DELETE FROM results")
+        self._entries = 0
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def _remember(self, key: str, cached: CachedResult):
+        self._memory[key] = cached
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memoryEntries:
+            self._memory.popitem(last=False)
@@ -1,6 +1,9 @@
 from __future__ import annotations
+from array import array
+from typing import Iterator, Tuple, Union
 
 class Segment:
+    __slots__ = ('start', 'end')
     start: Node
     end: Node
 
@@ -12,6 +15,7 @@ class Segment:
         return f"E: {self.start} -> {self.end}"
         
 class Node:
+    __slots__ = ('x', 'y')
     x: float
     y: float
 
@@ -24,4 +28,73 @@ class Node:
     
     def __lt__(self, other: 'Node') -> bool:
         return self.x < other.x
-        
\ No newline at end of file
+
+class SegmentStore:
+    """
+    Struct-of-arrays storage for segments: one array('d') per coordinate instead of
+    a Segment and two Node objects per edge. Segments are addressed by index.
+
+    Integer coordinates, as made by the fixed-point mode of CommandsProcessor, are kept in
+    array('q') instead, so that they stay Python ints and the predicates stay exact.
+    """
+    __slots__ = ('x0', 'y0', 'x1', 'y1')
+    x0: array
+    y0: array
+    x1: array
+    y1: array
+
+    def __init__(self, x0=(), y0=(), x1=(), y1=(), typecode: str = 'd'):
+        self.x0 = array(typecode, x0)
+        self.y0 = array(typecode, y0)
+        self.x1 = array(typecode, x1)
+        self.y1 = array(typecode, y1)
+
+    @property
+    def typecode(self) -> str:
+        return self.x0.typecode
+
+    @classmethod
+    def from_segments(cls, segments: list[Segment]) -> SegmentStore:
+        # The float mode starts at Node(0, 0) too, so only a path made of ints throughout is fixed-point
+        fixed = len(segments) > 0 and all(type(segment.start.x) is int and type(segment.start.y) is int and
+                                          type(segment.end.x) is int and type(segment.end.y) is int for segment in segments)
+        store = cls(typecode='q' if fixed else 'd')
+        for segment in segments:
+            store.append(segment.start.x, segment.start.y, segment.end.x, segment.end.y)
+        return store
+
+    @classmethod
+    def from_arrays(cls, x0, y0, x1, y1) -> SegmentStore:
+        """Builds a store from float64 or int64 buffers such as the NumPy arrays of CommandsProcessor.processArrays."""
+        store = cls(typecode='d' if memoryview(x0).format == 'd' else 'q')
+        for target, source in zip((store.x0, store.y0, store.x1, store.y1), (x0, y0, x1, y1)):
+            target.frombytes(memoryview(source).tobytes())
+        return store
+
+    @classmethod
+    def of(cls, segments: Union[list[Segment], SegmentStore]) -> SegmentStore:
+        return segments if isinstance(segments, SegmentStore) else cls.from_segments(segments)
+
+    def append(self, x0: float, y0: float, x1: float, y1: float):
+        self.x0.append(x0)
+        self.y0.append(y0)
+        self.x1.append(x1)
+        self.y1.append(y1)
+
+    def __len__(self) -> int:
+        return len(self.x0)
+
+    def coordinates(self, index: int) -> Tuple[float, float, float, float]:
+        return self.x0[index], self.y0[index], self.x1[index], self.y1[index]
+
+    def __iter__(self) -> Iterator[Tuple[float, float, float, float]]:
+        return zip(self.x0, self.y0, self.x1, self.y1)
+
+    def segment(self, index: int) -> Segment:
+        return Segment(Node(self.x0[index], self.y0[index]), Node(self.x1[index], self.y1[index]))
+
+    def to_segments(self) -> list[Segment]:
+        return [Segment(Node(x0, y0), Node(x1, y1)) for x0, y0, x1, y1 in self]
+
+    def __repr__(self) -> str:
+        return f"SegmentStore: {len(self)} segments"
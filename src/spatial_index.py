@@ -0,0 +1,325 @@
+import heapq
+import math
+import numpy as np
+from typing import Iterable, Iterator, Optional, Tuple, Union
+from command import Command
+from commands_processor import CommandsProcessor
+from intersection_checker import intersect_coordinates
+from segment import Segment, SegmentStore
+
+NODE_CAPACITY = 16 # Children of every node of the R-tree
+APPEND_BUFFER = 64 # Appended segments scanned one by one before they are packed into a tree
+
+class PackedTree:
+    """
+    Static R-tree over a contiguous range of segments, bulk-loaded with Sort-Tile-Recursive packing.
+
+    Every level is stored as arrays in packing order, so the children of a node are a
+    contiguous range of the level below: levels[0] holds the segments themselves, each higher
+    level the bounding boxes of groups of up to NODE_CAPACITY entries of the one below it.
+    """
+    __slots__ = ('start', 'stop', 'labels', 'levels')
+    start: int # First segment of the range
+    stop: int # One past its last segment
+    labels: np.ndarray # Segment index of every entry of levels[0]
+    levels: list[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]] # minX, minY, maxX, maxY, first child (None for segments)
+
+    def __init__(self, store: SegmentStore, start: int, stop: int):
+        self.start = start
+        self.stop = stop
+        x0, y0 = np.frombuffer(store.x0, dtype=store.typecode)[start:stop], np.frombuffer(store.y0, dtype=store.typecode)[start:stop]
+        x1, y1 = np.frombuffer(store.x1, dtype=store.typecode)[start:stop], np.frombuffer(store.y1, dtype=store.typecode)[start:stop]
+        boxes = (np.minimum(x0, x1), np.minimum(y0, y1), np.maximum(x0, x1), np.maximum(y0, y1))
+        del x0, y0, x1, y1 # The store cannot grow while its buffers are exported
+
+        order = _tile_order(boxes)
+        self.labels = order + start
+        self.levels = [tuple(box[order] for box in boxes) + (None,)]
+        while len(self.levels[-1][0]) > 1:
+            self.levels.append(self._pack(self.levels[-1]))
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def truncate(self, stop: int):
+        """
+        Drops the segments from index `stop` on. Their entries stay, with empty boxes, and the
+        boxes above them are recomputed, which is much cheaper than packing the rest again.
+        """
+        self.stop = stop
+        stale = self.labels >= stop
+        minX, minY, maxX, maxY, _ = self.levels[0]
+        empty = (np.inf, -np.inf) if minX.dtype.kind == 'f' else (np.iinfo(minX.dtype).max, np.iinfo(minX.dtype).min)
+        for low in (minX, minY):
+            low[stale] = empty[0]
+        for high in (maxX, maxY):
+            high[stale] = empty[1]
+        for level in range(1, len(self.levels)):
+            below, (minX, minY, maxX, maxY, children) = self.levels[level - 1], self.levels[level]
+            starts = children[:-1]
+            np.minimum.reduceat(below[0], starts, out=minX)
+            np.minimum.reduceat(below[1], starts, out=minY)
+            np.maximum.reduceat(below[2], starts, out=maxX)
+            np.maximum.reduceat(below[3], starts, out=maxY)
+
+    def _pack(self, level):
+        minX, minY, maxX, maxY, _ = level
+        count = len(minX)
+        # Tiling this level would reorder the children of the level below, so its nodes are
+        # grouped in the order they were tiled in, which keeps neighbouring tiles together
+        starts = np.arange(0, count, NODE_CAPACITY)
+        return (np.minimum.reduceat(minX, starts), np.minimum.reduceat(minY, starts),
+                np.maximum.reduceat(maxX, starts), np.maximum.reduceat(maxY, starts), np.append(starts, count))
+
+
+def _tile_order(boxes: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]) -> np.ndarray:
+    # Sort-Tile-Recursive: vertical slabs of whole tiles by center x, tiles by center y within a slab
+    count = len(boxes[0])
+    centerX, centerY = (boxes[0] + boxes[2]) / 2, (boxes[1] + boxes[3]) / 2
+    tiles = math.ceil(count / NODE_CAPACITY)
+    slabSize = math.ceil(tiles / max(1, math.ceil(math.sqrt(tiles)))) * NODE_CAPACITY
+    byX = np.argsort(centerX, kind='stable')
+    slabs = np.arange(count) // slabSize
+    return byX[np.lexsort((centerY[byX], slabs))]
+
+
+class SegmentIndex:
+    """
+    Spatial index over the segments of a path, for many queries against one large path.
+
+    The segments are bulk-loaded into an STR-packed R-tree (see PackedTree). Appended segments
+    are scanned one by one until APPEND_BUFFER of them are packed into a tree of their own,
+    and trees of similar size are merged like the digits of a binary counter, so appending
+    costs O(log n) amortized and a query visits O(log n) trees. Crossings are decided by the
+    same predicate as the intersection engines, so touching the end of the last segment does
+    not count, exactly like in the path itself.
+    """
+    store: SegmentStore
+
+    def __init__(self, segments: Union[list[Segment], SegmentStore, None] = None):
+        self.store = SegmentStore.of(segments) if segments is not None else SegmentStore()
+        self._trees: list[PackedTree] = [PackedTree(self.store, 0, len(self.store))] if len(self.store) else []
+        self._indexed = len(self.store)
+
+    @classmethod
+    def from_commands(cls, commands: Iterable[Command], processor: Optional[CommandsProcessor] = None) -> 'SegmentIndex':
+        processor = processor or CommandsProcessor()
+        return cls(SegmentStore.from_segments(processor.processCommands(commands)))
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def append(self, segment: Segment) -> int:
+        """
+        Adds a segment to the path.
+
+        Returns:
+            int: Its index.
+        """
+        self.store.append(segment.start.x, segment.start.y, segment.end.x, segment.end.y)
+        if len(self.store) - self._indexed >= APPEND_BUFFER:
+            self._pack()
+        return len(self.store) - 1
+
+    def extend(self, x0: np.ndarray, y0: np.ndarray, x1: np.ndarray, y1: np.ndarray):
+        """
+        Adds many segments at once, e.g. the arrays of CommandsProcessor.processArrays.
+        """
+        for target, source in zip((self.store.x0, self.store.y0, self.store.x1, self.store.y1), (x0, y0, x1, y1)):
+            target.frombytes(np.ascontiguousarray(source, dtype=self.store.typecode).tobytes())
+        if len(self.store) - self._indexed >= APPEND_BUFFER:
+            self._pack()
+
+    def truncate(self, length: int):
+        """
+        Removes all segments from index `length` on, so that the path can continue differently.
+
+        A tree reaching past the end is not packed again, see PackedTree.truncate, until it is
+        merged with the trees appended after it.
+        """
+        if length >= len(self.store):
+            return
+        for coordinates in (self.store.x0, self.store.y0, self.store.x1, self.store.y1):
+            del coordinates[length:]
+        self._trees = [packed for packed in self._trees if packed.start < length]
+        if self._trees and self._trees[-1].stop > length:
+            self._trees[-1].truncate(length)
+        self._indexed = min(self._indexed, length)
+
+    def _pack(self):
+        # Packs the appended segments into a tree and merges the trees that are no longer
+        # at least twice as large as the next one
+        self._trees.append(PackedTree(self.store, self._indexed, len(self.store)))
+        self._indexed = len(self.store)
+        while len(self._trees) >= 2 and len(self._trees[-2]) < 2 * len(self._trees[-1]):
+            last = self._trees.pop()
+            self._trees[-1] = PackedTree(self.store, self._trees[-1].start, last.stop)
+
+    def crosses(self, segment: Segment) -> bool:
+        """
+        Checks whether a segment intersects any segment of the path, see `intersect()`.
+        """
+        return next(self._crossings(segment), None) is not None
+
+    def crossings(self, segment: Segment) -> list[int]:
+        """
+        Returns:
+            list[int]: Indices of all segments of the path a segment intersects, in increasing order.
+        """
+        return sorted(self._crossings(segment))
+
+    def query_box(self, minX: float, minY: float, maxX: float, maxY: float) -> list[int]:
+        """
+        Returns:
+            list[int]: Indices of all segments with at least one point in the box (borders
+            included), in increasing order.
+        """
+        found = []
+        for label in self._candidates(minX, minY, maxX, maxY):
+            x0, y0, x1, y1 = self.store.coordinates(label)
+            if (minX <= x0 <= maxX and minY <= y0 <= maxY) or (minX <= x1 <= maxX and minY <= y1 <= maxY) \
+                    or any(intersect_coordinates(x0, y0, x1, y1, *side) for side in
+                           ((minX, minY, maxX, minY), (maxX, minY, maxX, maxY), (maxX, maxY, minX, maxY), (minX, maxY, minX, minY))):
+                found.append(label)
+        return sorted(found)
+
+    def nearest(self, x: float, y: float) -> Optional[Tuple[int, float]]:
+        """
+        Finds the segment nearest to a point, visiting nodes best first by the distance to their boxes.
+
+        Returns:
+            Optional[Tuple[int, float]]: Index of the nearest segment (the first one on ties) and its
+            distance, or None for an empty path.
+        """
+        best: Optional[Tuple[float, int]] = None
+        for label in range(self._indexed, len(self.store)):
+            distance = _distance(x, y, *self.store.coordinates(label))
+            if best is None or (distance, label) < best:
+                best = (distance, label)
+
+        # Entries of levels[0] are segments, a box distance never exceeds the distance to what it bounds
+        heap = [(0.0, tree, len(packed.levels) - 1, node) for tree, packed in enumerate(self._trees)
+                for node in range(len(packed.levels[-1][0]))]
+        heapq.heapify(heap)
+        while heap:
+            distance, tree, level, node = heapq.heappop(heap)
+            if best is not None and distance > best[0]:
+                break
+            packed = self._trees[tree]
+            if level == 0:
+                label = int(packed.labels[node])
+                if label >= packed.stop:
+                    continue
+                distance = _distance(x, y, *self.store.coordinates(label))
+                if best is None or (distance, label) < best:
+                    best = (distance, label)
+                continue
+            minX, minY, maxX, maxY, _ = packed.levels[level - 1]
+            first, last = packed.levels[level][4][node:node + 2].tolist()
+            distances = np.hypot(np.maximum(np.maximum(minX[first:last] - x, x - maxX[first:last]), 0),
+                                 np.maximum(np.maximum(minY[first:last] - y, y - maxY[first:last]), 0))
+            for child, distance in enumerate(distances.tolist(), start=first):
+                heapq.heappush(heap, (distance, tree, level - 1, child))
+        return None if best is None else (best[1], best[0])
+
+    def _crossings(self, segment: Segment) -> Iterator[int]:
+        x0, y0, x1, y1 = segment.start.x, segment.start.y, segment.end.x, segment.end.y
+        for label in self._candidates(min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)):
+            if intersect_coordinates(*self.store.coordinates(label), x0, y0, x1, y1):
+                yield label
+
+    def _candidates(self, minX: float, minY: float, maxX: float, maxY: float) -> Iterator[int]:
+        # Segments whose bounding box meets the box
+        for label in range(self._indexed, len(self.store)):
+            x0, y0, x1, y1 = self.store.coordinates(label)
+            if min(x0, x1) <= maxX and max(x0, x1) >= minX and min(y0, y1) <= maxY and max(y0, y1) >= minY:
+                yield label
+
+        for packed in self._trees:
+            stack = [len(packed.levels) - 1]
+            ranges = [(0, len(packed.levels[-1][0]))]
+            while stack:
+                level = stack.pop()
+                first, last = ranges.pop()
+                nodeMinX, nodeMinY, nodeMaxX, nodeMaxY, children = packed.levels[level]
+                hits = np.flatnonzero((nodeMinX[first:last] <= maxX) & (nodeMaxX[first:last] >= minX)
+                                      & (nodeMinY[first:last] <= maxY) & (nodeMaxY[first:last] >= minY)) + first
+                if level == 0:
+                    labels = packed.labels[hits]
+                    yield from labels[labels < packed.stop].tolist()
+                    continue
+                for node in hits.tolist():
+                    stack.append(level - 1)
+                    ranges.append((children[node], children[node + 1]))
+
+    def overlapping(self, minX: np.ndarray, minY: np.ndarray, maxX: np.ndarray, maxY: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Batched bounding box query, which descends every tree one level at a time for all boxes at once.
+
+        Args:
+            minX, minY, maxX, maxY (np.ndarray): The query boxes.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Every pair of a query box and a segment whose bounding box
+            meets it, as the index of the box and the index of the segment.
+        """
+        queries, labels = [], []
+        if len(self.store) > self._indexed:
+            query, pending = np.nonzero(self._meetsPending(minX, minY, maxX, maxY))
+            queries.append(query)
+            labels.append(pending + self._indexed)
+        for packed in self._trees:
+            query, node = self._descend(packed, 0, minX, minY, maxX, maxY)
+            label = packed.labels[node]
+            live = label < packed.stop
+            queries.append(query[live])
+            labels.append(label[live])
+
+        if not queries:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return np.concatenate(queries), np.concatenate(labels)
+
+    def near(self, minX: np.ndarray, minY: np.ndarray, maxX: np.ndarray, maxY: np.ndarray) -> np.ndarray:
+        """
+        Coarse variant of overlapping for large query boxes, which stops at the boxes of the
+        lowest nodes instead of the segments, so its cost does not grow with the segments a box covers.
+
+        Returns:
+            np.ndarray: For every query box, whether it may meet the bounding box of a segment.
+        """
+        near = np.zeros(len(minX), dtype=bool)
+        if len(self.store) > self._indexed:
+            near |= self._meetsPending(minX, minY, maxX, maxY).any(axis=1)
+        for packed in self._trees:
+            query, _ = self._descend(packed, min(1, len(packed.levels) - 1), minX, minY, maxX, maxY)
+            near[query] = True
+        return near
+
+    def _meetsPending(self, minX, minY, maxX, maxY) -> np.ndarray:
+        x0, y0, x1, y1 = (np.array(coordinates[self._indexed:]) for coordinates in (self.store.x0, self.store.y0, self.store.x1, self.store.y1))
+        return (minX[:, None] <= np.maximum(x0, x1)) & (maxX[:, None] >= np.minimum(x0, x1)) \
+            & (minY[:, None] <= np.maximum(y0, y1)) & (maxY[:, None] >= np.minimum(y0, y1))
+
+    def _descend(self, packed: PackedTree, lowest: int, minX, minY, maxX, maxY) -> Tuple[np.ndarray, np.ndarray]:
+        # Pairs of a query box and an entry of levels[lowest] whose boxes meet
+        level = len(packed.levels) - 1
+        query = np.arange(len(minX))
+        node = np.zeros(len(minX), dtype=np.int64)
+        while True:
+            nodeMinX, nodeMinY, nodeMaxX, nodeMaxY, children = packed.levels[level]
+            meets = (nodeMinX[node] <= maxX[query]) & (nodeMaxX[node] >= minX[query]) \
+                & (nodeMinY[node] <= maxY[query]) & (nodeMaxY[node] >= minY[query])
+            query, node = query[meets], node[meets]
+            if level == lowest or not len(query):
+                return query, node
+            first, counts = children[node], children[node + 1] - children[node]
+            offsets = np.cumsum(counts) - counts
+            query = np.repeat(query, counts)
+            node = np.arange(len(query)) - np.repeat(offsets - first, counts)
+            level -= 1
+
+def _distance(x: float, y: float, x0: float, y0: float, x1: float, y1: float) -> float:
+    dx, dy = x1 - x0, y1 - y0
+    length = dx * dx + dy * dy
+    t = 0.0 if length == 0 else max(0.0, min(1.0, ((x - x0) * dx + (y - y0) * dy) / length))
+    return math.hypot(x - (x0 + t * dx), y - (y0 + t * dy))
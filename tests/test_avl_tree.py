@@ -0,0 +1,91 @@
+import bisect
+import random
+from newAvlTree import SweepStatus, StatusNode
+
+
+def check_invariants(status: SweepStatus) -> int:
+    # Parent links, heights, balance factors and size of the whole tree, returns its height
+    def check(node: StatusNode, parent: StatusNode) -> tuple[int, int]:
+        if node is None:
+            return 0, 0
+        assert node.parent is parent
+        leftHeight, leftSize = check(node.left, node)
+        rightHeight, rightSize = check(node.right, node)
+        assert abs(leftHeight - rightHeight) <= 1
+        assert node.height == 1 + max(leftHeight, rightHeight)
+        return node.height, leftSize + rightSize + 1
+
+    height, size = check(status.root, None)
+    assert size == len(status)
+    values = list(status)
+    assert values == sorted(values)
+    return height
+
+
+def test_random_inserts_and_deletes_keep_the_invariants():
+    rng = random.Random(0)
+    for _ in range(30):
+        status, values, nodes = SweepStatus(), [], {}
+        for _ in range(300):
+            if values and rng.random() < 0.4:
+                value = rng.choice(values)
+                values.remove(value)
+                if rng.random() < 0.5:
+                    nodes[value].remove(status.find(value))
+                    assert status.delete(value)
+                else:
+                    # Nodes are kept valid by the removal of other values
+                    node = nodes[value].pop()
+                    assert node.val == value
+                    status.remove(node)
+                    assert node.parent is node.left is node.right is None
+            else:
+                value = rng.randint(0, 60)
+                node = status.insert(value)
+                assert node.val == value
+                nodes.setdefault(value, []).append(node)
+                bisect.insort(values, value)
+
+            height = check_invariants(status)
+            assert list(status) == values
+            assert status.height == height
+            # An AVL tree of n nodes is at most about 1.44 log2(n) high
+            assert height <= 1.45 * len(values).bit_length() + 1
+        assert not status.delete(-1)
+
+
+def test_neighbours_match_the_sorted_values():
+    rng = random.Random(1)
+    status = SweepStatus()
+    values = rng.sample(range(0, 2000, 2), 400)
+    for value in values:
+        status.insert(value)
+    values.sort()
+    check_invariants(status)
+
+    for value in range(-3, 2003):
+        below = values[:bisect.bisect_left(values, value)]
+        above = values[bisect.bisect_right(values, value):]
+        assert status.predecessor(value) == (below[-1] if below else None)
+        assert status.successor(value) == (above[0] if above else None)
+
+    node, walked = status.first(), []
+    while node is not None:
+        walked.append(node.val)
+        node = status.next(node)
+    assert walked == values
+    node, walked = status.last(), []
+    while node is not None:
+        walked.append(node.val)
+        node = status.previous(node)
+    assert walked == values[::-1]
+
+
+def test_equal_values_are_inserted_after_each_other():
+    status = SweepStatus()
+    # Lists compare by value, while their nodes tell the equal ones apart
+    nodes = [status.insert(value) for value in ([0.0], [1.0], [2.0], [1.0], [1.0])]
+    assert status.next(nodes[1]) is nodes[3]
+    assert status.next(nodes[3]) is nodes[4]
+    assert status.previous(nodes[2]) is nodes[4]
+    assert status.rotations > 0
@@ -0,0 +1,105 @@
+import logging
+import random
+import numpy as np
+import pytest
+import binary_format
+from binary_format import HEADER, MAGIC, RECORD, VERSION
+from command import Command, CommandType
+from input_parser import InputParser
+
+
+def random_commands(rng: random.Random, length: int) -> list[Command]:
+    commands = []
+    for _ in range(length):
+        command_type = rng.choice(list(CommandType))
+        if command_type in (CommandType.PEN_DOWN, CommandType.PEN_UP):
+            commands.append(Command(command_type))
+        else:
+            commands.append(Command(command_type, rng.choice([0, 1, 359, -7, rng.randint(-10 ** 6, 10 ** 6), binary_format.INT32_MIN, binary_format.INT32_MAX])))
+    return commands
+
+
+def concatenated(batches) -> tuple[list, list]:
+    batches = list(batches)
+    return [opcode for opcodes, _ in batches for opcode in opcodes.tolist()], [value for _, values in batches for value in values.tolist()]
+
+
+def test_commands_are_written_and_read_back_losslessly(tmp_path):
+    rng = random.Random(0)
+    for length in (0, 1, 1000, 70000):
+        commands = random_commands(rng, length)
+        filename = tmp_path / f"program{length}.bin"
+        binary_format.write_commands(commands, filename, batch_size=4096)
+
+        assert binary_format.is_binary(filename)
+        assert [(command_type, value) for command_type, value in binary_format.iter_parsed(filename)] == \
+            [(command.command_type, command.value) for command in commands]
+        binary_format.binary_to_text(filename, tmp_path / "program.txt")
+        assert [(command.command_type, command.value) for command in InputParser.parse_file(tmp_path / "program.txt")] == \
+            [(command.command_type, command.value) for command in commands]
+
+
+def test_header_fields(tmp_path):
+    commands = random_commands(random.Random(1), 123)
+    filename = tmp_path / "program.bin"
+    binary_format.write_commands(commands, filename, batch_size=50)
+    data = filename.read_bytes()
+    assert HEADER.unpack_from(data) == (MAGIC, VERSION, 0, 123)
+    assert len(data) == HEADER.size + 123 * RECORD.itemsize == HEADER.size + 123 * 5
+
+
+def test_values_out_of_the_int32_range_are_rejected(tmp_path):
+    with pytest.raises(ValueError, match="int32"):
+        binary_format.write_commands([Command('fd', binary_format.INT32_MAX + 1)], tmp_path / "program.bin")
+
+
+def test_bad_files_raise_clear_errors(tmp_path, caplog):
+    filename = tmp_path / "program.bin"
+    binary_format.write_commands(random_commands(random.Random(2), 100), filename)
+    data = bytearray(filename.read_bytes())
+
+    def written(name: str, content: bytes):
+        path = tmp_path / name
+        path.write_bytes(content)
+        return path
+
+    badMagic = written("magic.bin", b'TRTX' + data[4:])
+    with pytest.raises(ValueError, match="not a binary command file"):
+        binary_format.read_arrays(badMagic)
+    badVersion = written("version.bin", HEADER.pack(MAGIC, VERSION + 1, 0, 100) + data[HEADER.size:])
+    with pytest.raises(ValueError, match=f"version {VERSION + 1}"):
+        binary_format.read_arrays(badVersion)
+    with pytest.raises(ValueError, match="should hold 100 commands"):
+        binary_format.read_arrays(written("truncated.bin", data[:-1]))
+    with pytest.raises(ValueError, match="too short"):
+        binary_format.read_arrays(written("short.bin", MAGIC))
+
+    # The opcode of the 90th command
+    data[HEADER.size + 89 * RECORD.itemsize] = 200
+    unknown = written("opcode.bin", bytes(data))
+    with pytest.raises(ValueError, match="Unknown opcode 200"):
+        binary_format.read_arrays(unknown)
+    batches = binary_format.iter_arrays(unknown, batch_size=50)
+    assert len(next(batches)[0]) == 50
+    with pytest.raises(ValueError, match="Unknown opcode 200"):
+        next(batches)
+    # The parser reports it like a bad line instead
+    with caplog.at_level(logging.ERROR):
+        assert len(concatenated(InputParser.iter_command_arrays(unknown, batch_size=50))[0]) == 50
+    assert "Unknown opcode 200" in caplog.text
+
+
+def test_mapped_arrays_match_the_text_version(tmp_path):
+    rng = random.Random(3)
+    for length in (0, 10, 5000):
+        commands = random_commands(rng, length)
+        text = tmp_path / f"program{length}.txt"
+        binary = tmp_path / f"program{length}.bin"
+        InputParser.write_commands_to_file(commands, text)
+        binary_format.text_to_binary(text, binary)
+
+        expected = concatenated(InputParser.iter_command_arrays(text))
+        opcodes, values = binary_format.read_arrays(binary)
+        assert opcodes.dtype == np.uint8 and (opcodes.tolist(), values.tolist()) == expected
+        assert concatenated(binary_format.iter_arrays(binary, batch_size=999)) == expected
+        assert concatenated(InputParser.iter_command_arrays(binary, batch_size=999)) == expected
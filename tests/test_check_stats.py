@@ -0,0 +1,57 @@
+from check_stats import CheckStats
+from intersection_checker import AnyIntersections, first_intersection, grid_first_intersection, orthogonal_first_intersection
+from segment import SegmentStore
+
+
+def store_of(*segments) -> SegmentStore:
+    store = SegmentStore()
+    for segment in segments:
+        store.append(*segment)
+    return store
+
+
+def counters(stats: CheckStats) -> dict:
+    return {name: value for name, value in stats.as_dict().items() if name != 'phases_ms'}
+
+
+def test_sweep_counters_of_a_staircase():
+    # Three stacked horizontal segments, each starting and ending one unit right of the one below:
+    # inserting the second one compares it with the first, the third with both and rotates the
+    # status left, and both are tested against the edge below them. The ends test nothing, as
+    # the ending edge is always the lowest one.
+    store = store_of((0, 0, 10, 0), (1, 1, 11, 1), (2, 2, 12, 2))
+    stats = CheckStats()
+    assert first_intersection(store, stats) is None
+    assert counters(stats) == {'comparisons': 3, 'rotations': 1, 'max_height': 2, 'intersect_calls': 2, 'events': 6}
+    assert set(stats.phases) == {'sort', 'sweep'}
+
+
+def test_sweep_counters_stop_at_the_first_crossing():
+    store = store_of((0, 0, 2, 2), (0, 2, 2, 0))
+    stats = CheckStats()
+    assert first_intersection(store, stats) == (0, 1)
+    assert counters(stats) == {'comparisons': 1, 'rotations': 0, 'max_height': 2, 'intersect_calls': 1, 'events': 2}
+
+
+def test_other_engines_fill_in_what_applies_to_them():
+    stats = CheckStats()
+    assert grid_first_intersection(store_of((0, 0, 2, 2), (0, 2, 2, 0)), stats=stats) == (0, 1)
+    assert counters(stats) == {'comparisons': 0, 'rotations': 0, 'max_height': 0, 'intersect_calls': 1, 'events': 0}
+
+    # The horizontal segment starts, then the vertical one is queried and crosses it
+    stats = CheckStats()
+    assert orthogonal_first_intersection(store_of((0, 0, 10, 0), (5, -1, 5, 1)), stats) == (0, 1)
+    assert counters(stats) == {'comparisons': 0, 'rotations': 0, 'max_height': 0, 'intersect_calls': 0, 'events': 2}
+
+
+def test_stats_do_not_change_the_result_and_add_up():
+    store = store_of((0, 0, 10, 0), (1, 1, 11, 1), (2, 2, 12, 2), (5, -1, 5, 5))
+    total = CheckStats()
+    for engine in AnyIntersections.ENGINES:
+        stats = CheckStats()
+        assert AnyIntersections.find(store, engine, stats)[0] == AnyIntersections.find(store, engine)[0]
+        before = counters(total)
+        total.merge(stats)
+        assert total.comparisons == before['comparisons'] + stats.comparisons
+        assert total.maxHeight == max(before['max_height'], stats.maxHeight)
+        assert total.events == before['events'] + stats.events
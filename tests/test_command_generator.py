@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from commandGenerator import CROSSING, MODES, iter_generated
+from commands_processor import CommandsProcessor
+from intersection_checker import AnyIntersections
+from segment import SegmentStore
+
+
+def generated(length: int, mode: str, seed: int, chunk_size: int) -> tuple[np.ndarray, np.ndarray]:
+    chunks = list(iter_generated(length, mode, seed, chunk_size))
+    assert all(len(opcodes) == len(values) for opcodes, values in chunks)
+    return (np.concatenate([opcodes for opcodes, _ in chunks]) if chunks else np.empty(0, dtype=np.uint8),
+            np.concatenate([values for _, values in chunks]) if chunks else np.empty(0, dtype=np.int64))
+
+
+def witness(length: int, mode: str, seed: int, chunk_size: int = 64):
+    processor = CommandsProcessor(fixedPoint=True)
+    batches = list(processor.processArrayChunks(iter_generated(length, mode, seed, chunk_size)))
+    store = SegmentStore.from_arrays(*(np.concatenate([batch[axis] for batch in batches]) for axis in range(4)))
+    return AnyIntersections.find(store, 'auto')[0]
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_the_path_does_not_depend_on_the_chunk_size(mode):
+    for seed in range(5):
+        opcodes, values = generated(1001, mode, seed, 1 << 20)
+        assert len(opcodes) == 1001
+        for chunk_size in (1, 2, 7, 64, 1000):
+            chunked = generated(1001, mode, seed, chunk_size)
+            assert np.array_equal(chunked[0], opcodes) and np.array_equal(chunked[1], values)
+
+
+def test_the_same_seed_gives_the_same_path():
+    for mode in MODES:
+        first, second = generated(500, mode, 7, 100), generated(500, mode, 7, 100)
+        assert np.array_equal(first[1], second[1])
+        assert not np.array_equal(first[1], generated(500, mode, 8, 100)[1])
+
+
+def test_simple_paths_never_intersect():
+    for seed in range(20):
+        for length in (1, 2, 3, 50, 777, 3000):
+            assert witness(length, 'simple', seed) is None
+
+
+def test_intersecting_paths_always_intersect():
+    for seed in range(20):
+        for length in (len(CROSSING), len(CROSSING) + 1, 50, 777, 3000):
+            assert witness(length, 'intersecting', seed) is not None
+
+
+def test_unknown_modes_are_rejected():
+    with pytest.raises(ValueError, match="Unknown generator mode"):
+        next(iter_generated(10, 'spiral'))
@@ -0,0 +1,72 @@
+import math
+import random
+import numpy as np
+from command import Command, OPCODES
+from commands_processor import SCALE, TIE_MARGIN, CommandsProcessor
+
+
+def near_ties(margin: float) -> list:
+    # (heading, distance) pairs whose step is within margin of a rounding tie in 10^-DECIMALS units
+    return [(angle, distance) for angle in range(360) for distance in range(1, 1200)
+            if abs(abs(distance * math.sin(math.radians(angle)) * SCALE) % 1 - 0.5) < margin]
+
+
+TIES = near_ties(1e-6) # e.g. heading 26, distance 1090: 4778245.500000943 units
+NEAR_TIES = near_ties(TIE_MARGIN)
+# Steps exactly halfway between two units, e.g. 181008 * sin(327) = -98584.02245
+EXACT_TIES = [(117, 101185), (309, 54277), (315, 117214), (327, 181008), (338, 176881)]
+
+
+def random_program(rng: random.Random, length: int) -> list[Command]:
+    commands, heading = [], 0
+    for _ in range(length):
+        kind = rng.random()
+        if kind < 0.15:
+            # Turn to a heading whose next step lands on or near a rounding tie
+            angle, distance = rng.choice(EXACT_TIES if kind < 0.03 else TIES if kind < 0.06 else NEAR_TIES)
+            commands.append(Command('rt', (angle - heading) % 360))
+            commands.append(Command(rng.choice(['fd', 'bk']), distance))
+            heading = angle
+        elif kind < 0.55:
+            commands.append(Command(rng.choice(['fd', 'bk']), rng.randint(0, 500)))
+        elif kind < 0.9:
+            turn = rng.randint(0, 359)
+            commands.append(Command('rt', turn) if rng.random() < 0.5 else Command('lt', (-turn) % 360))
+            heading = (heading + turn) % 360
+        else:
+            commands.append(Command(rng.choice(['pu', 'pd'])))
+    return commands
+
+
+def as_tuples(segments) -> list:
+    return [(segment.start.x, segment.start.y, segment.end.x, segment.end.y) for segment in segments]
+
+
+def test_exact_ties():
+    for angle, distance in EXACT_TIES:
+        assert abs(distance * math.sin(math.radians(angle)) * SCALE) % 1 == 0.5
+
+
+def test_batch_matches_per_command_processing():
+    assert TIES
+    rng = random.Random(0)
+    for fixedPoint in (False, True):
+        processor = CommandsProcessor(fixedPoint)
+        for _ in range(50):
+            commands = random_program(rng, rng.randint(0, 300))
+            assert as_tuples(processor.processCommandsBatch(commands, asSegments=True)) == as_tuples(processor.processCommands(commands))
+
+
+def test_chunks_match_per_command_processing():
+    rng = random.Random(1)
+    for fixedPoint in (False, True):
+        processor = CommandsProcessor(fixedPoint)
+        for _ in range(30):
+            commands = random_program(rng, 400)
+            opcodes = np.array([OPCODES[command.command_type] for command in commands], dtype=np.uint8)
+            values = np.array([command.value or 0 for command in commands], dtype=np.int64)
+            cuts = sorted(rng.sample(range(len(commands)), 5))
+            chunks = [(opcodes[start:stop], values[start:stop]) for start, stop in zip([0] + cuts, cuts + [len(commands)])]
+            batches = list(processor.processArrayChunks(chunks))
+            coordinates = [np.concatenate([batch[axis] for batch in batches]) for axis in range(4)]
+            assert as_tuples(CommandsProcessor.toSegments(coordinates)) == as_tuples(processor.processCommands(commands))
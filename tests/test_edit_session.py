@@ -0,0 +1,35 @@
+import random
+from command import Command
+from edit_session import EditSession
+from intersection_checker import AnyIntersections, intersect_stored
+
+
+def random_command(rng: random.Random) -> Command:
+    kind = rng.random()
+    if kind < 0.5:
+        return Command(rng.choice(['fd', 'bk']), rng.randint(1, 30))
+    if kind < 0.9:
+        # Mostly quarter turns, which keep the suffix of an edit, sometimes any other turn
+        return Command(rng.choice(['rt', 'lt']), rng.choice([90, 90, 90, 180, 45, 30]))
+    return Command(rng.choice(['pu', 'pd']))
+
+
+def test_edits_match_a_full_check_in_fixed_point_mode():
+    rng = random.Random(0)
+    modes = set()
+    for _ in range(40):
+        session = EditSession([random_command(rng) for _ in range(rng.randint(0, 60))], fixedPoint=True)
+        for _ in range(30):
+            start = rng.randint(0, len(session))
+            stop = min(len(session), start + rng.choice([0, 1, 1, 2, 5]))
+            result, _, mode = session.edit(start, stop, [random_command(rng) for _ in range(rng.choice([0, 1, 1, 2, 3]))])
+            modes.add(mode)
+
+            segments = session.segments()
+            expected = AnyIntersections.find(segments, 'sweep')[0]
+            assert result == (expected is not None)
+            assert result == (session.witness is not None)
+            if session.witness is not None:
+                assert session.witness[0] < session.witness[1]
+                assert intersect_stored(segments, *session.witness)
+    assert modes == {'incremental', 'full'}
@@ -0,0 +1,103 @@
+import random
+import numpy as np
+import pytest
+import binary_format
+import external_sweep
+import intersection_checker
+import main
+from command import Command
+from commands_processor import CommandsProcessor
+from external_sweep import ExternalSweep
+from input_parser import InputParser
+from intersection_checker import first_intersection
+from segment import SegmentStore
+
+
+def random_program(rng: random.Random) -> list[Command]:
+    # Either a spiral with growing sides, which never crosses itself, or a random walk, which mostly does
+    commands = []
+    spiral = rng.random() < 0.4
+    turn = rng.choice([60, 72, 90, 45])
+    for side in range(1, rng.randint(2, 60)):
+        if spiral:
+            commands += [Command('fd', 2 * side), Command('rt', turn)]
+        else:
+            commands += [Command(rng.choice(['fd', 'bk']), rng.randint(1, 20)), Command(rng.choice(['rt', 'lt']), rng.randint(0, 359))]
+    return commands
+
+
+@pytest.fixture
+def plain_sweep(monkeypatch):
+    # Without the retrace pass ahead of first_intersection both sweeps report the same witness
+    monkeypatch.setattr(intersection_checker, 'RETRACE_MIN_SEGMENTS', 1 << 62)
+    monkeypatch.setattr(external_sweep, 'READ_EVENTS', 5)
+
+
+def test_external_sweep_matches_first_intersection(tmp_path, plain_sweep):
+    rng = random.Random(0)
+    found = {True: 0, False: 0}
+    runs = 0
+    for program in range(200):
+        fixedPoint = program % 2 == 0
+        coordinates = CommandsProcessor(fixedPoint).processCommandsBatch(random_program(rng))
+        expected = first_intersection(SegmentStore.from_arrays(*coordinates))
+        found[expected is not None] += 1
+
+        runEvents = rng.choice([4, 7, 16])
+        with ExternalSweep(str(tmp_path), runEvents=runEvents) as sweep:
+            # Batches of any size, each split over the runs
+            start = 0
+            while start < len(coordinates[0]):
+                stop = start + rng.randint(1, 20)
+                sweep.add(*(array[start:stop] for array in coordinates))
+                start = stop
+            assert len(sweep) == len(coordinates[0])
+            witness, _, engine = sweep.find()
+            # Two events per segment, merged from several runs on all but the shortest paths
+            assert len(sweep._runs) == -(-2 * len(sweep) // runEvents)
+            runs = max(runs, len(sweep._runs))
+        assert engine == 'external'
+        assert witness == expected
+    assert found[True] > 20 and found[False] > 20 and runs > 10
+
+
+def test_external_sweep_from_text_and_binary_files(tmp_path, plain_sweep):
+    rng = random.Random(1)
+    for index in range(20):
+        commands = random_program(rng)
+        text, binary = tmp_path / f"program{index}.txt", tmp_path / f"program{index}.bin"
+        InputParser.write_commands_to_file(commands, text)
+        binary_format.write_commands(commands, binary)
+        for fixedPoint in (False, True):
+            expected = first_intersection(CommandsProcessor(fixedPoint).processCommands(commands))
+            for filename in (text, binary):
+                with ExternalSweep.from_file(str(filename), fixedPoint, str(tmp_path), runEvents=8) as sweep:
+                    assert sweep.find()[0] == expected
+
+
+def test_files_are_deleted_on_close(tmp_path):
+    sweep = ExternalSweep(str(tmp_path), runEvents=2)
+    sweep.add(np.array([0.0, 1.0]), np.array([0.0, 0.0]), np.array([1.0, 2.0]), np.array([0.0, 1.0]))
+    assert sweep.check()[0] is False
+    sweep.close()
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.parametrize('option', [['--batch'], ['--engine', 'sweep'], ['--optimize'], ['--cache', 'cache']])
+def test_options_the_external_sweep_ignores_are_rejected(tmp_path, monkeypatch, capsys, option):
+    path = tmp_path / "program.txt"
+    path.write_text("fd 10\nrt 90\nfd 10\n")
+    monkeypatch.setattr('sys.argv', ['main.py', str(path), '--external', str(tmp_path), *option])
+    with pytest.raises(SystemExit) as exit:
+        main.main()
+    assert exit.value.code == 2
+    assert f"--external cannot be combined with {option[0]}" in capsys.readouterr().err
+
+
+def test_external_option_checks_a_file(tmp_path, monkeypatch, capsys):
+    path = tmp_path / "program.txt"
+    path.write_text("fd 10\nrt 90\nfd 5\nrt 90\nfd 5\nrt 90\nfd 10\n")
+    monkeypatch.setattr('sys.argv', ['main.py', str(path), '--external', str(tmp_path), '--run-events', '4', '--engine', 'auto'])
+    main.main()
+    assert "Result: True" in capsys.readouterr().out
+    assert list(tmp_path.iterdir()) == [path]
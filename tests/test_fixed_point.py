@@ -0,0 +1,52 @@
+import glob
+import os
+import pytest
+from command import Command
+from commands_processor import SCALE, TRIG_SCALE, CommandsProcessor
+from input_parser import InputParser
+from intersection_checker import AnyIntersections
+from segment import SegmentStore
+
+DATA = sorted(glob.glob(os.path.join(os.path.dirname(__file__), '..', 'data', '*.txt')))
+ENGINES = ['sweep', 'grid', 'chains', 'slab']
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+@pytest.mark.parametrize('filename', DATA, ids=os.path.basename)
+def test_fixed_point_matches_float_mode_on_the_data_files(filename):
+    commands = InputParser.parse_file(filename)
+    floating = CommandsProcessor(fixedPoint=False).processCommands(commands)
+    fixed = CommandsProcessor(fixedPoint=True).processCommands(commands)
+    assert SegmentStore.from_segments(fixed).typecode == 'q'
+    for segment, exact in zip(floating, fixed):
+        # Both round every move, from sin/cos tables of different precision
+        assert abs(segment.end.x * SCALE - exact.end.x) <= 2 and abs(segment.end.y * SCALE - exact.end.y) <= 2
+
+    results = {(fixedPoint, engine): AnyIntersections.find(segments, engine)[0] is not None
+               for fixedPoint, segments in ((False, floating), (True, fixed)) for engine in ENGINES}
+    assert len(set(results.values())) == 1
+
+
+@pytest.mark.parametrize('base', [0, -2 ** 62, 2 ** 62, INT64_MIN, INT64_MAX - 3000000])
+def test_predicates_are_exact_across_the_coordinate_range(base):
+    # A segment of slope 1/3 and a vertical one ending a unit below it, on it or a unit past it.
+    # Near the ends of the int64 range a float64 cannot tell these apart.
+    for gap, crosses in ((-1, False), (0, True), (1, True)):
+        store = SegmentStore(typecode='q')
+        store.append(base, base, base + 3000000, base + 1000000)
+        store.append(base + 1500000, base, base + 1500000, base + 500000 + gap)
+        for engine in ENGINES:
+            assert (AnyIntersections.find(store, engine)[0] == (0, 1)) is crosses
+
+
+def test_fixed_point_is_exact_for_the_longest_moves():
+    # distance * TRIG_SCALE still fits in an int64, so the batch path agrees with the per-command one
+    distance = INT64_MAX // TRIG_SCALE
+    commands = [Command('fd', distance), Command('rt', 120), Command('fd', distance), Command('rt', 120), Command('fd', distance),
+                Command('rt', 7), Command('bk', distance), Command('lt', 91), Command('fd', 1)]
+    processor = CommandsProcessor(fixedPoint=True)
+    segments = [(s.start.x, s.start.y, s.end.x, s.end.y) for s in processor.processCommands(commands)]
+    assert segments == [(s.start.x, s.start.y, s.end.x, s.end.y) for s in processor.processCommandsBatch(commands, asSegments=True)]
+    assert segments[0][3] == distance * SCALE
+    # Opposite headings have opposite table entries and cos(120) is exactly -1/2, so the triangle closes
+    assert segments[2][2:] == (0, 0)
@@ -0,0 +1,57 @@
+import logging
+import random
+import numpy as np
+from command import OPCODES, CommandType, iter_expanded
+from input_parser import InputParser
+
+VALID = ['fd 12', 'bk 7', 'rt 90', 'lt 45', 'pu', 'pd', 'fd -3', 'rt +30', '  fd   5  ', 'bk 0']
+MALFORMED = ['fd', 'rt', '', '   ', 'fd 1 2', 'pu pd now', 'repeated']
+
+
+def random_file(rng: random.Random, tmp_path, name: str, lines: int, malformed: float, ending: str = '') -> str:
+    text = [rng.choice(MALFORMED) if rng.random() < malformed else rng.choice(VALID) for _ in range(lines)]
+    path = tmp_path / name
+    path.write_text('\n'.join(text + ([ending] if ending else [])) + '\n')
+    return str(path)
+
+
+def parsed(caplog, parse) -> tuple[list, list]:
+    caplog.clear()
+    with caplog.at_level(logging.WARNING):
+        commands = parse()
+    return commands, [(record.levelname, record.getMessage()) for record in caplog.records]
+
+
+def test_streams_match_parse_program(tmp_path, caplog):
+    rng = random.Random(0)
+    for index in range(40):
+        # Mostly valid files take the array path for their first chunks, the rest falls back
+        malformed = rng.choice([0, 0.01, 0.2])
+        ending = rng.choice(['', '', 'xx 5', 'fd many', 'repeat 2 [ fd 1 rt 90 ]'])
+        filename = random_file(rng, tmp_path, f"program{index}.txt", rng.randint(0, 300), malformed, ending)
+        chunk_size = rng.choice([16, 64, 1 << 20])
+
+        program, expected = parsed(caplog, lambda: [(command.command_type, command.value)
+                                                    for command in iter_expanded(InputParser.parse_program(filename, chunk_size))])
+        commands, messages = parsed(caplog, lambda: [(command.command_type, command.value)
+                                                     for command in InputParser.iter_commands(filename, chunk_size)])
+        assert commands == program and messages == expected
+
+        arrays, messages = parsed(caplog, lambda: list(InputParser.iter_command_arrays(filename, chunk_size, batch_size=32)))
+        assert messages == expected
+        opcodes = np.concatenate([batch[0] for batch in arrays]) if arrays else np.zeros(0, dtype=np.uint8)
+        values = np.concatenate([batch[1] for batch in arrays]) if arrays else np.zeros(0, dtype=np.int64)
+        assert opcodes.tolist() == [OPCODES[command_type] for command_type, _ in program]
+        assert values.tolist() == [value or 0 for _, value in program]
+
+
+def test_values_out_of_int64_range_are_skipped(tmp_path, caplog):
+    path = tmp_path / "large.txt"
+    path.write_text("fd 10\nfd 99999999999999999999\nrt -99999999999999999999\nrt 9223372036854775807\n")
+
+    with caplog.at_level(logging.WARNING):
+        arrays = list(InputParser.iter_command_arrays(str(path)))
+    assert [(opcodes.tolist(), values.tolist()) for opcodes, values in arrays] == \
+        [([OPCODES[CommandType.MOVE_FORWARD], OPCODES[CommandType.RIGHT_TURN]], [10, 9223372036854775807])]
+    assert [record.levelname for record in caplog.records] == ['WARNING', 'WARNING']
+    assert "99999999999999999999" in caplog.records[0].getMessage()
@@ -0,0 +1,195 @@
+import math
+import random
+from command import Command
+from commands_processor import CommandsProcessor
+from intersection_checker import RETRACE_MIN_SEGMENTS, AnyIntersections, all_intersections, chain_first_intersection, collinear_overlap, first_intersection, intersect, orientation, \
+    orthogonal_first_intersection, overlap
+from segment import Node, Segment, SegmentStore
+
+
+def random_program(rng: random.Random) -> list[Command]:
+    commands = []
+    for _ in range(rng.randint(5, 40)):
+        commands.append(Command('fd', rng.randint(1, 20)))
+        commands.append(Command(rng.choice(['rt', 'lt']), 45 * rng.randint(1, 4)))
+    return commands
+
+
+def brute_force_pairs(segments: list[Segment]) -> set:
+    return {(i, j) for i in range(len(segments)) for j in range(i + 1, len(segments)) if intersect(segments[i], segments[j])}
+
+
+def test_all_intersections_matches_brute_force_in_fixed_point_mode():
+    rng = random.Random(0)
+    for _ in range(300):
+        segments = CommandsProcessor(fixedPoint=True).processCommands(random_program(rng))
+        report = all_intersections(segments)
+        assert len(report.pairs) == len(set(report.pairs))
+        assert set(report.pairs) == brute_force_pairs(segments)
+
+
+def test_all_intersections_finds_endpoint_touching_in_float_mode():
+    # 10.6066 is on the first segment in decimal but not as a binary fraction
+    first = Segment(Node(4.2426, -16.2426), Node(11.3137, -23.3137))
+    second = Segment(Node(10.6066, -22.6066), Node(7.6066, -22.6066))
+    assert intersect(first, second)
+    assert all_intersections([first, second]).pairs == [(0, 1)]
+
+
+def collinear_overlapping(segments: list[Segment], first: int, second: int) -> bool:
+    a, b = segments[first], segments[second]
+    return orientation(b.start.x, b.start.y, a.start.x, a.start.y, a.end.x, a.end.y) == 0 \
+        and orientation(b.end.x, b.end.y, a.start.x, a.start.y, a.end.x, a.end.y) == 0 \
+        and overlap(a.start.x, a.start.y, a.end.x, a.end.y, b.start.x, b.start.y, b.end.x, b.end.y)
+
+
+def test_collinear_overlap_finds_retraces_in_fixed_point_mode():
+    rng = random.Random(1)
+    found = 0
+    for program in range(200):
+        # Half of the programs never turn back, so that they rarely retrace
+        moves, turns = (['fd', 'bk'], [45, 90, 90, 135, 180]) if program % 2 else (['fd'], [45, 90, 90, 135])
+        commands = []
+        for _ in range(rng.randint(RETRACE_MIN_SEGMENTS, 2 * RETRACE_MIN_SEGMENTS)):
+            commands.append(Command(rng.choice(moves), rng.randint(1, 20)))
+            commands.append(Command(rng.choice(['rt', 'lt']), rng.choice(turns)))
+        segments = CommandsProcessor(fixedPoint=True).processCommands(commands)
+        pairs = brute_force_pairs(segments)
+        witness = collinear_overlap(segments)
+        assert (witness is not None) == any(collinear_overlapping(segments, *pair) for pair in pairs)
+        if witness is not None:
+            found += 1
+            assert witness in pairs and collinear_overlapping(segments, *witness)
+            # The sweeps report the retrace found ahead of them
+            assert first_intersection(segments) == witness
+            assert chain_first_intersection(segments) == witness
+        else:
+            assert (first_intersection(segments) is None) == (not pairs)
+    assert 0 < found < 200
+
+
+def test_chain_first_intersection_matches_brute_force_in_fixed_point_mode():
+    rng = random.Random(2)
+    for _ in range(600):
+        # Sharp turns on a small lattice, so that the path keeps turning back in x and its
+        # monotone chains are short and meet at their ends
+        commands = []
+        for _ in range(rng.randint(2, 30)):
+            commands.append(Command(rng.choice(['fd', 'fd', 'bk']), rng.randint(1, 3)))
+            commands.append(Command(rng.choice(['rt', 'lt']), rng.choice([90, 135, 180, 45, 0])))
+        segments = CommandsProcessor(fixedPoint=True).processCommands(commands)
+        pairs = brute_force_pairs(segments)
+        witness = chain_first_intersection(segments)
+        assert (witness is None) == (not pairs)
+        assert witness is None or witness in pairs
+
+
+def petals(rng: random.Random, count: int, crossing: bool) -> list[Segment]:
+    # Triangles in separate sectors around the origin, drawn one after the other, so that the
+    # path keeps coming back to the origin and chains of both directions end or pass there.
+    # With crossing, the last vertex of a triangle reaches into the next sector.
+    angles = sorted(rng.uniform(0, 2 * math.pi) for _ in range(count))
+    gaps = [(angles[(i + 1) % count] - angles[i]) % (2 * math.pi) or 2 * math.pi for i in range(count)]
+    vertices = [(0, 0)]
+    for angle, gap in zip(angles, gaps):
+        for share in (0.1, 1.5 if crossing and gap < math.pi / 2 else 0.8):
+            radius = rng.randint(1000, 50000)
+            vertices.append((round(radius * math.cos(angle + share * min(gap, 3))), round(radius * math.sin(angle + share * min(gap, 3)))))
+        vertices.append((0, 0))
+    return [Segment(Node(*start), Node(*end)) for start, end in zip(vertices, vertices[1:])]
+
+
+def test_chain_first_intersection_with_chains_meeting_at_a_vertex():
+    rng = random.Random(3)
+    touching = 0
+    for program in range(300):
+        segments = petals(rng, rng.randint(2, 8), crossing=program % 2 == 1)
+        pairs = brute_force_pairs(segments)
+        witness = chain_first_intersection(segments)
+        assert (witness is None) == (not pairs)
+        assert witness is None or witness in pairs
+        touching += not pairs
+    assert touching > 100
+
+
+def orthogonal_program(rng: random.Random) -> list[Command]:
+    # Quarter turns only, with zero-length moves, retraces and pen-up jumps
+    commands = []
+    for _ in range(rng.randint(1, 40)):
+        kind = rng.random()
+        if kind < 0.6:
+            commands.append(Command(rng.choice(['fd', 'fd', 'bk']), rng.randint(0, 4)))
+        elif kind < 0.9:
+            commands.append(Command(rng.choice(['rt', 'lt']), rng.choice([90, 90, 180, 270, 0])))
+        else:
+            commands.append(Command(rng.choice(['pu', 'pd'])))
+    return commands
+
+
+def test_orthogonal_first_intersection_matches_brute_force_on_paths():
+    rng = random.Random(4)
+    for program in range(600):
+        fixedPoint = program % 2 == 0
+        segments = CommandsProcessor(fixedPoint).processCommands(orthogonal_program(rng))
+        pairs = brute_force_pairs(segments)
+        witness = orthogonal_first_intersection(segments)
+        assert (witness is None) == (not pairs)
+        assert witness is None or witness in pairs
+        if len(segments) >= 2:
+            assert AnyIntersections.select_engine(segments) == 'orthogonal'
+
+
+def test_orthogonal_first_intersection_matches_brute_force_on_touching_segments():
+    # Loose segments on a small grid: corners, end to end and T-junctions touch, collinear ones overlap
+    rng = random.Random(5)
+    touching = 0
+    for _ in range(1000):
+        segments = []
+        for _ in range(rng.randint(2, 6)):
+            x, y, length = rng.randint(0, 4), rng.randint(0, 4), rng.randint(0, 3)
+            end = Node(x + length, y) if rng.random() < 0.5 else Node(x, y + length)
+            segments.append(Segment(Node(x, y), end) if rng.random() < 0.5 else Segment(end, Node(x, y)))
+        pairs = brute_force_pairs(segments)
+        witness = orthogonal_first_intersection(segments)
+        assert (witness is None) == (not pairs)
+        assert witness is None or witness in pairs
+        ends = [{(s.start.x, s.start.y), (s.end.x, s.end.y)} for s in segments]
+        touching += not pairs and any(ends[i] & ends[j] for i in range(len(ends)) for j in range(i + 1, len(ends)))
+    assert touching > 50
+
+
+def test_orthogonal_first_intersection_cases():
+    def witness(*segments):
+        return orthogonal_first_intersection([Segment(Node(x0, y0), Node(x1, y1)) for x0, y0, x1, y1 in segments])
+
+    assert witness((0, 0, 2, 0), (2, 0, 2, 2)) is None # Corner
+    assert witness((0, 0, 2, 0), (2, 0, 5, 0)) is None # End to end on a line
+    assert witness((0, 0, 2, 0), (5, 0, 2, 0), (2, 0, 2, -3)) is None # Three ends at one point
+    assert witness((0, 0, 2, 0), (1, 0, 1, 2)) == (0, 1) # T-junction
+    assert witness((0, 0, 2, 0), (1, -1, 1, 1)) == (0, 1) # Crossing
+    assert witness((0, 0, 3, 0), (5, 0, 2, 0)) == (0, 1) # Overlap
+    assert witness((0, 0, 0, 3), (0, 1, 0, 2)) == (0, 1) # One inside the other
+    assert witness((0, 0, 2, 0), (1, 0, 1, 0)) is None # Zero length
+
+
+def test_select_engine_picks_orthogonal_only_for_orthogonal_paths():
+    rng = random.Random(6)
+    for _ in range(100):
+        commands = [command for command in orthogonal_program(rng) if command.command_type.value in ('fd', 'bk', 'rt', 'lt')]
+        commands += [Command('fd', 3)]
+        processor = CommandsProcessor(fixedPoint=True)
+        segments = processor.processCommands(commands)
+        batch = processor.processCommandsBatch(commands, asSegments=True)
+        assert [(s.start.x, s.start.y, s.end.x, s.end.y) for s in batch] == [(s.start.x, s.start.y, s.end.x, s.end.y) for s in segments]
+        if len(segments) >= 2:
+            assert AnyIntersections.select_engine(segments) == 'orthogonal'
+        # One diagonal move anywhere makes the path need another engine
+        position = rng.randint(0, len(commands))
+        bent = commands[:position] + [Command('rt', 45), Command('fd', 2), Command('lt', 45)] + commands[position:]
+        assert AnyIntersections.select_engine(processor.processCommands(bent)) != 'orthogonal'
+
+    assert CommandsProcessor.isOrthogonal([0, 90, 180, 270, 0])
+    assert CommandsProcessor.isOrthogonal([])
+    assert not CommandsProcessor.isOrthogonal([0, 90, 45])
+    assert AnyIntersections.select_engine(SegmentStore.from_arrays(*CommandsProcessor(True).processArrays(
+        [0, 2, 0], [5, 90, 5]))) == 'orthogonal'
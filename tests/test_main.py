@@ -0,0 +1,35 @@
+import main
+
+
+def test_figures_highlight_the_witness(tmp_path, monkeypatch):
+    drawn = []
+    monkeypatch.setattr(main, 'draw_edges', lambda segments, **options: drawn.append(options))
+    path = tmp_path / "crossing.txt"
+    # Up, right, down half way and back left across the first segment
+    path.write_text("fd 10\nrt 90\nfd 5\nrt 90\nfd 5\nrt 90\nfd 10\n")
+    repeated = tmp_path / "repeated.txt"
+    repeated.write_text("fd 10\nrt 90\nrepeat 2 [ fd 5 rt 90 ]\nfd 10\n")
+
+    for filename in (path, repeated):
+        # The second run with a cache takes the witness from the cached result
+        for options in ({}, {'optimize': True}, {'cache': str(tmp_path / "cache")}, {'cache': str(tmp_path / "cache")}):
+            drawn.clear()
+            line = main.check_file(str(filename), figures=str(tmp_path), **options)
+            assert 'error' not in line
+            assert tuple(line['witness']) == (0, 3)
+            assert tuple(drawn[0]['highlight']) == (0, 3)
+
+
+def test_single_file_drawing_highlights_the_witness(tmp_path, monkeypatch):
+    drawn = []
+    monkeypatch.setattr(main, 'draw_edges', lambda segments, **options: drawn.append(options))
+    path = tmp_path / "crossing.txt"
+    path.write_text("fd 10\nrt 90\nfd 5\nrt 90\nfd 5\nrt 90\nfd 10\n")
+    cache = str(tmp_path / "cache")
+
+    # The second run with a cache is a hit, drawn from the cached result
+    for arguments in ([], ['--optimize'], ['--cache', cache], ['--cache', cache], ['--optimize', '--cache', cache], ['--optimize', '--cache', cache]):
+        drawn.clear()
+        monkeypatch.setattr('sys.argv', ['main.py', str(path), '--output', str(tmp_path / "path.png"), *arguments])
+        main.main()
+        assert tuple(drawn[0]['highlight']) == (0, 3)
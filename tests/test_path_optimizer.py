@@ -0,0 +1,73 @@
+import random
+from command import Command, CommandType
+from commands_processor import CommandsProcessor
+from intersection_checker import AnyIntersections, intersect
+from path_optimizer import MOVE_COMMANDS, optimize_commands, optimize_path
+
+
+def random_program(rng: random.Random, length: int) -> list[Command]:
+    # Few headings and runs of moves, so that many moves are collinear and many can be joined
+    commands = []
+    for _ in range(length):
+        kind = rng.random()
+        if kind < 0.5:
+            commands.append(Command(rng.choice(['fd', 'fd', 'fd', 'bk']), rng.randint(0, 6)))
+        elif kind < 0.85:
+            commands.append(Command(rng.choice(['rt', 'lt']), rng.choice([0, 45, 90, 90, 180, 270, 360, 30])))
+        else:
+            commands.append(Command(rng.choice(['pu', 'pd'])))
+    return commands
+
+
+def drawn_moves(commands: list[Command]) -> list[int]:
+    # Index of the command behind every segment of processCommands
+    moves, penDown = [], True
+    for index, command in enumerate(commands):
+        if command.command_type in MOVE_COMMANDS and penDown:
+            moves.append(index)
+        elif command.command_type in (CommandType.PEN_DOWN, CommandType.PEN_UP):
+            penDown = command.command_type is CommandType.PEN_DOWN
+    return moves
+
+
+def test_optimized_commands_draw_the_same_path():
+    rng = random.Random(0)
+    processor = CommandsProcessor(fixedPoint=True)
+    for _ in range(200):
+        commands = random_program(rng, rng.randint(0, 60))
+        optimized = optimize_commands(commands)
+        assert len(optimized) <= len(commands)
+        positions = [(s.start.x, s.start.y, s.end.x, s.end.y) for s in processor.processCommands(commands)]
+        assert [(s.start.x, s.start.y, s.end.x, s.end.y) for s in processor.processCommands(optimized.commands)] == positions
+        for first, last in optimized.origins:
+            assert 0 <= first <= last < len(commands)
+
+
+def test_optimized_path_keeps_the_result_and_maps_witnesses_back():
+    rng = random.Random(1)
+    joined = crossing = 0
+    for fixedPoint in (False, True):
+        processor = CommandsProcessor(fixedPoint)
+        for _ in range(300):
+            commands = random_program(rng, rng.randint(0, 60))
+            original = processor.processCommands(commands)
+            path = optimize_path(commands, processor)
+            joined += len(path) < len(original)
+            witness = AnyIntersections.find(path.segments, 'sweep')[0]
+            assert (witness is None) == (AnyIntersections.find(original, 'sweep')[0] is None)
+            if witness is None:
+                continue
+            crossing += 1
+
+            # The original segments drawn by the commands behind each of the two segments
+            moves = drawn_moves(commands)
+            pieces = []
+            for segment in witness:
+                first, last = path.command_range(segment)
+                drawn = [i for i, move in enumerate(moves) if first <= move <= last]
+                assert drawn
+                assert (original[drawn[0]].start.x, original[drawn[0]].start.y) == (path.segments[segment].start.x, path.segments[segment].start.y)
+                assert (original[drawn[-1]].end.x, original[drawn[-1]].end.y) == (path.segments[segment].end.x, path.segments[segment].end.y)
+                pieces.append(drawn)
+            assert any(intersect(original[i], original[j]) for i in pieces[0] for j in pieces[1])
+    assert joined and crossing
@@ -0,0 +1,64 @@
+import logging
+import random
+import periodic_checker
+from command import Command, Repeat, iter_expanded
+from commands_processor import CommandsProcessor
+from input_parser import InputParser
+from intersection_checker import AnyIntersections, intersect_stored
+from periodic_checker import PeriodicPath
+from segment import SegmentStore
+
+
+def random_body(rng: random.Random, depth: int) -> list:
+    body = []
+    for _ in range(rng.randint(1, 4)):
+        kind = rng.random()
+        if kind < 0.2 and depth > 0:
+            body.append(Repeat(rng.randint(0, 12), random_body(rng, depth - 1)))
+        elif kind < 0.6:
+            body.append(Command(rng.choice(['fd', 'bk']), rng.randint(1, 9)))
+        elif kind < 0.95:
+            body.append(Command(rng.choice(['rt', 'lt']), rng.choice([90, 90, 180, 45, 60, 120, 0])))
+        else:
+            body.append(Command(rng.choice(['pu', 'pd'])))
+    return body
+
+
+def test_periodic_path_matches_the_expansion_in_fixed_point_mode(monkeypatch):
+    # Blocks of a few commands count as long, so that small programs nest long blocks
+    monkeypatch.setattr(periodic_checker, 'PERIODIC_MIN_COMMANDS', 8)
+    rng = random.Random(0)
+    nested = 0
+    for _ in range(400):
+        program = random_body(rng, 3)
+        periodic = PeriodicPath(program, fixedPoint=True)
+        nested += any(piece.program is not None for piece in periodic._periodic)
+
+        full = SegmentStore.from_segments(CommandsProcessor(fixedPoint=True).processCommands(program)) if program else SegmentStore()
+        assert periodic.commands == len(list(iter_expanded(program)))
+        assert periodic.segments == len(full)
+        assert len(periodic.store) <= len(full)
+        witness = periodic.find()[0]
+        assert (witness is None) == (AnyIntersections.find(full, 'sweep')[0] is None)
+        if witness is not None:
+            assert intersect_stored(full, *witness)
+    assert nested > 0
+
+
+def test_nested_blocks_are_not_expanded():
+    program = [Repeat(3, [Repeat(2_000_000, [Command('fd', 1)])])]
+    periodic = PeriodicPath(program, fixedPoint=True)
+    assert periodic.segments == 6_000_000
+    assert len(periodic.store) < 100
+    assert periodic.find()[0] is None
+
+
+def test_a_repeat_line_without_a_bracket_is_skipped(tmp_path, caplog):
+    path = tmp_path / "program.txt"
+    path.write_text("fd 10\nrepeat 4\nfd 5\nrt 90\nrepeat 2 [ fd 1\n  rt 90 ]\nrepeat\npd\n")
+    with caplog.at_level(logging.WARNING):
+        program = InputParser.parse_program(str(path))
+    assert [record.getMessage() for record in caplog.records] == ["Repeat block not opened at line 2: repeat 4\n",
+                                                                  "Repeat block not opened at line 7: repeat\n"]
+    assert repr(program) == repr([Command('fd', 10), Command('fd', 5), Command('rt', 90),
+                                  Repeat(2, [Command('fd', 1), Command('rt', 90)]), Command('pd')])
@@ -0,0 +1,117 @@
+import glob
+import itertools
+import json
+import os
+import numpy as np
+import result_cache
+from main import check_file
+from result_cache import CACHE_VERSION, EVICTION_TARGET, CachedResult, ResultCache, command_key
+
+DATA = sorted(glob.glob(os.path.join(os.path.dirname(__file__), '..', 'data', '*.txt')))
+RESULTS = os.path.join(os.path.dirname(__file__), 'cache_results.json') # Results recorded for CACHE_VERSION
+# Programs with repeat blocks, the long ones go through PeriodicPath
+PROGRAMS = {
+    'square': "repeat 4 [ fd 10 rt 90 ]\n",
+    'star': "repeat 5 [ fd 100 rt 144 ]\n",
+    'stairs': "repeat 300 [ fd 5 rt 90 fd 5 lt 90 ]\n",
+    'flower': "repeat 50 [\n  repeat 36 [ fd 3 rt 10 ]\n  rt 7\n]\n",
+    'retrace': "fd 10\nrepeat 200 [ fd 1 rt 1 ]\nrt 180\nrepeat 20 [ fd 1 ]\n",
+}
+OPTIONS = [(engine, fixedPoint, optimize) for engine in ['auto', 'sweep', 'grid', 'chains', 'slab']
+           for fixedPoint in (False, True) for optimize in (False, True)]
+
+
+def fresh_results(directory) -> dict:
+    files = {os.path.basename(filename): filename for filename in DATA}
+    for name, text in PROGRAMS.items():
+        files[name] = os.path.join(directory, f"{name}.txt")
+        with open(files[name], 'w') as file:
+            file.write(text)
+
+    results = {}
+    for (name, filename), (engine, fixedPoint, optimize) in itertools.product(files.items(), OPTIONS):
+        line = check_file(filename, engine, fixedPoint=fixedPoint, optimize=optimize)
+        assert 'error' not in line, line
+        witness = None if line['witness'] is None else [int(index) for index in line['witness']]
+        results[f"{name}|{engine}|{fixedPoint}|{optimize}"] = [line['result'], witness, line['engine'], line['commands'], line['segments']]
+    return results
+
+
+def test_recorded_results_match_fresh_ones(tmp_path):
+    # Set UPDATE_CACHE_RESULTS=1 to record the results again after bumping CACHE_VERSION
+    fresh = fresh_results(tmp_path)
+    if os.environ.get('UPDATE_CACHE_RESULTS'):
+        with open(RESULTS, 'w') as file:
+            lines = ',\n'.join(f"{json.dumps(key)}: {json.dumps(fresh[key])}" for key in sorted(fresh))
+            file.write(f'{{"version": {CACHE_VERSION}, "results": {{\n{lines}\n}}}}\n')
+    with open(RESULTS) as file:
+        recorded = json.load(file)
+    assert recorded['version'] == CACHE_VERSION, "CACHE_VERSION was bumped, record the results again"
+    changed = sorted(key for key in fresh if fresh[key] != recorded['results'].get(key))
+    assert not changed, f"Results changed without bumping CACHE_VERSION, which would serve stale cached results: {changed[:10]}"
+
+
+def test_hits_from_memory_and_disk(tmp_path):
+    cache = ResultCache(str(tmp_path), memoryEntries=2)
+    assert cache.get('a') is None and cache.misses == 1
+    cache.put('a', CachedResult(True, (3, 7), 'sweep', 10, 9))
+    cache.put('b', CachedResult(False, None, 'grid'))
+    cached = cache.get('a')
+    assert (cached.result, cached.witness, cached.engine, cached.commands, cached.segments) == (True, (3, 7), 'sweep', 10, 9)
+
+    # A new process only has the database
+    reopened = ResultCache(str(tmp_path))
+    assert not reopened._memory
+    cached = reopened.get('a')
+    assert (cached.result, cached.witness, cached.engine) == (True, (3, 7), 'sweep')
+    assert reopened.get('b').witness is None
+    assert (reopened.hits, reopened.misses) == (2, 0)
+
+
+def test_keys_ignore_formatting_and_batching():
+    opcodes = np.array([0, 2, 4, 0, 5], dtype=np.uint8)
+    values = np.array([10, 90, 123, 5, 0], dtype=np.int64)
+    key = command_key([(opcodes, values)], engine='auto')
+    assert command_key([(opcodes[:2], values[:2]), (opcodes[2:], values[2:])], engine='auto') == key
+    # Pen commands have no value
+    assert command_key([(opcodes, np.where(opcodes == 4, 0, values))], engine='auto') == key
+    assert command_key([(opcodes, values)], engine='sweep') != key
+
+
+def test_overwriting_an_entry_does_not_count_it_twice(tmp_path):
+    # Counting every write would run evict, which counts the rows, long before the cache is full
+    cache = ResultCache(str(tmp_path), maxEntries=100)
+    for _ in range(5):
+        cache.put('a', CachedResult(True, (0, 2), 'sweep'))
+    cache.put('b', CachedResult(False, None, 'sweep'))
+    assert cache._entries == len(cache) == 2
+    assert cache.get('b') is not None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    clock = itertools.count()
+    monkeypatch.setattr(result_cache, 'time', lambda: next(clock))
+    cache = ResultCache(str(tmp_path), maxEntries=10, memoryEntries=0)
+    for index in range(10):
+        cache.put(str(index), CachedResult(False, None, 'sweep'))
+    # Reading an entry makes it recently used
+    for index in (0, 1, 2):
+        assert cache.get(str(index)) is not None
+    assert len(cache) == 10
+
+    cache.put('10', CachedResult(False, None, 'sweep'))
+    assert len(cache) == cache._entries == int(10 * EVICTION_TARGET)
+    kept = {key for key in map(str, range(11)) if cache.get(key) is not None}
+    assert kept == {'0', '1', '2', '5', '6', '7', '8', '9', '10'}
+
+
+def test_entries_of_another_version_are_dropped(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path))
+    key = command_key([], engine='auto')
+    cache.put(key, CachedResult(False, None, 'sweep'))
+    assert len(ResultCache(str(tmp_path))) == 1
+
+    monkeypatch.setattr(result_cache, 'CACHE_VERSION', CACHE_VERSION + 1)
+    assert command_key([], engine='auto') != key
+    reopened = ResultCache(str(tmp_path))
+    assert len(reopened) == 0 and reopened.get(key) is None
@@ -0,0 +1,44 @@
+import multiprocessing
+import os
+import numpy as np
+import pytest
+import intersection_checker
+from intersection_checker import SLAB_MIN_SEGMENTS, first_intersection, slab_first_intersection
+from segment import SegmentStore
+
+
+def short_segments(crossing: bool) -> SegmentStore:
+    # Disjoint horizontal segments along the x axis, and optionally one vertical segment crossing one of them
+    x0 = np.arange(SLAB_MIN_SEGMENTS, dtype=np.float64)
+    y0 = np.zeros(SLAB_MIN_SEGMENTS)
+    x1, y1 = x0 + 0.5, y0.copy()
+    if crossing:
+        x0[-1], y0[-1], x1[-1], y1[-1] = 100.25, -1.0, 100.25, 1.0
+    return SegmentStore.from_arrays(x0, y0, x1, y1)
+
+
+@pytest.fixture(autouse=True)
+def forked_workers(monkeypatch):
+    # The workers only see the functions patched by these tests if they are forked, whatever the default start method
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        pytest.skip("needs the fork start method")
+    monkeypatch.setattr(intersection_checker, 'multiprocessing', multiprocessing.get_context('fork'))
+
+
+@pytest.mark.parametrize('crossing', [False, True])
+def test_slab_first_intersection_falls_back_when_a_worker_raises(monkeypatch, crossing):
+    parent = os.getpid()
+
+    def failing(segments, stats=None):
+        if os.getpid() != parent:
+            raise MemoryError("slab too large")
+        return first_intersection(segments, stats)
+
+    monkeypatch.setattr(intersection_checker, 'first_intersection', failing)
+    witness = slab_first_intersection(short_segments(crossing), workers=2)
+    assert witness == ((100, SLAB_MIN_SEGMENTS - 1) if crossing else None)
+
+
+def test_slab_first_intersection_falls_back_when_a_worker_dies(monkeypatch):
+    monkeypatch.setattr(intersection_checker, '_slab_worker', lambda *args: os._exit(1))
+    assert slab_first_intersection(short_segments(False), workers=2) is None
@@ -0,0 +1,78 @@
+import random
+import numpy as np
+from intersection_checker import intersect_coordinates
+from segment import Node, Segment, SegmentStore
+from spatial_index import APPEND_BUFFER, SegmentIndex, _distance
+
+
+def random_segment(rng: random.Random, fixedPoint: bool) -> Segment:
+    # Short segments on a coarse grid, so that boxes, touches and ties are common
+    x, y = rng.randint(0, 60), rng.randint(0, 60)
+    x1, y1 = x + rng.randint(-8, 8), y + rng.randint(-8, 8)
+    if fixedPoint:
+        return Segment(Node(x, y), Node(x1, y1))
+    return Segment(Node(x / 2, y / 2), Node(x1 / 2, y1 / 2))
+
+
+def check_queries(rng: random.Random, index: SegmentIndex, fixedPoint: bool):
+    store = index.store
+    for _ in range(8):
+        segment = random_segment(rng, fixedPoint)
+        crossings = [i for i in range(len(store)) if intersect_coordinates(*store.coordinates(i), segment.start.x, segment.start.y, segment.end.x, segment.end.y)]
+        assert index.crossings(segment) == crossings
+        assert index.crosses(segment) == bool(crossings)
+
+        minX, maxX = sorted((segment.start.x, segment.end.x))
+        minY, maxY = sorted((segment.start.y, segment.end.y))
+        sides = ((minX, minY, maxX, minY), (maxX, minY, maxX, maxY), (maxX, maxY, minX, maxY), (minX, maxY, minX, minY))
+        inBox = [i for i, (x0, y0, x1, y1) in enumerate(store)
+                 if (minX <= x0 <= maxX and minY <= y0 <= maxY) or (minX <= x1 <= maxX and minY <= y1 <= maxY)
+                 or any(intersect_coordinates(x0, y0, x1, y1, *side) for side in sides)]
+        assert index.query_box(minX, minY, maxX, maxY) == inBox
+
+        x, y = segment.start.x, segment.start.y
+        distances = [(_distance(x, y, *coordinates), i) for i, coordinates in enumerate(store)]
+        assert index.nearest(x, y) == (None if not distances else min(distances)[::-1])
+
+
+def test_queries_match_linear_scans_while_the_path_changes():
+    rng = random.Random(0)
+    for fixedPoint in (False, True):
+        index = SegmentIndex(SegmentStore(typecode='q' if fixedPoint else 'd'))
+        assert index.nearest(0, 0) is None and not index.crosses(random_segment(rng, fixedPoint))
+        for _ in range(40):
+            kind = rng.random()
+            if kind < 0.4:
+                for _ in range(rng.randint(1, 2 * APPEND_BUFFER)):
+                    index.append(random_segment(rng, fixedPoint))
+            elif kind < 0.6:
+                segments = [random_segment(rng, fixedPoint) for _ in range(rng.randint(1, 3 * APPEND_BUFFER))]
+                index.extend(*(np.array([getattr(getattr(segment, end), axis) for segment in segments])
+                               for end, axis in (('start', 'x'), ('start', 'y'), ('end', 'x'), ('end', 'y'))))
+            else:
+                # Mostly into packed trees, sometimes into the appended segments only
+                index.truncate(rng.randint(0, len(index)) if kind < 0.9 else max(0, len(index) - rng.randint(0, APPEND_BUFFER)))
+            check_queries(rng, index, fixedPoint)
+            assert len(index) == len(index.store)
+
+
+def test_a_packed_path_is_queried_like_the_appended_one():
+    rng = random.Random(1)
+    segments = [random_segment(rng, False) for _ in range(1000)]
+    packed, appended = SegmentIndex(segments), SegmentIndex()
+    for segment in segments:
+        appended.append(segment)
+    assert len(packed._trees) == 1 and len(appended._trees) > 1
+    for _ in range(50):
+        segment = random_segment(rng, False)
+        assert packed.crossings(segment) == appended.crossings(segment)
+        assert packed.nearest(segment.start.x, segment.start.y) == appended.nearest(segment.start.x, segment.start.y)
+
+    # Truncating inside the packed tree hides its tail until the path grows past it again
+    packed.truncate(400)
+    appended.truncate(400)
+    for segment in segments[400:700]:
+        packed.append(segment)
+        appended.append(segment)
+    check_queries(rng, packed, False)
+    check_queries(rng, appended, False)